@@ -0,0 +1,2 @@
+# Los módulos eva_* están en la raíz del repositorio: pytest agrega este
+# directorio a sys.path al cargar este conftest
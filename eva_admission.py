@@ -0,0 +1,189 @@
+"""Control de admisión: concurrencia acotada por endpoint con colas de espera
+
+Cada endpoint costoso tiene un carril con un máximo de pedidos en ejecución
+y una cola de espera acotada. Si la cola está llena (o la espera supera el
+tiempo máximo) el pedido se rechaza enseguida con una estimación de cuándo
+reintentar, en vez de sumar hilos que compiten por la CPU. /health usa un
+carril reservado, así que una ráfaga de simulaciones no lo deja sin atender.
+"""
+import math
+import threading
+import time
+
+from eva_metrics import LATENCY_BUCKETS, Histogram, format_metric, histogram_samples, metric_header
+
+# Espera máxima en la cola antes de rechazar (segundos)
+DEFAULT_QUEUE_TIMEOUT = 10.0
+
+# Cotas del Retry-After sugerido (segundos)
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+# Peso de cada pedido nuevo en el promedio móvil del tiempo de servicio
+SERVICE_EWMA_ALPHA = 0.2
+
+REJECTION_REASONS = ('queue_full', 'timeout')
+
+
+class AdmissionRejected(Exception):
+    """El carril no puede aceptar el pedido; retry_after en segundos"""
+
+    def __init__(self, lane, reason, retry_after):
+        super().__init__(f'Servidor ocupado ({lane}): reintentar en {retry_after} s')
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Lane:
+    def __init__(self, name, limit, queue_size, timeout=DEFAULT_QUEUE_TIMEOUT):
+        if limit < 1 or queue_size < 0:
+            raise ValueError(f'Carril {name}: el límite debe ser positivo y la cola no negativa')
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.admitted = 0
+        self.rejected = dict.fromkeys(REJECTION_REASONS, 0)
+        self.service_seconds = 0.0
+        self.wait_seconds = Histogram(LATENCY_BUCKETS)
+        self._condition = threading.Condition()
+
+    def retry_after(self):
+        """Segundos sugeridos hasta que se libere lugar (con el lock tomado)"""
+        seconds = self.service_seconds * (self.waiting + 1) / self.limit
+        return int(min(max(math.ceil(seconds), MIN_RETRY_AFTER), MAX_RETRY_AFTER))
+
+    def _reject(self, reason):
+        # Se llama con el lock tomado
+        self.rejected[reason] += 1
+        return AdmissionRejected(self.name, reason, self.retry_after())
+
+    def acquire(self):
+        """Ocupa un lugar del carril, esperando en la cola si hace falta
+
+        Devuelve el momento de admisión (para release). Los que llegan no se
+        adelantan a los que ya esperan; la cola es FIFO como la de Condition.
+        """
+        started = time.perf_counter()
+        with self._condition:
+            if self.in_flight >= self.limit or self.waiting:
+                if self.waiting >= self.queue_size:
+                    raise self._reject('queue_full')
+                self.waiting += 1
+                self.max_waiting = max(self.max_waiting, self.waiting)
+                deadline = started + self.timeout
+                try:
+                    while self.in_flight >= self.limit:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            # Pasar el aviso a otro si justo se liberó un lugar
+                            self._condition.notify()
+                            raise self._reject('timeout')
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+        admitted_at = time.perf_counter()
+        self.wait_seconds.observe(admitted_at - started)
+        return admitted_at
+
+    def release(self, admitted_at):
+        """Libera el lugar y actualiza el tiempo de servicio promedio"""
+        elapsed = time.perf_counter() - admitted_at
+        with self._condition:
+            self.in_flight -= 1
+            if self.service_seconds:
+                self.service_seconds += SERVICE_EWMA_ALPHA * (elapsed - self.service_seconds)
+            else:
+                self.service_seconds = elapsed
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+                'service_seconds': self.service_seconds
+            }
+
+
+class AdmissionController:
+    """Carriles por nombre y la ruta (regla de Flask) que usa cada uno
+
+    Las rutas sin carril no tienen límite. Los rechazos previos a la cola
+    (cuerpo o plantel demasiado grandes) se cuentan aparte por motivo.
+    """
+
+    def __init__(self, lanes, routes, timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.lanes = {name: Lane(name, limit, queue_size, timeout) for name, (limit, queue_size) in lanes.items()}
+        unknown = set(routes.values()) - set(self.lanes)
+        if unknown:
+            raise ValueError(f"Rutas con carriles inexistentes: {', '.join(sorted(unknown))}")
+        self.routes = dict(routes)
+        self.timeout = timeout
+        self.limit_rejections = {}
+        self._lock = threading.Lock()
+
+    def lane_for(self, route):
+        name = self.routes.get(route)
+        return self.lanes[name] if name is not None else None
+
+    def reject(self, reason):
+        """Cuenta un pedido rechazado antes de entrar a un carril"""
+        with self._lock:
+            self.limit_rejections[reason] = self.limit_rejections.get(reason, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            limit_rejections = dict(self.limit_rejections)
+        return {
+            'queue_timeout': self.timeout,
+            'lanes': {name: lane.stats() for name, lane in self.lanes.items()},
+            'limit_rejections': limit_rejections
+        }
+
+    def prometheus_lines(self, prefix='eva_admission'):
+        stats = self.stats()
+        lanes = sorted(stats['lanes'].items())
+        lines = format_metric(f'{prefix}_in_flight', 'gauge', 'Pedidos en ejecución por carril',
+                              [({'lane': name}, lane['in_flight']) for name, lane in lanes])
+        lines += format_metric(f'{prefix}_queue_depth', 'gauge', 'Pedidos esperando lugar por carril',
+                               [({'lane': name}, lane['waiting']) for name, lane in lanes])
+        lines += format_metric(f'{prefix}_concurrency_limit', 'gauge', 'Pedidos en paralelo permitidos por carril',
+                               [({'lane': name}, lane['limit']) for name, lane in lanes])
+        lines += format_metric(f'{prefix}_admitted_total', 'counter', 'Pedidos admitidos por carril',
+                               [({'lane': name}, lane['admitted']) for name, lane in lanes])
+        lines += format_metric(f'{prefix}_rejected_total', 'counter', 'Pedidos rechazados por carril y motivo', [
+            ({'lane': name, 'reason': reason}, count)
+            for name, lane in lanes for reason, count in sorted(lane['rejected'].items())
+        ])
+        lines += format_metric(f'{prefix}_limit_rejections_total', 'counter',
+                               'Pedidos rechazados por tamaño antes de la cola',
+                               [({'reason': reason}, count) for reason, count in sorted(stats['limit_rejections'].items())])
+        lines += metric_header(f'{prefix}_queue_wait_seconds', 'histogram', 'Espera en cola antes de la admisión')
+        for name, lane in sorted(self.lanes.items()):
+            lines += histogram_samples(f'{prefix}_queue_wait_seconds', lane.wait_seconds.snapshot(), {'lane': name})
+        return lines
+
+
+def parse_lane_limits(text):
+    """Límites 'carril=paralelo:cola' separados por comas (variable EVA_ADMISSION_LIMITS)"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        try:
+            name, value = item.split('=')
+            limit, queue_size = value.split(':')
+            limits[name.strip()] = (int(limit), int(queue_size))
+        except ValueError:
+            raise ValueError(f"Límite de admisión inválido: '{item}' (formato carril=paralelo:cola)") from None
+    return limits
@@ -0,0 +1,378 @@
+"""Benchmarks de los caminos críticos de eva_server según el tamaño del plantel
+
+Mide las funciones principales y los endpoints (con el cliente de pruebas de
+Flask) sobre planteles sintéticos, registra la memoria pico con tracemalloc
+y escribe los resultados en JSON. El modo compare marca las regresiones
+contra un resultado guardado. El modo wire compara los bytes enviados y el
+tiempo de serialización de las respuestas de /simulate y /optimize (completa
+o compacta, json u orjson, sin comprimir, gzip o brotli). El modo startup mide el arranque en frío de la línea de comandos
+(eva_cli) en procesos nuevos y qué módulos pesados llega a importar.
+
+Cada medición parte con la caché de matrices vacía, así que mide el camino
+en frío. Si por la medición del tamaño anterior se estima (con crecimiento
+cuadrático) que un caso va a superar --max-seconds, se salta.
+
+Uso:
+    python eva_bench.py run [--sizes 8,64,512,4096] [--repeat 3] [--output bench.json] [--baseline base.json]
+    python eva_bench.py compare base.json bench.json [--threshold 0.25]
+    python eva_bench.py wire [--sizes 8,64,512,4096] [--repeat 5]
+    python eva_bench.py startup [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from importlib import metadata
+
+import numpy as np
+
+DEFAULT_SIZES = [8, 64, 512, 4096]
+DEFAULT_REPEAT = 3
+DEFAULT_MAX_SECONDS = 30.0
+
+# Margen relativo y piso absoluto para considerar que un caso empeoró
+DEFAULT_THRESHOLD = 0.25
+MIN_REGRESSION_SECONDS = 0.001
+
+# Módulos cuyo import domina el arranque
+HEAVY_MODULES = ['numpy', 'scipy', 'pandas', 'sklearn', 'joblib', 'flask']
+
+# Corre eva_cli.main en un proceso nuevo e informa los módulos pesados importados
+STARTUP_SCRIPT = """
+import json, sys
+import eva_cli
+try:
+    eva_cli.main(sys.argv[1:])
+except SystemExit:
+    pass
+sys.stderr.write('\\nEVA_MODULES ' + json.dumps([m for m in %r if m in sys.modules]) + '\\n')
+"""
+
+COUNTRIES = ['AR', 'ES', 'RS', 'IT', 'US', 'DE', 'FR', 'GB']
+STYLES = ['Ofensivo', 'Defensivo', 'Saque y volea', 'Completo']
+
+
+def synthetic_roster(n, seed=0):
+    """Plantel de n jugadores con estadísticas enteras entre 60 y 99"""
+    rng = np.random.default_rng(seed)
+    stats = rng.integers(60, 100, size=(n, 4))
+    return [
+        {
+            'id': i + 1,
+            'name': f'Jugador {i + 1}',
+            'country': COUNTRIES[i % len(COUNTRIES)],
+            'style': STYLES[i % len(STYLES)],
+            'speed': int(stats[i, 0]),
+            'serve': int(stats[i, 1]),
+            'endurance': int(stats[i, 2]),
+            'technique': int(stats[i, 3])
+        }
+        for i in range(n)
+    ]
+
+
+def benchmark_cases(server):
+    """Casos a medir: nombre -> función que recibe el plantel"""
+    client = server.app.test_client()
+
+    def post(path, **extra):
+        def call(players):
+            response = client.post(path, json=dict(players=players, **extra))
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} respondió {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return call
+
+    def batch(n_tournaments):
+        # Planteles distintos del mismo tamaño, para que ninguno salga de la caché
+        def call(players):
+            tournaments = [{'players': synthetic_roster(len(players), seed=k)} for k in range(n_tournaments)]
+            response = client.post('/batch', json={'tournaments': tournaments})
+            if response.status_code != 200:
+                raise RuntimeError(f"/batch respondió {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return call
+
+    return {
+        'function:calculate_win_probabilities': lambda players: server.calculate_win_probabilities(players, {}),
+        'function:analyze_potential_matchups': server.analyze_potential_matchups,
+        'function:run_advanced_simulation': lambda players: server.run_advanced_simulation(players, {}),
+        'function:create_comprehensive_report': lambda players: server.create_comprehensive_report(players, {}),
+        'endpoint:/analyze': post('/analyze'),
+        'endpoint:/predict': post('/predict'),
+        'endpoint:/simulate': post('/simulate'),
+        'endpoint:/simulate?mode=exact': post('/simulate', mode='exact'),
+        'endpoint:/simulate?iterations=1000': post('/simulate', iterations=1000, seed=0),
+        'endpoint:/report': post('/report'),
+        'endpoint:/batch (8 torneos)': batch(8),
+        'endpoint:/sensitivity (4 stats x 10 deltas)': post('/sensitivity')
+    }
+
+
+def measure(server, fn, players, repeat, track_memory):
+    """Mediana y mínimo de segundos en frío y, opcionalmente, memoria pico"""
+    samples = []
+    for _ in range(repeat):
+        server.win_matrix_cache.clear()
+        # Los pedidos deterministas (con semilla o sin azar) saldrían de la caché de respuestas
+        server.response_cache.clear()
+        start = time.perf_counter()
+        fn(players)
+        samples.append(time.perf_counter() - start)
+
+    result = {'median_seconds': float(np.median(samples)), 'min_seconds': min(samples)}
+    if track_memory:
+        # Corrida aparte: tracemalloc hace más lento el código medido
+        server.win_matrix_cache.clear()
+        server.response_cache.clear()
+        tracemalloc.start()
+        try:
+            fn(players)
+            result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, max_seconds=DEFAULT_MAX_SECONDS,
+                   track_memory=True, only=None):
+    """Corre todos los casos para cada tamaño y devuelve el documento de resultados"""
+    import eva_server
+
+    logging.getLogger('eva_server').setLevel(logging.WARNING)
+    cases = benchmark_cases(eva_server)
+    if only:
+        cases = {name: fn for name, fn in cases.items() if any(pattern in name for pattern in only)}
+
+    results = []
+    for name, fn in cases.items():
+        previous = None
+        for n in sorted(sizes):
+            entry = {'name': name, 'players': n}
+            if previous is not None and previous['median_seconds'] * (n / previous['players']) ** 2 > max_seconds:
+                entry.update(status='skipped', reason=f'estimado por encima de {max_seconds}s')
+                results.append(entry)
+                print(f"{name:45s} {n:6d}  salteado", file=sys.stderr)
+                continue
+            players = synthetic_roster(n)
+            try:
+                entry.update(measure(eva_server, fn, players, repeat, track_memory), status='ok')
+                previous = {'players': n, 'median_seconds': entry['median_seconds']}
+                print(f"{name:45s} {n:6d}  {entry['median_seconds'] * 1000:10.2f} ms", file=sys.stderr)
+            except Exception as e:
+                entry.update(status='error', reason=str(e))
+                print(f"{name:45s} {n:6d}  error: {e}", file=sys.stderr)
+            results.append(entry)
+
+    return {'meta': environment_info(sizes, repeat), 'results': results}
+
+
+def environment_info(sizes, repeat):
+    import sklearn
+
+    return {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'flask': metadata.version('flask'),
+        'inference_backend': os.environ.get('EVA_INFERENCE_BACKEND', 'sklearn'),
+        'sizes': sorted(sizes),
+        'repeat': repeat
+    }
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compara dos documentos de resultados y devuelve una fila por caso en común"""
+    base = {(r['name'], r['players']): r for r in baseline['results'] if r['status'] == 'ok'}
+    rows = []
+    for result in current['results']:
+        before = base.get((result['name'], result['players']))
+        if before is None or result['status'] != 'ok':
+            continue
+        ratio = result['median_seconds'] / before['median_seconds'] if before['median_seconds'] > 0 else None
+        slower = result['median_seconds'] - before['median_seconds']
+        row = {
+            'name': result['name'],
+            'players': result['players'],
+            'baseline_seconds': before['median_seconds'],
+            'current_seconds': result['median_seconds'],
+            'ratio': ratio,
+            'regression': ratio is not None and ratio > 1 + threshold and slower > MIN_REGRESSION_SECONDS
+        }
+        if 'peak_memory_bytes' in result and 'peak_memory_bytes' in before and before['peak_memory_bytes']:
+            row['memory_ratio'] = result['peak_memory_bytes'] / before['peak_memory_bytes']
+            row['memory_regression'] = row['memory_ratio'] > 1 + threshold
+        rows.append(row)
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        flag = 'REGRESIÓN' if row['regression'] or row.get('memory_regression') else ''
+        memory = f"mem x{row['memory_ratio']:.2f}" if 'memory_ratio' in row else ''
+        print(f"{row['name']:45s} {row['players']:6d}  {row['baseline_seconds'] * 1000:10.2f} ms -> "
+              f"{row['current_seconds'] * 1000:10.2f} ms  x{row['ratio']:.2f}  {memory:12s} {flag}")
+
+
+def wire_payloads(server, players):
+    """Respuestas de /simulate y /optimize tal como las arma el servidor"""
+    simulation = server.run_advanced_simulation(players, {}, np.random.default_rng(0))
+    optimized = server.calculate_optimal_bracket(players, time_budget=0.2, restarts=1, seed=0)
+    return {
+        '/simulate': dict(simulation, status='success', seed=0),
+        '/optimize': {'status': 'success', 'optimized_bracket': optimized}
+    }
+
+
+def wire_benchmark(sizes=DEFAULT_SIZES, repeat=5):
+    """Bytes y segundos de serialización por endpoint, tamaño y variante de la respuesta"""
+    import eva_server
+    import eva_wire
+
+    logging.getLogger('eva_server').setLevel(logging.WARNING)
+    encoders = {
+        # Lo que hace el proveedor JSON por defecto de Flask
+        'json': lambda payload: json.dumps(payload, sort_keys=True, separators=(',', ':')).encode(),
+        'orjson' if eva_wire.orjson is not None else 'json-compacto': eva_wire.dumps
+    }
+    compressors = {'gzip': lambda body: gzip.compress(body, compresslevel=eva_wire.GZIP_LEVEL, mtime=0)}
+    if eva_wire.brotli is not None:
+        compressors['br'] = lambda body: eva_wire.brotli.compress(body, quality=eva_wire.BROTLI_QUALITY)
+
+    results = []
+    for n in sorted(sizes):
+        players = synthetic_roster(n)
+        for endpoint, payload in wire_payloads(eva_server, players).items():
+            for variant in ('full', 'compact'):
+                body = payload if variant == 'full' else eva_wire.compact_players(payload, players)
+                entry = {'endpoint': endpoint, 'players': n, 'variant': variant}
+                for name, encode in encoders.items():
+                    entry[f'{name}_ms'] = time_call(lambda: encode(body), repeat) * 1000
+                encoded = eva_wire.dumps(body)
+                entry['bytes'] = len(encoded)
+                for name, squeeze in compressors.items():
+                    entry[f'{name}_bytes'] = len(squeeze(encoded))
+                    entry[f'{name}_ms'] = time_call(lambda: squeeze(encoded), repeat) * 1000
+                results.append(entry)
+                print(f"{endpoint:10s} {n:6d} {variant:8s} {entry['bytes']:12d} B  gzip {entry['gzip_bytes']:10d} B",
+                      file=sys.stderr)
+    return {'meta': environment_info(sizes, repeat), 'results': results}
+
+
+def time_call(fn, repeat):
+    """Mediana de segundos por llamada"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def startup_benchmark(repeat=5, players=8):
+    """Segundos de pared (mediana) de comandos de eva_cli en procesos nuevos"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'resultado.json')
+        ids = ','.join(str(i) for i in range(1, players + 1))
+        commands = {
+            '--help': ['--help'],
+            'simulate --help': ['simulate', '--help'],
+            f'simulate ({players} jugadores)': ['simulate', '--ids', ids, '--output', output],
+            f'simulate Monte Carlo ({players} jugadores)': ['simulate', '--ids', ids, '--iterations', '10000',
+                                                            '--seed', '0', '--output', output],
+            f'predict ({players} jugadores)': ['predict', '--ids', ids, '--seed', '0', '--output', output]
+        }
+        script = STARTUP_SCRIPT % (HEAVY_MODULES,)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+
+        results = []
+        for name, args in commands.items():
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                process = subprocess.run([sys.executable, '-c', script] + args, capture_output=True, text=True,
+                                         env=env, cwd=tmp)
+                samples.append(time.perf_counter() - start)
+            modules = json.loads(process.stderr.rsplit('EVA_MODULES ', 1)[1]) if 'EVA_MODULES ' in process.stderr else None
+            results.append({'command': name, 'median_seconds': float(np.median(samples)),
+                            'min_seconds': min(samples), 'heavy_modules': modules})
+            print(f"{name:45s} {results[-1]['median_seconds'] * 1000:10.1f} ms  {modules}", file=sys.stderr)
+    return {'meta': environment_info([players], repeat), 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de E.V.A.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Corre los benchmarks')
+    run_parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)))
+    run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    run_parser.add_argument('--max-seconds', type=float, default=DEFAULT_MAX_SECONDS)
+    run_parser.add_argument('--only', action='append', help='Solo los casos que contengan este texto')
+    run_parser.add_argument('--no-memory', action='store_true', help='No medir memoria con tracemalloc')
+    run_parser.add_argument('--output', help='Archivo JSON de resultados (por defecto, salida estándar)')
+    run_parser.add_argument('--baseline', help='Comparar contra este resultado guardado')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = subparsers.add_parser('compare', help='Compara dos resultados guardados')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    wire_parser = subparsers.add_parser('wire', help='Bytes y serialización de las respuestas')
+    wire_parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)))
+    wire_parser.add_argument('--repeat', type=int, default=5)
+    wire_parser.add_argument('--output', help='Archivo JSON de resultados (por defecto, salida estándar)')
+
+    startup_parser = subparsers.add_parser('startup', help='Arranque en frío de eva_cli')
+    startup_parser.add_argument('--repeat', type=int, default=5)
+    startup_parser.add_argument('--output', help='Archivo JSON de resultados (por defecto, salida estándar)')
+    args = parser.parse_args(argv)
+
+    if args.command in ('wire', 'startup'):
+        if args.command == 'wire':
+            result = wire_benchmark([int(size) for size in args.sizes.split(',')], args.repeat)
+        else:
+            result = startup_benchmark(args.repeat)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+        else:
+            print(json.dumps(result, indent=2))
+        return 0
+
+    if args.command == 'run':
+        sizes = [int(size) for size in args.sizes.split(',')]
+        current = run_benchmarks(sizes, args.repeat, args.max_seconds, not args.no_memory, args.only)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(current, f, indent=2)
+        else:
+            print(json.dumps(current, indent=2))
+        if not args.baseline:
+            return 0
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+
+    rows = compare_results(baseline, current, args.threshold)
+    print_comparison(rows)
+    return 1 if any(row['regression'] or row.get('memory_regression') for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""Motor de cuadros de eliminación directa para E.V.A.
+
+Trabaja sobre índices de jugadores y una matriz de probabilidades de victoria
+(win_matrix[i, j] = probabilidad de que i le gane a j), sin llamar al modelo.
+Un cuadro ("draw") es un arreglo de largo 2^k con el índice del jugador que
+ocupa cada lugar, o BYE si el lugar está vacío.
+"""
+import time
+import numpy as np
+
+# Marcador de lugar vacío (bye) dentro del cuadro
+BYE = -1
+
+# Cantidad de simulaciones procesadas por bloque para acotar la memoria
+MONTECARLO_CHUNK = 100_000
+
+
+def bracket_size(n_players):
+    """Devuelve la potencia de 2 más chica que aloja a todos los jugadores"""
+    size = 1
+    while size < max(n_players, 2):
+        size *= 2
+    return size
+
+
+def seed_positions(size):
+    """Lugar del cuadro que ocupa cada cabeza de serie (1 vs 16, 8 vs 9, ...)"""
+    seeds = np.array([0])
+    while len(seeds) < size:
+        # Cada cabeza de serie s enfrenta en primera ronda a la 2m - 1 - s
+        seeds = np.column_stack([seeds, 2 * len(seeds) - 1 - seeds]).ravel()
+    positions = np.empty(size, dtype=np.int64)
+    positions[seeds] = np.arange(size)
+    return positions
+
+
+def seeded_draw(order):
+    """Ubica a los jugadores (en orden de siembra) en el cuadro
+
+    Los byes quedan para las mejores cabezas de serie, así que nunca se
+    enfrentan dos byes entre sí.
+    """
+    order = np.asarray(order, dtype=np.int64)
+    size = bracket_size(len(order))
+    draw = np.full(size, BYE, dtype=np.int64)
+    draw[seed_positions(size)[:len(order)]] = order
+    return draw
+
+
+def pad_draw(draw):
+    """Completa un cuadro ya armado con partidos vacíos hasta la siguiente potencia de 2"""
+    draw = np.asarray(draw, dtype=np.int64)
+    size = bracket_size(len(draw))
+    return np.concatenate([draw, np.full(size - len(draw), BYE, dtype=np.int64)])
+
+
+def round_count(draw):
+    """Cantidad de rondas de un cuadro de 2^k lugares"""
+    return int(np.log2(len(draw)))
+
+
+def play_round(slots, win_matrix, rng):
+    """Juega una ronda para todas las simulaciones a la vez y devuelve los ganadores"""
+    a = slots[:, 0::2]
+    b = slots[:, 1::2]
+    p_a = win_matrix[np.maximum(a, 0), np.maximum(b, 0)]
+    # Un jugador contra un bye avanza siempre
+    p_a = np.where(b == BYE, 1.0, np.where(a == BYE, 0.0, p_a))
+    a_wins = rng.random(p_a.shape) < p_a
+    return np.where(a_wins, a, b)
+
+
+def simulate_bracket_montecarlo(win_matrix, draw, iterations, rng, shuffle=False,
+                                chunk_size=MONTECARLO_CHUNK):
+    """Simula muchos torneos en un solo pase vectorizado
+
+    Con shuffle=True, draw es la lista de jugadores y cada simulación sortea
+    su propio cuadro. Devuelve advancement[r, i]: probabilidad de que el
+    jugador i gane su partido de la ronda r+1 (la última fila es la
+    probabilidad de campeonar).
+    """
+    n_players = win_matrix.shape[0]
+    if shuffle:
+        players = np.asarray(draw, dtype=np.int64)
+        size = bracket_size(len(players))
+        positions = seed_positions(size)[:len(players)]
+    else:
+        draw = pad_draw(draw)
+        size = len(draw)
+    n_rounds = int(np.log2(size))
+    counts = np.zeros((n_rounds, n_players), dtype=np.int64)
+
+    start = time.perf_counter()
+    done = 0
+    while done < iterations:
+        m = min(chunk_size, iterations - done)
+        if shuffle:
+            slots = np.full((m, size), BYE, dtype=np.int64)
+            slots[:, positions] = rng.permuted(np.broadcast_to(players, (m, len(players))), axis=1)
+        else:
+            slots = np.broadcast_to(draw, (m, size)).copy()
+        for r in range(n_rounds):
+            slots = play_round(slots, win_matrix, rng)
+            winners = slots[slots != BYE]
+            counts[r] += np.bincount(winners, minlength=n_players)
+        done += m
+    elapsed = time.perf_counter() - start
+
+    return {
+        'advancement': counts / iterations,
+        'iterations': iterations,
+        'elapsed_seconds': elapsed,
+        'simulations_per_second': iterations / elapsed if elapsed > 0 else float('inf')
+    }
+
+
+def slot_matrix(matrix, draw):
+    """Reordena una matriz por jugador según los lugares del cuadro (ceros en los byes)"""
+    draw = np.asarray(draw, dtype=np.int64)
+    occupied = draw != BYE
+    idx = np.maximum(draw, 0)
+    return matrix[np.ix_(idx, idx)] * occupied[:, None] * occupied[None, :]
+
+
+def diagonal_blocks(matrix, half):
+    """Bloques diagonales de tamaño 2*half: los cruces posibles dentro de cada subcuadro"""
+    n_blocks = len(matrix) // (2 * half)
+    blocks = matrix.reshape(n_blocks, 2 * half, n_blocks, 2 * half)
+    return blocks[np.arange(n_blocks), :, np.arange(n_blocks), :]
+
+
+def exact_slot_probabilities(win_matrix, draw):
+    """Probabilidad exacta de que el ocupante de cada lugar gane cada ronda
+
+    Programación dinámica estándar sobre el cuadro: en la ronda r cada lugar
+    solo puede enfrentar a los lugares de la otra mitad de su bloque de
+    tamaño 2^(r+1), así que cada ronda cuesta O(n²) en total.
+    Devuelve un arreglo (rondas, lugares).
+    """
+    draw = np.asarray(draw, dtype=np.int64)
+    size = len(draw)
+    slot_wins = slot_matrix(win_matrix, draw)
+
+    reach = (draw != BYE).astype(float)
+    rounds = []
+    half = 1
+    while half < size:
+        n_blocks = size // (2 * half)
+        blocks = diagonal_blocks(slot_wins, half)
+        reach_blocks = reach.reshape(n_blocks, 2, half)
+        left, right = reach_blocks[:, 0], reach_blocks[:, 1]
+
+        # Si la otra mitad está vacía (solo byes) se avanza sin jugar
+        left_wins = left * (np.einsum('bij,bj->bi', blocks[:, :half, half:], right) + 1 - right.sum(axis=1, keepdims=True))
+        right_wins = right * (np.einsum('bij,bj->bi', blocks[:, half:, :half], left) + 1 - left.sum(axis=1, keepdims=True))
+
+        reach = np.stack([left_wins, right_wins], axis=1).reshape(size)
+        rounds.append(reach)
+        half *= 2
+    return np.array(rounds)
+
+
+def exact_bracket_probabilities(win_matrix, draw):
+    """Como exact_slot_probabilities, pero agrupado por jugador: (rondas, jugadores)"""
+    draw = np.asarray(draw, dtype=np.int64)
+    slot_probabilities = exact_slot_probabilities(win_matrix, draw)
+    advancement = np.zeros((slot_probabilities.shape[0], win_matrix.shape[0]))
+    occupied = draw != BYE
+    advancement[:, draw[occupied]] = slot_probabilities[:, occupied]
+    return advancement
+
+
+def expected_round_closeness(win_matrix, draw, slot_probabilities=None):
+    """Paridad esperada de los partidos de cada ronda (1 = 50/50, 0 = definido)
+
+    Dos lugares de mitades opuestas de un subcuadro se cruzan en esa ronda con
+    probabilidad reach_i * reach_j, porque cada mitad se resuelve por separado.
+    """
+    draw = np.asarray(draw, dtype=np.int64)
+    size = len(draw)
+    if slot_probabilities is None:
+        slot_probabilities = exact_slot_probabilities(win_matrix, draw)
+    closeness = slot_matrix(1 - np.abs(2 * win_matrix - 1), draw)
+
+    reach = (draw != BYE).astype(float)
+    result = []
+    half = 1
+    r = 0
+    while half < size:
+        n_blocks = size // (2 * half)
+        blocks = diagonal_blocks(closeness, half)
+        reach_blocks = reach.reshape(n_blocks, 2, half)
+        expected = np.einsum('bi,bij,bj->', reach_blocks[:, 0], blocks[:, :half, half:], reach_blocks[:, 1])
+        result.append(expected / n_blocks)
+        reach = slot_probabilities[r]
+        half *= 2
+        r += 1
+    return np.array(result)
+
+
+def stack_win_matrices(win_matrices):
+    """Matrices de distinto tamaño en un tensor (torneos, n, n); el relleno nunca se usa"""
+    n = max(len(matrix) for matrix in win_matrices)
+    stacked = np.full((len(win_matrices), n, n), 0.5)
+    for t, matrix in enumerate(win_matrices):
+        stacked[t, :len(matrix), :len(matrix)] = matrix
+    return stacked
+
+
+def stack_draws(draws, size=None):
+    """Cuadros de distinto tamaño en una matriz (torneos, lugares)
+
+    Cada cuadro se completa con byes al final: su ganador avanza sin jugar
+    las rondas extra, así que sus rondas propias no cambian.
+    """
+    size = size or max(len(draw) for draw in draws)
+    stacked = np.full((len(draws), size), BYE, dtype=np.int64)
+    for t, draw in enumerate(draws):
+        stacked[t, :len(draw)] = draw
+    return stacked
+
+
+def exact_bracket_probabilities_batch(win_matrices, draws):
+    """exact_bracket_probabilities para muchos torneos en un solo tensor
+
+    win_matrices y draws son listas (un cuadro de 2^k lugares por torneo).
+    Devuelve una lista con el arreglo (rondas, jugadores) de cada torneo.
+    """
+    stacked = stack_win_matrices(win_matrices)
+    slots = stack_draws(draws)
+    n_tournaments, size = slots.shape
+    occupied = slots != BYE
+    idx = np.maximum(slots, 0)
+    t = np.arange(n_tournaments)[:, None, None]
+    slot_wins = stacked[t, idx[:, :, None], idx[:, None, :]] * (occupied[:, :, None] & occupied[:, None, :])
+
+    reach = occupied.astype(float)
+    rounds = []
+    half = 1
+    while half < size:
+        n_blocks = size // (2 * half)
+        # Bloques diagonales de cada torneo: (torneos, bloques, 2*half, 2*half)
+        blocks = np.moveaxis(np.diagonal(slot_wins.reshape(n_tournaments, n_blocks, 2 * half, n_blocks, 2 * half),
+                                         axis1=1, axis2=3), -1, 1)
+        reach_blocks = reach.reshape(n_tournaments, n_blocks, 2, half)
+        left, right = reach_blocks[:, :, 0], reach_blocks[:, :, 1]
+
+        left_wins = left * (np.einsum('tbij,tbj->tbi', blocks[:, :, :half, half:], right) + 1 - right.sum(axis=2, keepdims=True))
+        right_wins = right * (np.einsum('tbij,tbj->tbi', blocks[:, :, half:, :half], left) + 1 - left.sum(axis=2, keepdims=True))
+
+        reach = np.stack([left_wins, right_wins], axis=2).reshape(n_tournaments, size)
+        rounds.append(reach)
+        half *= 2
+    slot_probabilities = np.stack(rounds, axis=1)
+
+    results = []
+    for t, (matrix, draw) in enumerate(zip(win_matrices, draws)):
+        draw = np.asarray(draw, dtype=np.int64)
+        advancement = np.zeros((round_count(draw), len(matrix)))
+        occupied = draw != BYE
+        advancement[:, draw[occupied]] = slot_probabilities[t, :round_count(draw), :len(draw)][:, occupied]
+        results.append(advancement)
+    return results
+
+
+def simulate_brackets_montecarlo_batch(win_matrices, draws, iterations, rng, shuffle,
+                                       chunk_size=MONTECARLO_CHUNK):
+    """simulate_bracket_montecarlo para muchos torneos a la vez
+
+    Todos los torneos juegan la misma cantidad de simulaciones sobre un
+    tensor (torneos, simulaciones, lugares). shuffle[t] indica si el torneo t
+    sortea su cuadro en cada simulación (entonces draws[t] es la lista de
+    jugadores). Devuelve una lista con advancement (rondas, jugadores) por torneo.
+    """
+    n_tournaments = len(win_matrices)
+    stacked = stack_win_matrices(win_matrices)
+    n_players = stacked.shape[1]
+    sizes = [bracket_size(len(draw)) for draw in draws]
+    size = max(sizes)
+    n_rounds = int(np.log2(size))
+    shuffle = np.asarray(shuffle, dtype=bool)
+
+    fixed = stack_draws([pad_draw(draw) if not s else np.array([], dtype=np.int64) for draw, s in zip(draws, shuffle)], size)
+    shuffled = np.flatnonzero(shuffle)
+    # Lugar de siembra del k-ésimo jugador sorteado; el relleno va a una columna descartada
+    positions = np.full((len(shuffled), n_players), size, dtype=np.int64)
+    members = np.full((len(shuffled), n_players), -1, dtype=np.int64)
+    for row, t in enumerate(shuffled):
+        n = len(draws[t])
+        positions[row, :n] = seed_positions(sizes[t])[:n]
+        members[row, :n] = draws[t]
+    padding = members < 0
+
+    counts = np.zeros((n_tournaments, n_rounds, n_players), dtype=np.int64)
+    t_index = np.arange(n_tournaments)[:, None, None]
+    chunk = max(1, chunk_size // n_tournaments)
+    done = 0
+    while done < iterations:
+        m = min(chunk, iterations - done)
+        slots = np.broadcast_to(fixed[:, None, :], (n_tournaments, m, size)).copy()
+        if len(shuffled):
+            keys = rng.random((len(shuffled), m, n_players))
+            keys[np.broadcast_to(padding[:, None, :], keys.shape)] = np.inf
+            order = np.argsort(keys, axis=2)
+            picked = np.take_along_axis(np.broadcast_to(members[:, None, :], keys.shape), order, axis=2)
+            placed = np.full((len(shuffled), m, size + 1), BYE, dtype=np.int64)
+            placed[np.arange(len(shuffled))[:, None, None], np.arange(m)[None, :, None],
+                   positions[:, None, :]] = picked
+            slots[shuffled] = placed[:, :, :size]
+        for r in range(n_rounds):
+            a = slots[:, :, 0::2]
+            b = slots[:, :, 1::2]
+            p_a = stacked[t_index, np.maximum(a, 0), np.maximum(b, 0)]
+            p_a = np.where(b == BYE, 1.0, np.where(a == BYE, 0.0, p_a))
+            slots = np.where(rng.random(p_a.shape) < p_a, a, b)
+            played = slots != BYE
+            flat = (np.broadcast_to(t_index, slots.shape)[played] * n_players + slots[played])
+            counts[:, r] += np.bincount(flat, minlength=n_tournaments * n_players).reshape(n_tournaments, n_players)
+        done += m
+
+    return [counts[t, :int(np.log2(sizes[t])), :len(win_matrices[t])] / iterations for t in range(n_tournaments)]
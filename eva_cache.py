@@ -0,0 +1,92 @@
+"""Caché LRU en memoria con contadores de aciertos y fallos"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    def __init__(self, maxsize=128, max_bytes=None, sizeof=len):
+        """max_bytes acota además la suma de sizeof(valor) de las entradas guardadas"""
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Devuelve el valor guardado o None, actualizando los contadores"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Guarda un valor y descarta el menos usado si se supera el tamaño"""
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self.bytes -= self._sizes.pop(key, 0)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.max_bytes is not None:
+                self._sizes[key] = size
+                self.bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                old_key, _ = self._data.popitem(last=False)
+                self.bytes -= self._sizes.pop(old_key, 0)
+
+    def pop(self, key):
+        """Saca una entrada (si está) sin tocar los contadores"""
+        with self._lock:
+            self.bytes -= self._sizes.pop(key, 0)
+            return self._data.pop(key, None)
+
+    def clear(self):
+        """Vacía la caché sin reiniciar los contadores"""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Resumen de uso de la caché"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+
+def roster_key(stats, model_version):
+    """Hash canónico de las estadísticas del plantel y la versión del modelo"""
+    digest = hashlib.sha256()
+    digest.update(str(model_version).encode())
+    digest.update(np.ascontiguousarray(stats, dtype=np.float64).tobytes())
+    digest.update(str(stats.shape).encode())
+    return digest.hexdigest()
+
+
+def payload_key(path, payload, model_version):
+    """Hash canónico de un pedido JSON (ruta, cuerpo con la semilla y versión del modelo)"""
+    digest = hashlib.sha256()
+    digest.update(f'{path}\n{model_version}\n'.encode())
+    digest.update(json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode())
+    return digest.hexdigest()
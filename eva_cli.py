@@ -0,0 +1,221 @@
+"""Línea de comandos de E.V.A.: servidor, entrenamiento y corridas sin servidor
+
+Cada subcomando importa solo lo que usa: --help no carga NumPy, simulate y
+predict usan el bosque plano del último artefacto (NumPy puro, sin sklearn
+ni Flask) y recién serve importa eva_server. Si el artefacto no trae bosque
+plano, o no hay artefactos, se usa sklearn como el servidor. Con --predictor
+ratings (o un modelo entrenado con ratings) se reproducen los resultados del
+log para obtener los ratings de los jugadores.
+
+Uso:
+    python eva_cli.py serve [--host 127.0.0.1] [--port 5000] [--debug]
+    python eva_cli.py train [--data partidos.csv] [--output models] ...
+    python eva_cli.py simulate [--roster jugadores.json] [--ids 1,2,3] [--bracket bracket.json]
+                               [--iterations 10000] [--seed 0] [--predictor ratings] [--output resultado.json]
+    python eva_cli.py predict [--roster jugadores.json] [--ids 1,2,3] [--seed 0] [--predictor ratings]
+                              [--output resultado.json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROSTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'players-database.json')
+
+
+def load_roster(path, ids=None):
+    """Jugadores del archivo (formato de players-database.json), todos o los ids pedidos"""
+    from eva_registry import PlayerRegistry, UnknownPlayerError
+
+    registry = PlayerRegistry.from_file(path)
+    try:
+        return registry.get_players(ids if ids is not None else registry.ids.tolist())
+    except UnknownPlayerError as e:
+        raise SystemExit(e.args[0])
+
+
+def load_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def parse_ids(value):
+    return [int(player_id) for player_id in value.split(',') if player_id.strip()]
+
+
+def load_ratings(results_log):
+    """RatingStore con los resultados del log reproducidos"""
+    from eva_ratings import RatingStore
+    from eva_training import ResultsLog, replay_ratings
+
+    store = RatingStore()
+    replay_ratings(store, ResultsLog(results_log).read_all())
+    return store
+
+
+def roster_ratings_offline(players, stats, results_log):
+    """(rating, rd) de cada jugador según el log de resultados"""
+    from eva_registry import roster_power
+
+    return load_ratings(results_log).lookup([player.get('id') for player in players], roster_power(stats))
+
+
+def roster_win_matrix_offline(players, model_dir, predictor_name='model', results_log=None):
+    """Matriz de probabilidades del plantel con el último modelo o los ratings, fuera del servidor
+
+    Devuelve (matriz, descripción del modelo usado).
+    """
+    from eva_model import feature_set_of, load_latest_flat_forest
+    from eva_registry import roster_pair_features, roster_power, roster_win_matrix
+    from eva_tournament import get_stats_matrix
+
+    stats = get_stats_matrix(players)
+    n = len(stats)
+    if predictor_name == 'ratings':
+        store = load_ratings(results_log)
+        win_matrix = store.win_matrix([player.get('id') for player in players], roster_power(stats))
+        return win_matrix, {'version': store.version, 'backend': 'ratings'}
+
+    latest = load_latest_flat_forest(model_dir)
+    if latest is not None:
+        forest, metadata = latest
+        ratings = roster_ratings_offline(players, stats, results_log) if feature_set_of(metadata) == 'ratings' else None
+        proba = forest.positive_proba(roster_pair_features(stats, ratings)).reshape(n, n)
+        return roster_win_matrix(stats, proba), {'version': metadata['version'], 'backend': 'flat'}
+
+    from eva_inference import positive_class_proba
+    from eva_model import TennisPredictor, historical_matches, load_latest_predictor
+
+    predictor = load_latest_predictor(model_dir)
+    if predictor is None:
+        logger.warning("No hay artefactos del modelo (python eva_cli.py train), entrenando modelo inicial en memoria")
+        predictor = TennisPredictor()
+        predictor.train_model(historical_matches)
+    ratings = roster_ratings_offline(players, stats, results_log) if predictor.uses_ratings else None
+    proba = positive_class_proba(predictor, roster_pair_features(stats, ratings)).reshape(n, n)
+    return roster_win_matrix(stats, proba), {'version': predictor.version, 'backend': 'sklearn'}
+
+
+def write_result(result, output):
+    """Escribe el resultado como JSON en output, o en la salida estándar"""
+    from eva_wire import dumps
+
+    body = dumps(result)
+    if output:
+        with open(output, 'wb') as f:
+            f.write(body)
+        logger.info(f"Resultado guardado en {output}")
+    else:
+        sys.stdout.write(body.decode() + '\n')
+
+
+def command_serve(args):
+    import eva_server
+
+    eva_server.app.run(host=args.host, port=args.port, debug=args.debug)
+
+
+def command_train(args, extra):
+    from eva_model import main as train_main
+
+    train_main(['train'] + extra)
+
+
+def command_simulate(args):
+    import numpy as np
+    from eva_tournament import exact_simulation, montecarlo_simulation
+
+    start = time.perf_counter()
+    players = load_roster(args.roster, args.ids)
+    if len(players) < 2:
+        raise SystemExit('Se necesitan al menos 2 jugadores para simular')
+    bracket = load_json(args.bracket) if args.bracket else {}
+    win_matrix, model = roster_win_matrix_offline(players, args.model_dir, args.predictor, args.results_log)
+
+    if args.iterations is not None:
+        seed = args.seed if args.seed is not None else int(np.random.SeedSequence().generate_state(1, np.uint64)[0] >> 1)
+        result = dict(montecarlo_simulation(players, bracket, win_matrix, args.iterations, seed),
+                      mode='montecarlo', seed=seed)
+    else:
+        result = dict(exact_simulation(players, bracket, win_matrix), mode='exact')
+    result.update(status='success', model=model, elapsed_ms=(time.perf_counter() - start) * 1000)
+    write_result(result, args.output)
+
+
+def command_predict(args):
+    import numpy as np
+    from eva_tournament import rank_contenders
+
+    start = time.perf_counter()
+    players = load_roster(args.roster, args.ids)
+    if not players:
+        raise SystemExit('El plantel está vacío')
+    bracket = load_json(args.bracket) if args.bracket else {}
+    win_matrix, model = roster_win_matrix_offline(players, args.model_dir, args.predictor, args.results_log)
+
+    seed = args.seed if args.seed is not None else int(np.random.SeedSequence().generate_state(1, np.uint64)[0] >> 1)
+    result = rank_contenders(players, bracket, win_matrix, np.random.default_rng(seed))
+    result.update(status='success', seed=seed, model=model, elapsed_ms=(time.perf_counter() - start) * 1000)
+    write_result(result, args.output)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='E.V.A. Tennis AI')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Inicia el servidor HTTP')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=5000)
+    serve_parser.add_argument('--debug', action='store_true')
+
+    # Las opciones de train son las de eva_model.py train
+    subparsers.add_parser('train', help='Entrena y guarda un nuevo artefacto (ver eva_model.py train --help)',
+                          add_help=False)
+
+    for name, help_text in (('simulate', 'Probabilidades por ronda (exactas o Monte Carlo) sin servidor'),
+                            ('predict', 'Candidatos al título sin servidor')):
+        command_parser = subparsers.add_parser(name, help=help_text)
+        command_parser.add_argument('--roster', default=DEFAULT_ROSTER,
+                                    help='JSON de jugadores con el formato de players-database.json')
+        command_parser.add_argument('--ids', type=parse_ids, help='Ids separados por comas (por defecto, todos)')
+        command_parser.add_argument('--bracket', help='JSON con el bracket (round1 con player1/player2)')
+        command_parser.add_argument('--seed', type=int)
+        # Mismo valor por defecto que MODEL_DIR de eva_model, sin importarlo para --help
+        command_parser.add_argument('--model-dir', default=os.environ.get('EVA_MODEL_DIR', os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'models')))
+        command_parser.add_argument('--predictor', choices=('model', 'ratings'), default='model',
+                                    help='Probabilidades del modelo o de los ratings Glicko')
+        # Mismo valor por defecto que RESULTS_LOG de eva_server
+        command_parser.add_argument('--results-log', default=os.environ.get('EVA_RESULTS_LOG', os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'data', 'match_results.jsonl')),
+                                    help='Log de resultados del que salen los ratings')
+        command_parser.add_argument('--output', help='Archivo de resultados (por defecto, salida estándar)')
+        if name == 'simulate':
+            command_parser.add_argument('--iterations', type=int, help='Simulaciones Monte Carlo (sin esto, modo exacto)')
+    return parser
+
+
+def main(argv=None):
+    args, extra = build_parser().parse_known_args(argv)
+    if args.command != 'train' and extra:
+        build_parser().error(f"argumentos no reconocidos: {' '.join(extra)}")
+    if getattr(args, 'iterations', None) is not None and args.iterations < 1:
+        build_parser().error('--iterations debe ser un entero positivo')
+    logging.basicConfig(level=logging.INFO if args.command in ('serve', 'train') else logging.WARNING)
+
+    if args.command == 'serve':
+        command_serve(args)
+    elif args.command == 'train':
+        command_train(args, extra)
+    elif args.command == 'simulate':
+        command_simulate(args)
+    else:
+        command_predict(args)
+
+
+if __name__ == '__main__':
+    main()
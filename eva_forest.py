@@ -0,0 +1,261 @@
+"""Inferencia del bosque aleatorio sobre arreglos planos de NumPy
+
+Los árboles de sklearn se exportan a arreglos de nodos concatenados
+(característica, umbral, hijo izquierdo y valores de hoja), reordenados por
+niveles para que el hijo derecho quede siempre junto al izquierdo. Todas las
+filas de un lote recorren todos los árboles a la vez, un nivel por iteración,
+sin pasar por la validación y el despacho por llamada de predict_proba. Los
+pares (árbol, fila) que ya llegaron a una hoja salen del conjunto activo, así
+que el trabajo total es la suma de las profundidades recorridas.
+
+Las filas se escalan y se pasan a float32 igual que en sklearn antes de
+comparar contra los umbrales, así que las hojas alcanzadas son las mismas.
+Los lotes grandes se recorren por bloques de filas, para que los arreglos de
+pares (árbol, fila) no crezcan con el lote completo.
+
+Uso:
+    python eva_forest.py bench [--artifact models/v3] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+FLAT_DIR = 'flat'
+FLAT_ARRAYS = ('feature', 'threshold', 'children_left', 'leaf_values', 'roots', 'scaler_mean', 'scaler_scale')
+
+# Tamaños de lote del benchmark
+BENCH_BATCH_SIZES = [1, 64, 10_000]
+
+# Diferencia máxima aceptada contra sklearn
+PARITY_TOLERANCE = 1e-9
+
+# Pares (árbol, fila) por bloque al recorrer el bosque
+LEAF_CHUNK_PAIRS = 1 << 20
+
+
+def breadth_first_order(children_left, children_right):
+    """Nuevo orden de los nodos de un árbol con los hermanos en posiciones contiguas"""
+    order = [np.array([0])]
+    level = order[0]
+    while True:
+        internal = level[children_left[level] != -1]
+        if len(internal) == 0:
+            break
+        level = np.column_stack([children_left[internal], children_right[internal]]).ravel()
+        order.append(level)
+    return np.concatenate(order)
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, children_left, leaf_values, roots, scaler_mean, scaler_scale,
+                 classes, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.scaler_mean = scaler_mean
+        self.scaler_scale = scaler_scale
+        self.classes_ = classes
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        """Exporta un RandomForestClassifier entrenado (y su StandardScaler, si hay)"""
+        features, thresholds, lefts, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            order = breadth_first_order(tree.children_left, tree.children_right)
+            new_id = np.empty_like(order)
+            new_id[order] = np.arange(len(order))
+
+            left = tree.children_left[order]
+            is_leaf = left == -1
+            features.append(np.where(is_leaf, -1, tree.feature[order]).astype(np.int32))
+            thresholds.append(tree.threshold[order])
+            lefts.append(np.where(is_leaf, -1, new_id[np.maximum(left, 0)] + offset).astype(np.int32))
+
+            # Probabilidades por hoja (según la versión, sklearn guarda conteos o fracciones)
+            value = tree.value[order, 0, :]
+            values.append(value / np.maximum(value.sum(axis=1, keepdims=True), 1e-300))
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += len(order)
+
+        n_features = model.n_features_in_
+        mean = scaler.mean_ if scaler is not None else np.zeros(n_features)
+        scale = scaler.scale_ if scaler is not None else np.ones(n_features)
+        return cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+                   np.concatenate(values), np.array(roots, dtype=np.int32), np.asarray(mean, dtype=float),
+                   np.asarray(scale, dtype=float), np.asarray(model.classes_), max_depth)
+
+    def transform(self, X):
+        """Escalado y conversión a float32, en el mismo orden de operaciones que sklearn"""
+        X = np.array(X, dtype=np.float64)
+        X -= self.scaler_mean
+        X /= self.scaler_scale
+        return X.astype(np.float32)
+
+    def chunk_rows(self):
+        """Filas por bloque, para que cada bloque tenga a lo sumo LEAF_CHUNK_PAIRS pares"""
+        return max(1, LEAF_CHUNK_PAIRS // len(self.roots))
+
+    def iter_leaves(self, X):
+        """Genera (inicio, fin, hojas (n_árboles, fin - inicio)) por bloques de filas"""
+        X = self.transform(X)
+        step = self.chunk_rows()
+        for start in range(0, len(X), step):
+            chunk = X[start:start + step]
+            yield start, start + len(chunk), self._leaves(chunk)
+
+    def leaves(self, X):
+        """Índice de la hoja de cada (árbol, fila): arreglo (n_árboles, n_filas)"""
+        leaves = np.empty((len(self.roots), len(X)), dtype=np.int32)
+        for start, stop, chunk in self.iter_leaves(X):
+            leaves[:, start:stop] = chunk
+        return leaves
+
+    def _leaves(self, X):
+        # X ya transformado; recorre todos los árboles con todas las filas
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        n_trees = len(self.roots)
+        leaves = np.empty(n_trees * n_rows, dtype=np.int32)
+
+        # Conjunto activo de pares (árbol, fila) que todavía no llegaron a una hoja
+        position = np.arange(n_trees * n_rows, dtype=np.int32)
+        node = np.repeat(self.roots, n_rows)
+        row_offset = np.tile(np.arange(0, n_rows * n_features, n_features, dtype=np.int32), n_trees)
+        while len(position):
+            feature = self.feature.take(node)
+            done = feature < 0
+            if done.any():
+                finished = np.flatnonzero(done)
+                leaves[position.take(finished)] = node.take(finished)
+                active = np.flatnonzero(~done)
+                position, node = position.take(active), node.take(active)
+                row_offset, feature = row_offset.take(active), feature.take(active)
+            # El hijo derecho está siempre a continuación del izquierdo
+            go_right = flat_X.take(row_offset + feature) > self.threshold.take(node)
+            node = self.children_left.take(node) + go_right
+        return leaves.reshape(n_trees, n_rows)
+
+    def predict_proba(self, X):
+        """Promedio de las probabilidades de hoja de todos los árboles, como sklearn"""
+        proba = np.empty((len(X), self.leaf_values.shape[1]))
+        for start, stop, nodes in self.iter_leaves(X):
+            # Una clase por vez: juntar columnas sueltas es más barato que filas enteras
+            for c in range(self.leaf_values.shape[1]):
+                proba[start:stop, c] = self.leaf_values[:, c].take(nodes).mean(axis=0)
+        return proba
+
+    def positive_proba(self, X):
+        """Probabilidad de la clase 1 (que gane player1) para cada fila"""
+        classes = list(self.classes_)
+        if 1 not in classes:
+            return np.zeros(len(X))
+        values = self.leaf_values[:, classes.index(1)]
+        proba = np.empty(len(X))
+        for start, stop, nodes in self.iter_leaves(X):
+            proba[start:stop] = values.take(nodes).mean(axis=0)
+        return proba
+
+    def save(self, path):
+        """Guarda cada arreglo como .npy para poder cargarlos con memory-mapping"""
+        directory = os.path.join(path, FLAT_DIR)
+        os.makedirs(directory, exist_ok=True)
+        for name in FLAT_ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'classes': [int(c) for c in self.classes_], 'max_depth': int(self.max_depth)}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Carga los arreglos guardados por save; con mmap los procesos comparten las páginas"""
+        directory = os.path.join(path, FLAT_DIR)
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in FLAT_ARRAYS]
+        return cls(*arrays, np.array(meta['classes']), meta['max_depth'])
+
+
+def parity_error(predictor, flat_forest, X):
+    """Diferencia máxima entre las probabilidades de sklearn y las del bosque plano"""
+    expected = predictor.model.predict_proba(predictor.scaler.transform(X))
+    return float(np.abs(expected - flat_forest.predict_proba(X)).max())
+
+
+def time_call(fn, repeat):
+    """Mediana de segundos por llamada"""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def benchmark(predictor, batch_sizes=BENCH_BATCH_SIZES, repeat=20, seed=0):
+    """Verifica la paridad con sklearn y compara latencias por tamaño de lote"""
+    from eva_model import build_feature_matrix
+
+    start = time.perf_counter()
+    flat_forest = FlatForest.from_sklearn(predictor.model, predictor.scaler)
+    export_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for batch_size in batch_sizes:
+        stats = rng.integers(0, 101, size=(2, batch_size, 4)).astype(float)
+        X = build_feature_matrix(stats[0], stats[1])
+        error = parity_error(predictor, flat_forest, X)
+        if error > PARITY_TOLERANCE:
+            raise AssertionError(f"El bosque plano difiere de sklearn en {error} (lote de {batch_size})")
+
+        # Menos repeticiones para los lotes grandes
+        n_repeat = max(3, repeat * 64 // max(batch_size, 64))
+        sklearn_seconds = time_call(lambda: predictor.model.predict_proba(predictor.scaler.transform(X)), n_repeat)
+        flat_seconds = time_call(lambda: flat_forest.predict_proba(X), n_repeat)
+        results.append({
+            'batch_size': batch_size,
+            'max_abs_error': error,
+            'sklearn_ms': sklearn_seconds * 1000,
+            'flat_ms': flat_seconds * 1000,
+            'speedup': sklearn_seconds / flat_seconds if flat_seconds > 0 else None
+        })
+
+    return {
+        'trees': len(flat_forest.roots),
+        'nodes': len(flat_forest.feature),
+        'max_depth': flat_forest.max_depth,
+        'export_seconds': export_seconds,
+        'batches': results
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bosque plano de E.V.A.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subparsers.add_parser('bench', help='Paridad con sklearn y latencia por tamaño de lote')
+    bench_parser.add_argument('--artifact', help='Directorio de un artefacto (por defecto, el modelo inicial)')
+    bench_parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    from eva_model import TennisPredictor, historical_matches
+
+    if args.artifact:
+        predictor = TennisPredictor.load(args.artifact)
+    else:
+        predictor = TennisPredictor()
+        predictor.train_model(historical_matches)
+    print(json.dumps(benchmark(predictor, repeat=args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
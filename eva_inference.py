@@ -0,0 +1,135 @@
+"""Despachador de inferencia con micro-batching
+
+Cada llamada a predict_proba del bosque tiene un costo fijo alto comparado con
+el trabajo por fila. El despachador junta las filas de pedidos concurrentes
+durante unos milisegundos (o hasta un máximo de filas), hace una sola
+inferencia y le devuelve a cada pedido su porción del resultado.
+
+El lote se evalúa con uno de los backends de INFERENCE_BACKENDS: sklearn,
+el bosque plano de eva_forest, o 'auto', que usa el bosque plano para lotes
+chicos (donde domina el costo fijo de sklearn) y sklearn para los grandes.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from eva_metrics import Histogram
+
+BATCH_ROWS_BUCKETS = [1, 8, 64, 256, 1024, 4096, 16384, 65536]
+BATCH_REQUESTS_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+QUEUE_WAIT_BUCKETS = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1]
+INFERENCE_SECONDS_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5]
+
+# Filas hasta las que 'auto' usa el bosque plano (medido con un núcleo y árboles profundos)
+FLAT_MAX_ROWS = 1024
+
+
+def positive_class_proba(predictor, features):
+    """Probabilidad de que gane player1 (clase 1) para cada fila"""
+    proba = predictor.model.predict_proba(predictor.scaler.transform(features))
+    classes = list(predictor.model.classes_)
+    if 1 not in classes:
+        return np.zeros(len(features))
+    return proba[:, classes.index(1)]
+
+
+def flat_forest_proba(predictor, features):
+    """Igual que positive_class_proba, recorriendo el bosque plano"""
+    return predictor.flat_forest().positive_proba(features)
+
+
+def auto_proba(predictor, features):
+    """Bosque plano para lotes chicos, sklearn para los grandes"""
+    if len(features) <= FLAT_MAX_ROWS:
+        return flat_forest_proba(predictor, features)
+    return positive_class_proba(predictor, features)
+
+
+INFERENCE_BACKENDS = {
+    'sklearn': positive_class_proba,
+    'flat': flat_forest_proba,
+    'auto': auto_proba
+}
+
+
+class InferenceDispatcher:
+    def __init__(self, predict_fn=positive_class_proba, max_wait=0.002, max_batch_rows=4096):
+        """predict_fn(predictor, features) se ejecuta una vez por lote"""
+        self.predict_fn = predict_fn
+        self.max_wait = max_wait
+        self.max_batch_rows = max_batch_rows
+        self.batch_rows = Histogram(BATCH_ROWS_BUCKETS)
+        self.batch_requests = Histogram(BATCH_REQUESTS_BUCKETS)
+        self.queue_wait = Histogram(QUEUE_WAIT_BUCKETS)
+        self.inference_time = Histogram(INFERENCE_SECONDS_BUCKETS)
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='eva-inference', daemon=True)
+        self._worker.start()
+
+    def predict(self, predictor, features):
+        """Encola las filas y espera su porción del lote"""
+        future = Future()
+        self._queue.put((predictor, np.asarray(features, dtype=float), future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        """Toma el primer pedido y junta los que lleguen dentro de la ventana"""
+        items = [self._queue.get()]
+        rows = len(items[0][1])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_rows:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            rows += len(item[1])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            # Solo se juntan filas del mismo modelo: un pedido en curso
+            # conserva el predictor con el que empezó
+            groups = {}
+            for item in items:
+                groups.setdefault(id(item[0]), []).append(item)
+            for group in groups.values():
+                self._run_batch(group)
+
+    def _run_batch(self, items):
+        started = time.perf_counter()
+        for _, _, _, enqueued in items:
+            self.queue_wait.observe(started - enqueued)
+
+        features = np.concatenate([item[1] for item in items])
+        self.batch_rows.observe(len(features))
+        self.batch_requests.observe(len(items))
+        try:
+            result = self.predict_fn(items[0][0], features)
+        except Exception as e:
+            for _, _, future, _ in items:
+                future.set_exception(e)
+            return
+        finally:
+            self.inference_time.observe(time.perf_counter() - started)
+
+        offset = 0
+        for _, rows, future, _ in items:
+            future.set_result(result[offset:offset + len(rows)])
+            offset += len(rows)
+
+    def stats(self):
+        return {
+            'max_wait_ms': self.max_wait * 1000,
+            'max_batch_rows': self.max_batch_rows,
+            'queue_depth': self._queue.qsize(),
+            'batch_rows': self.batch_rows.snapshot(),
+            'batch_requests': self.batch_requests.snapshot(),
+            'queue_wait_seconds': self.queue_wait.snapshot(),
+            'inference_seconds': self.inference_time.snapshot()
+        }
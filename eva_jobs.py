@@ -0,0 +1,191 @@
+"""Trabajos en segundo plano con progreso por Server-Sent Events
+
+Las simulaciones y optimizaciones largas se ejecutan en un pool acotado de
+hilos fuera del ciclo del pedido HTTP. Cada trabajo publica eventos
+numerados que el cliente puede seguir (y retomar con Last-Event-ID).
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Eventos que se guardan por trabajo para clientes que se reconectan
+MAX_EVENTS_PER_JOB = 200
+
+# Estados finales de un trabajo
+FINAL_STATES = ('completed', 'failed', 'cancelled')
+
+
+class JobQueueFullError(Exception):
+    """No hay lugar para más trabajos pendientes"""
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = deque(maxlen=MAX_EVENTS_PER_JOB)
+        self._next_event_id = 1
+        self._cancel = threading.Event()
+        self._condition = threading.Condition()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished(self):
+        return self.status in FINAL_STATES
+
+    def cancel(self):
+        """Pide la cancelación; el trabajo la revisa entre bloques de cálculo"""
+        self._cancel.set()
+        with self._condition:
+            if self.status == 'queued':
+                self._finish('cancelled')
+
+    def publish(self, event, data):
+        """Agrega un evento y despierta a los clientes que esperan"""
+        with self._condition:
+            self.events.append((self._next_event_id, event, data))
+            self._next_event_id += 1
+            self._condition.notify_all()
+
+    def wait_events(self, after_id, timeout):
+        """Eventos con id mayor a after_id; espera hasta timeout si no hay nuevos"""
+        with self._condition:
+            if not self.finished and (not self.events or self.events[-1][0] <= after_id):
+                self._condition.wait(timeout)
+            return [e for e in self.events if e[0] > after_id]
+
+    def _finish(self, status, result=None, error=None):
+        # Se llama con el lock tomado
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self.events.append((self._next_event_id, status, self.to_dict(include_result=True)))
+        self._next_event_id += 1
+        self._condition.notify_all()
+
+    def to_dict(self, include_result=False):
+        data = {
+            'job_id': self.id,
+            'type': self.kind,
+            'state': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.error:
+            data['error'] = self.error
+        if include_result and self.result is not None:
+            data['result'] = self.result
+        return data
+
+
+class JobManager:
+    def __init__(self, max_workers=2, max_pending=16, ttl=600, timeout=300):
+        """ttl: segundos que se guarda un trabajo terminado; timeout: duración máxima"""
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='eva-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args):
+        """Encola fn(job, *args); el valor devuelto queda como resultado del trabajo"""
+        self.purge_expired()
+        with self._lock:
+            if self.active_count() >= self.max_pending:
+                raise JobQueueFullError(f'Hay {self.max_pending} trabajos pendientes, intenta más tarde')
+            job = Job(kind)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        with job._condition:
+            if job.finished:
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+        job.publish('state', {'state': 'running'})
+
+        # Cancelar automáticamente si supera la duración máxima
+        timer = threading.Timer(self.timeout, job.cancel)
+        timer.daemon = True
+        timer.start()
+        try:
+            result = fn(job, *args)
+            with job._condition:
+                if job.cancelled:
+                    job._finish('cancelled', result)
+                else:
+                    job._finish('completed', result)
+        except Exception as e:
+            with job._condition:
+                job._finish('failed', error=str(e))
+        finally:
+            timer.cancel()
+
+    def get(self, job_id):
+        self.purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def active_count(self):
+        """Trabajos en cola o en ejecución"""
+        return sum(1 for job in list(self._jobs.values()) if not job.finished)
+
+    def purge_expired(self):
+        """Descarta los trabajos terminados hace más de ttl segundos"""
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished_at > self.ttl]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {'active': sum(1 for job in jobs if not job.finished), 'by_status': counts}
+
+
+def format_sse(event_id, event, data):
+    """Serializa un evento con el formato de Server-Sent Events"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_job_events(job, last_event_id=0, keepalive=15):
+    """Generador SSE: envía los eventos del trabajo hasta que termina"""
+    last_id = last_event_id
+    while True:
+        events = job.wait_events(last_id, keepalive)
+        for event_id, event, data in events:
+            last_id = event_id
+            yield format_sse(event_id, event, data)
+        if job.finished and job.events[-1][0] <= last_id:
+            return
+        if not events:
+            # Comentario SSE para mantener viva la conexión
+            yield ": keepalive\n\n"
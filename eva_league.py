@@ -0,0 +1,282 @@
+"""Fase de liga (todos contra todos) y probabilidades de clasificación
+
+Replica las reglas de updateStandings() en script.js: 3 puntos por victoria y
+desempate por diferencia de sets, sets a favor y número de sorteo (menor
+número primero). Los partidos pendientes se evalúan por enumeración exacta
+cuando son pocos, o por muestreo vectorizado cuando son muchos. Con la matriz
+de probabilidades del plantel se calculan también las chances de playoffs:
+cada siembra distinta de los clasificados se resuelve una sola vez en forma
+exacta y se pondera por su probabilidad.
+"""
+import numpy as np
+
+from eva_bracket import exact_bracket_probabilities_batch, seeded_draw
+
+POINTS_PER_WIN = 3
+
+# Puntajes posibles (ganador, perdedor) según si el partido es parejo o no,
+# con el mismo criterio que generate_realistic_scores
+CLOSE_SCORES = np.array([[7, 5], [6, 4], [7, 6]])
+CLEAR_SCORES = np.array([[6, 2], [6, 3], [7, 4]])
+
+# Resultados por partido pendiente: 2 ganadores posibles x 3 puntajes
+OUTCOMES_PER_MATCH = 2 * len(CLOSE_SCORES)
+
+# Máxima cantidad de escenarios para enumerar en lugar de muestrear
+ENUMERATION_LIMIT = 50_000
+
+# Diferencia de poder por debajo de la cual un partido es parejo
+CLOSE_POWER_GAP = 10
+
+# Orden de los partidos de la liga de 7 jugadores de script.js (números de sorteo)
+LEAGUE_MATCH_ORDER = [
+    (2, 7), (3, 6), (4, 5), (1, 7), (2, 5), (3, 4), (1, 6), (7, 5), (2, 3), (1, 5), (6, 4),
+    (7, 3), (1, 4), (5, 3), (6, 2), (1, 3), (4, 2), (6, 7), (1, 2), (4, 7), (5, 6)
+]
+
+# Escenarios muestreados por bloque para acotar la memoria
+SAMPLING_CHUNK = 50_000
+
+
+def league_schedule(numbers):
+    """Calendario (pares de índices) de todos contra todos a partir de los números de sorteo
+
+    Con los números 1 a 7 se usa el orden de script.js; si no, todos los pares
+    en orden de número.
+    """
+    index = {number: i for i, number in enumerate(numbers)}
+    if sorted(index) == list(range(1, 8)):
+        pairs = LEAGUE_MATCH_ORDER
+    else:
+        ordered = sorted(index)
+        pairs = [(a, b) for k, a in enumerate(ordered) for b in ordered[k + 1:]]
+    return np.array([(index[a], index[b]) for a, b in pairs], dtype=np.int64).reshape(-1, 2)
+
+
+def schedule_odds(schedule, win_matrix, power):
+    """Probabilidad de que gane player1 y si el partido es parejo, para cada partido del calendario"""
+    first, second = np.asarray(schedule, dtype=np.int64).reshape(-1, 2).T
+    return win_matrix[first, second], np.abs(power[first] - power[second]) < CLOSE_POWER_GAP
+
+
+def standings_order(points, set_difference, sets_won, numbers):
+    """Posición de cada jugador en cada escenario (0 = primero)
+
+    Acepta arreglos (escenarios, jugadores); los números de sorteo son iguales
+    en todos los escenarios.
+    """
+    n = points.shape[-1]
+    # Clave compuesta: puntos, diferencia de sets, sets a favor, número de sorteo
+    tiebreak = n - 1 - np.argsort(np.argsort(numbers))
+    diff_offset = np.abs(set_difference).max() + 1
+    won_base = sets_won.max() + 1
+    key = ((points * (2 * diff_offset + 1) + set_difference + diff_offset) * won_base + sets_won) * n + tiebreak
+    order = np.argsort(-key, axis=-1, kind='stable')
+    return np.argsort(order, axis=-1)
+
+
+class LeagueTable:
+    def __init__(self, numbers, schedule, playoff_spots=4):
+        """numbers: número de sorteo de cada jugador; schedule: pares (M, 2) de índices"""
+        self.numbers = np.asarray(numbers)
+        self.schedule = np.asarray(schedule, dtype=np.int64).reshape(-1, 2)
+        self.playoff_spots = playoff_spots
+
+        n = len(self.numbers)
+        self.points = np.zeros(n, dtype=np.int64)
+        self.sets_won = np.zeros(n, dtype=np.int64)
+        self.sets_lost = np.zeros(n, dtype=np.int64)
+        self.played = np.zeros(n, dtype=np.int64)
+        self.remaining = np.bincount(self.schedule.ravel(), minlength=n)
+        self.pending = np.ones(len(self.schedule), dtype=bool)
+
+        self.clinched = np.zeros(n, dtype=bool)
+        self.eliminated = np.zeros(n, dtype=bool)
+        self.decided_after = [None] * n
+        self._update_flags(None)
+
+    @property
+    def set_difference(self):
+        return self.sets_won - self.sets_lost
+
+    def rank(self):
+        """Posición actual de cada jugador con los resultados registrados (0 = primero)"""
+        return standings_order(self.points, self.set_difference, self.sets_won, self.numbers)
+
+    def record_result(self, match_index, score1, score2, match_id=None):
+        """Registra un resultado actualizando solo a los dos jugadores involucrados"""
+        if not self.pending[match_index]:
+            raise ValueError(f'El partido {match_id or match_index} ya tiene resultado')
+        if score1 == score2:
+            raise ValueError('Los puntajes no pueden ser iguales')
+
+        a, b = self.schedule[match_index]
+        self.pending[match_index] = False
+        self.played[[a, b]] += 1
+        self.remaining[[a, b]] -= 1
+        self.sets_won[a] += score1
+        self.sets_lost[a] += score2
+        self.sets_won[b] += score2
+        self.sets_lost[b] += score1
+        self.points[a if score1 > score2 else b] += POINTS_PER_WIN
+
+        self._update_flags(match_id if match_id is not None else match_index)
+
+    def _update_flags(self, match_id):
+        """Actualiza clasificados y eliminados; las banderas nunca se revierten
+
+        Sin partidos pendientes la tabla es definitiva. Si no, se usan cotas
+        por puntos: los empates se consideran desfavorables para clasificar y
+        favorables para no quedar eliminado, porque los sets aún pueden cambiar.
+        """
+        n = len(self.points)
+        if not self.pending.any():
+            clinched = self.rank() < self.playoff_spots
+            eliminated = ~clinched
+        else:
+            max_points = self.points + POINTS_PER_WIN * self.remaining
+            # Rivales que todavía pueden igualar o superar los puntos actuales
+            can_reach = n - np.searchsorted(np.sort(max_points), self.points, side='left') - 1
+            # Rivales que ya tienen más puntos de los que se pueden alcanzar
+            out_of_reach = n - np.searchsorted(np.sort(self.points), max_points, side='right')
+            clinched = can_reach < self.playoff_spots
+            eliminated = out_of_reach >= self.playoff_spots
+
+        newly_decided = (clinched | eliminated) & ~(self.clinched | self.eliminated)
+        for i in np.flatnonzero(newly_decided):
+            self.decided_after[i] = match_id
+        self.clinched |= clinched
+        self.eliminated |= eliminated
+
+    def qualification_odds(self, win_probabilities, close, rng=None, iterations=20_000,
+                           enumeration_limit=ENUMERATION_LIMIT, win_matrix=None):
+        """Probabilidad de cada jugador de terminar en cada posición
+
+        win_probabilities y close tienen un valor por partido del calendario
+        (probabilidad de que gane player1 y si el partido es parejo); solo se
+        usan los pendientes. Con win_matrix se agrega playoff_advancement
+        (rondas de playoffs, jugadores), con los clasificados sembrados en
+        orden de tabla (1° vs 4° y 2° vs 3° con 4 lugares).
+        """
+        pending = np.flatnonzero(self.pending)
+        n = len(self.points)
+        m = len(pending)
+        p1 = np.asarray(win_probabilities, dtype=float)[pending]
+        score_table = np.where(np.asarray(close, dtype=bool)[pending, None, None], CLOSE_SCORES, CLEAR_SCORES)
+
+        # Matrices de incidencia partido -> jugador
+        player1 = np.zeros((m, n))
+        player1[np.arange(m), self.schedule[pending, 0]] = 1
+        player2 = np.zeros((m, n))
+        player2[np.arange(m), self.schedule[pending, 1]] = 1
+
+        position_probabilities = np.zeros((n, n))
+        seedings = {} if win_matrix is not None else None
+        exact = OUTCOMES_PER_MATCH ** m <= enumeration_limit
+
+        if exact:
+            scenarios = OUTCOMES_PER_MATCH ** m
+            codes = (np.arange(scenarios)[:, None] // OUTCOMES_PER_MATCH ** np.arange(m)) % OUTCOMES_PER_MATCH
+            first_wins = codes < len(CLOSE_SCORES)
+            variants = codes % len(CLOSE_SCORES)
+            weights = np.prod(np.where(first_wins, p1, 1 - p1) / len(CLOSE_SCORES), axis=1)
+            self._accumulate(position_probabilities, first_wins, variants, weights, score_table, player1, player2,
+                             seedings)
+        else:
+            rng = rng or np.random.default_rng()
+            scenarios = iterations
+            done = 0
+            while done < iterations:
+                chunk = min(SAMPLING_CHUNK, iterations - done)
+                # Se sortean todos los partidos del calendario y se usan los pendientes:
+                # con la misma semilla, cada escenario conserva el resultado de los
+                # partidos que siguen pendientes después de registrar uno nuevo
+                first_wins = rng.random((chunk, len(self.schedule)))[:, pending] < p1
+                variants = rng.integers(0, len(CLOSE_SCORES), (chunk, len(self.schedule)))[:, pending]
+                weights = np.full(chunk, 1 / iterations)
+                self._accumulate(position_probabilities, first_wins, variants, weights, score_table, player1, player2,
+                                 seedings)
+                done += chunk
+
+        odds = {
+            'position_probabilities': position_probabilities,
+            'qualification': position_probabilities[:, :self.playoff_spots].sum(axis=1),
+            'exact': exact,
+            'scenarios': scenarios,
+            'pending_matches': m
+        }
+        if win_matrix is not None:
+            odds['playoff_advancement'] = playoff_advancement(win_matrix, seedings)
+        return odds
+
+    def _accumulate(self, position_probabilities, first_wins, variants, weights, score_table, player1, player2,
+                    seedings=None):
+        """Suma la distribución de posiciones de un bloque de escenarios
+
+        Con seedings (dict), suma además el peso de cada siembra de los
+        clasificados (tupla de jugadores en orden de tabla).
+        """
+        m = first_wins.shape[1]
+        scores = score_table[np.arange(m), variants]
+        winner_sets, loser_sets = scores[..., 0], scores[..., 1]
+        sets1 = np.where(first_wins, winner_sets, loser_sets)
+        sets2 = np.where(first_wins, loser_sets, winner_sets)
+
+        points = self.points + (first_wins * POINTS_PER_WIN) @ player1 + (~first_wins * POINTS_PER_WIN) @ player2
+        sets_won = self.sets_won + sets1 @ player1 + sets2 @ player2
+        sets_lost = self.sets_lost + sets2 @ player1 + sets1 @ player2
+        points, sets_won, sets_lost = (x.astype(np.int64) for x in (points, sets_won, sets_lost))
+
+        position = standings_order(points, sets_won - sets_lost, sets_won, self.numbers)
+        n = position.shape[1]
+        cells = np.arange(n) * n + position
+        position_probabilities += np.bincount(
+            cells.ravel(), weights=np.repeat(weights, n), minlength=n * n
+        ).reshape(n, n)
+
+        if seedings is not None:
+            qualified = np.argsort(position, axis=1)[:, :self.playoff_spots]
+            # Cada siembra como un entero en base n: np.unique en 1-D es mucho más rápido que por filas
+            codes = qualified @ n ** np.arange(self.playoff_spots, dtype=np.int64)
+            unique, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+            totals = np.bincount(inverse.ravel(), weights=weights, minlength=len(unique))
+            for seeding, total in zip(map(tuple, qualified[first].tolist()), totals.tolist()):
+                seedings[seeding] = seedings.get(seeding, 0.0) + total
+
+
+def playoff_advancement(win_matrix, seedings):
+    """Probabilidad de ganar cada ronda de playoffs (rondas, jugadores)
+
+    seedings asocia cada siembra posible (jugadores en orden de tabla) con su
+    probabilidad; todas las siembras se resuelven en un solo tensor.
+    """
+    orders = np.array(list(seedings), dtype=np.int64)
+    weights = np.array(list(seedings.values()))
+    draws = orders[:, seeded_draw(np.arange(orders.shape[1]))]
+    advancements = exact_bracket_probabilities_batch([win_matrix] * len(draws), list(draws))
+    return np.tensordot(weights, np.array(advancements), axes=1)
+
+
+def league_standings(players, numbers, table, odds):
+    """Tabla de posiciones por jugador, ordenada por posición"""
+    position = table.rank()
+    standings = []
+    for i, player in enumerate(players):
+        standings.append({
+            'id': player['id'],
+            'name': player['name'],
+            'number': numbers[i],
+            'position': int(position[i]) + 1,
+            'points': int(table.points[i]),
+            'matches_played': int(table.played[i]),
+            'sets_won': int(table.sets_won[i]),
+            'sets_lost': int(table.sets_lost[i]),
+            'set_difference': int(table.set_difference[i]),
+            'qualification_probability': float(odds['qualification'][i] * 100),
+            'position_probabilities': [float(p * 100) for p in odds['position_probabilities'][i]],
+            'clinched': bool(table.clinched[i]),
+            'eliminated': bool(table.eliminated[i]),
+            'decided_after': table.decided_after[i]
+        })
+    standings.sort(key=lambda x: x['position'])
+    return standings
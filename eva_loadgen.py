@@ -0,0 +1,456 @@
+"""Generador de carga que reproduce el flujo de torneo del frontend
+
+Cada usuario virtual juega torneos completos como la interfaz de script.js:
+sorteo de los 7 números (crea la sesión), los 21 partidos de la liga en el
+orden fijo, y después de cada resultado vuelve a pedir /analyze y /predict;
+luego semifinales y final, /report con el campeón y el cierre de la sesión.
+Entre acción y acción espera un tiempo de reflexión exponencial.
+
+Los usuarios corren concurrentemente con asyncio sobre un cliente HTTP
+mínimo de la biblioteca estándar (una conexión por pedido, como el servidor
+de desarrollo de Werkzeug). Sin --url se levanta un servidor local con la
+configuración EVA_* del entorno. El resultado tiene latencias p50/p95/p99,
+throughput y tasa de error por endpoint y se guarda en JSON; el modo compare
+marca las regresiones contra una corrida anterior.
+
+Uso:
+    python eva_loadgen.py run [--users 20] [--tournaments 1] [--think-ms 200] [--url http://127.0.0.1:5000]
+                              [--output load.json] [--baseline base.json]
+    python eva_loadgen.py compare base.json load.json [--threshold 0.25]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+from datetime import datetime
+
+import numpy as np
+
+from eva_bench import synthetic_roster
+
+DEFAULT_USERS = 20
+DEFAULT_TOURNAMENTS = 1
+DEFAULT_THINK_MS = 200.0
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_STARTUP_TIMEOUT = 120.0
+
+# Jugadores del torneo de script.js (números del sorteo del 1 al 7)
+TOURNAMENT_PLAYERS = 7
+
+# Margen relativo para considerar que un endpoint empeoró (latencia p95 o
+# throughput), piso absoluto de latencia y aumento tolerado de la tasa de error
+DEFAULT_THRESHOLD = 0.25
+MIN_REGRESSION_MS = 1.0
+MAX_ERROR_RATE_INCREASE = 0.01
+
+PERCENTILES = (50, 95, 99)
+
+# Posibles resultados en sets (el ganador primero)
+SET_SCORES = [(2, 0), (2, 1)]
+
+
+class Recorder:
+    """Latencia y estado de cada pedido, por endpoint"""
+
+    def __init__(self):
+        self.samples = {}
+        self.tournaments = {'completed': 0, 'aborted': 0}
+
+    def observe(self, endpoint, seconds, status):
+        self.samples.setdefault(endpoint, []).append((seconds, status))
+
+    def summary(self, elapsed):
+        endpoints = {name: summarize(samples, elapsed) for name, samples in sorted(self.samples.items())}
+        every = [sample for samples in self.samples.values() for sample in samples]
+        return {
+            'elapsed_seconds': elapsed,
+            'tournaments': dict(self.tournaments),
+            'total': summarize(every, elapsed),
+            'endpoints': endpoints
+        }
+
+
+def summarize(samples, elapsed):
+    """Cantidad, errores, throughput y percentiles de latencia (ms) de un grupo de pedidos"""
+    latencies = np.array([seconds for seconds, _ in samples]) * 1000
+    statuses = np.array([status for _, status in samples])
+    errors = int(np.count_nonzero((statuses == 0) | (statuses >= 400)))
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'rejected': int(np.count_nonzero(statuses == 503)),
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'throughput_rps': len(samples) / elapsed if elapsed > 0 else 0.0,
+        'mean_ms': float(latencies.mean()) if samples else None,
+        'max_ms': float(latencies.max()) if samples else None
+    }
+    for q in PERCENTILES:
+        summary[f'p{q}_ms'] = float(np.percentile(latencies, q)) if samples else None
+    return summary
+
+
+class RequestFailed(Exception):
+    """Un paso del flujo que no se puede saltear respondió con error"""
+
+
+class Client:
+    """Cliente HTTP/1.1 mínimo sobre asyncio que registra cada pedido"""
+
+    def __init__(self, url, recorder, timeout=DEFAULT_TIMEOUT):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+
+    async def request(self, method, path, body=None, endpoint=None):
+        """Devuelve (estado, JSON o None); estado 0 si falló la conexión o se agotó el tiempo"""
+        started = time.perf_counter()
+        try:
+            status, content = await asyncio.wait_for(self._send(method, path, body), self.timeout)
+        except (OSError, EOFError, IndexError, ValueError, asyncio.TimeoutError):
+            status, content = 0, b''
+        self.recorder.observe(endpoint or f'{method} {path}', time.perf_counter() - started, status)
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+    async def _send(self, method, path, body):
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = (f'{method} {self.prefix}{path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+                f'Connection: close\r\nAccept: application/json\r\nAccept-Encoding: gzip\r\n'
+                f'Content-Length: {len(payload)}\r\n')
+        if body is not None:
+            head += 'Content-Type: application/json\r\n'
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(head.encode() + b'\r\n' + payload)
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+        return parse_response(raw)
+
+
+def parse_response(raw):
+    """Estado y cuerpo (sin partes ni gzip) de una respuesta HTTP completa"""
+    header, _, content = raw.partition(b'\r\n\r\n')
+    lines = header.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding') == 'chunked':
+        content = dechunk(content)
+    if headers.get('content-encoding') == 'gzip':
+        content = gzip.decompress(content)
+    return status, content
+
+
+def dechunk(content):
+    parts = []
+    while content:
+        size_line, _, content = content.partition(b'\r\n')
+        size = int(size_line.split(b';')[0], 16)
+        if size == 0:
+            break
+        parts.append(content[:size])
+        content = content[size + 2:]
+    return b''.join(parts)
+
+
+def tournament_roster(seed, rng):
+    """Los 7 jugadores del torneo con un número de sorteo al azar, como performDraw"""
+    players = synthetic_roster(TOURNAMENT_PLAYERS, seed=seed)
+    numbers = list(range(1, TOURNAMENT_PLAYERS + 1))
+    rng.shuffle(numbers)
+    for player, number in zip(players, numbers):
+        player['number'] = number
+    return players
+
+
+def play_match(rng, match):
+    """Resultado en sets de un partido, con el favorito según la probabilidad del servidor"""
+    probability = match.get('win_probability')
+    player1_wins = rng.random() * 100 < (probability if probability is not None else 50)
+    winner, loser = rng.choice(SET_SCORES)
+    return (winner, loser) if player1_wins else (loser, winner)
+
+
+class VirtualUser:
+    def __init__(self, client, recorder, think_ms, seed, distinct_rosters=False):
+        self.client = client
+        self.recorder = recorder
+        self.think_ms = think_ms
+        self.seed = seed
+        self.distinct_rosters = distinct_rosters
+        self.rng = random.Random(seed)
+
+    async def think(self):
+        if self.think_ms > 0:
+            await asyncio.sleep(self.rng.expovariate(1000 / self.think_ms))
+
+    async def run(self, tournaments, deadline=None):
+        """Juega tournaments torneos o, con deadline, todos los que empiecen antes de ese momento"""
+        played = 0
+        while played < tournaments if deadline is None else time.perf_counter() < deadline:
+            # El frontend siempre usa el mismo plantel; con distinct_rosters cada torneo tiene otro
+            roster_seed = self.seed * 1000 + played if self.distinct_rosters else 0
+            try:
+                await self.play_tournament(tournament_roster(roster_seed, self.rng))
+                self.recorder.tournaments['completed'] += 1
+            except RequestFailed:
+                self.recorder.tournaments['aborted'] += 1
+            played += 1
+
+    async def step(self, method, path, body=None, endpoint=None):
+        """Pedido del que depende el resto del torneo: si falla, se abandona"""
+        status, data = await self.client.request(method, path, body, endpoint)
+        if not 200 <= status < 300 or data is None:
+            raise RequestFailed(f'{method} {path} -> {status}')
+        return data
+
+    async def refresh_insights(self, players, matches, bracket=None):
+        """Lo que la interfaz vuelve a pedir después de cada resultado; sus errores no cortan el torneo"""
+        await self.client.request('POST', '/analyze', {'players': players, 'tournament': {'leagueMatches': matches}})
+        await self.client.request('POST', '/predict', {'players': players, 'current_bracket': bracket or {}})
+
+    async def record(self, session_id, match, version):
+        score1, score2 = play_match(self.rng, match)
+        result = await self.step('POST', f'/sessions/{session_id}/results',
+                                 {'match_id': match['id'], 'score1': score1, 'score2': score2, 'version': version},
+                                 endpoint='POST /sessions/<id>/results')
+        match.update(score1=score1, score2=score2, completed=True)
+        return result['version']
+
+    async def play_tournament(self, players):
+        # Sorteo: la sesión arma el calendario de la liga con los números
+        await self.think()
+        session = await self.step('POST', '/sessions', {'players': players, 'seed': self.seed})
+        session_id, version = session['session_id'], session['version']
+        try:
+            matches = [m for m in session['matches'] if m['round'] == 'league']
+            for match in matches:
+                await self.think()
+                version = await self.record(session_id, match, version)
+                await self.refresh_insights(players, matches)
+
+            # Playoffs: semifinales y final con los cruces que arma la sesión
+            for round_name in ('semifinal', 'final'):
+                state = await self.step('GET', f'/sessions/{session_id}', endpoint='GET /sessions/<id>')
+                version = state['version']
+                playoff = [m for m in state['matches'] if m['round'] == round_name]
+                bracket = {'round1': [{'player1': player_by_id(players, m['player1']),
+                                       'player2': player_by_id(players, m['player2'])} for m in playoff]}
+                await self.client.request('POST', '/predict', {'players': players, 'current_bracket': bracket})
+                for match in playoff:
+                    await self.think()
+                    version = await self.record(session_id, match, version)
+
+            final = playoff[-1]
+            champion = player_by_id(players, final['player1'] if final['score1'] > final['score2'] else final['player2'])
+            await self.think()
+            await self.client.request('POST', '/report', {'players': players,
+                                                          'tournament': {'champion': champion, 'leagueMatches': matches}})
+        finally:
+            await self.client.request('DELETE', f'/sessions/{session_id}', endpoint='DELETE /sessions/<id>')
+
+
+def player_by_id(players, player_id):
+    return next(player for player in players if player['id'] == player_id)
+
+
+async def run_load(url, users, tournaments, think_ms, seed=0, duration=None, ramp_up=0.0,
+                   timeout=DEFAULT_TIMEOUT, distinct_rosters=False):
+    """Corre los usuarios virtuales y devuelve el resumen por endpoint"""
+    recorder = Recorder()
+    client = Client(url, recorder, timeout)
+    started = time.perf_counter()
+    deadline = started + ramp_up + duration if duration else None
+
+    async def start_user(k):
+        # Arranque escalonado a lo largo de ramp_up
+        await asyncio.sleep(ramp_up * k / users if users > 1 else 0)
+        await VirtualUser(client, recorder, think_ms, seed + k + 1, distinct_rosters).run(tournaments, deadline)
+
+    await asyncio.gather(*(start_user(k) for k in range(users)))
+    return recorder.summary(time.perf_counter() - started)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_local_server(port, log_path=None, startup_timeout=DEFAULT_STARTUP_TIMEOUT):
+    """Levanta eva_server en un proceso aparte (con hilos, sin recarga) y espera a /health"""
+    log = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'eva_server', 'run', '--host', '127.0.0.1', '--port', str(port),
+         '--with-threads', '--no-reload', '--no-debugger'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.perf_counter() + startup_timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'El servidor terminó al arrancar (código {process.returncode})')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as sock:
+                sock.sendall(b'GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+                if sock.recv(16).startswith(b'HTTP/1.1 200'):
+                    return process
+        except OSError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f'El servidor no respondió /health en {startup_timeout}s')
+
+
+def environment_info(args, url):
+    return {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'url': url,
+        'local_server': args.url is None,
+        'users': args.users,
+        'tournaments_per_user': args.tournaments,
+        'duration': args.duration,
+        'think_ms': args.think_ms,
+        'ramp_up': args.ramp_up,
+        'distinct_rosters': args.distinct_rosters,
+        'seed': args.seed,
+        'inference_backend': os.environ.get('EVA_INFERENCE_BACKEND', 'sklearn'),
+        'admission_limits': os.environ.get('EVA_ADMISSION_LIMITS', '')
+    }
+
+
+def print_summary(result):
+    print(f"{'endpoint':32s} {'pedidos':>8s} {'rps':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'error':>7s}",
+          file=sys.stderr)
+    rows = list(result['endpoints'].items()) + [('total', result['total'])]
+    for name, row in rows:
+        if not row['requests']:
+            continue
+        print(f"{name:32s} {row['requests']:8d} {row['throughput_rps']:8.1f} {row['p50_ms']:9.1f} "
+              f"{row['p95_ms']:9.1f} {row['p99_ms']:9.1f} {row['error_rate'] * 100:6.1f}%", file=sys.stderr)
+    tournaments = result['tournaments']
+    print(f"torneos completos: {tournaments['completed']}, abandonados: {tournaments['aborted']}, "
+          f"{result['elapsed_seconds']:.1f} s", file=sys.stderr)
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compara dos corridas y devuelve una fila por endpoint en común"""
+    rows = []
+    for name, after in list(current['endpoints'].items()) + [('total', current['total'])]:
+        before = baseline['total'] if name == 'total' else baseline['endpoints'].get(name)
+        if before is None or not before['requests'] or not after['requests']:
+            continue
+        p95_ratio = after['p95_ms'] / before['p95_ms'] if before['p95_ms'] else None
+        throughput_ratio = (after['throughput_rps'] / before['throughput_rps']
+                            if before['throughput_rps'] else None)
+        rows.append({
+            'endpoint': name,
+            'baseline_p95_ms': before['p95_ms'],
+            'current_p95_ms': after['p95_ms'],
+            'p95_ratio': p95_ratio,
+            'throughput_ratio': throughput_ratio,
+            'baseline_error_rate': before['error_rate'],
+            'current_error_rate': after['error_rate'],
+            'regression': bool(
+                (p95_ratio is not None and p95_ratio > 1 + threshold
+                 and after['p95_ms'] - before['p95_ms'] > MIN_REGRESSION_MS)
+                or (throughput_ratio is not None and throughput_ratio < 1 / (1 + threshold))
+                or after['error_rate'] - before['error_rate'] > MAX_ERROR_RATE_INCREASE
+            )
+        })
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        flag = 'REGRESIÓN' if row['regression'] else ''
+        throughput = f"rps x{row['throughput_ratio']:.2f}" if row['throughput_ratio'] is not None else ''
+        print(f"{row['endpoint']:32s} p95 {row['baseline_p95_ms']:9.1f} ms -> {row['current_p95_ms']:9.1f} ms  "
+              f"x{row['p95_ratio'] or 0:.2f}  {throughput:12s} error {row['baseline_error_rate'] * 100:5.1f}% -> "
+              f"{row['current_error_rate'] * 100:5.1f}%  {flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generador de carga con el flujo de torneo del frontend')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Corre la carga contra el servidor')
+    run_parser.add_argument('--url', help='Servidor ya levantado (por defecto se levanta uno local)')
+    run_parser.add_argument('--users', type=int, default=DEFAULT_USERS, help='Usuarios virtuales concurrentes')
+    run_parser.add_argument('--tournaments', type=int, default=DEFAULT_TOURNAMENTS, help='Torneos por usuario')
+    run_parser.add_argument('--duration', type=float, help='Seguir jugando torneos hasta estos segundos')
+    run_parser.add_argument('--think-ms', type=float, default=DEFAULT_THINK_MS,
+                            help='Tiempo de reflexión medio entre acciones (exponencial)')
+    run_parser.add_argument('--ramp-up', type=float, default=0.0, help='Segundos para escalonar el arranque')
+    run_parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Tiempo máximo por pedido')
+    run_parser.add_argument('--distinct-rosters', action='store_true',
+                            help='Un plantel distinto por torneo (cachés frías) en vez del fijo del frontend')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--server-log', help='Archivo para la salida del servidor local')
+    run_parser.add_argument('--output', help='Archivo JSON de resultados (por defecto, salida estándar)')
+    run_parser.add_argument('--baseline', help='Comparar contra este resultado guardado')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = subparsers.add_parser('compare', help='Compara dos resultados guardados')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        server = None
+        url = args.url
+        if url is None:
+            port = free_port()
+            server = start_local_server(port, args.server_log)
+            url = f'http://127.0.0.1:{port}'
+        try:
+            result = asyncio.run(run_load(url, args.users, args.tournaments, args.think_ms, args.seed, args.duration,
+                                          args.ramp_up, args.timeout, args.distinct_rosters))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        current = dict(result, meta=environment_info(args, url))
+        print_summary(current)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(current, f, indent=2)
+        else:
+            print(json.dumps(current, indent=2))
+        if not args.baseline:
+            return 0
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+
+    rows = compare_results(baseline, current, args.threshold)
+    print_comparison(rows)
+    return 1 if any(row['regression'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
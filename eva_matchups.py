@@ -0,0 +1,111 @@
+"""Índice de enfrentamientos sobre el vector de poder ordenado
+
+Con el poder de los jugadores ordenado, los pares más parejos están entre
+vecinos cercanos del orden y los más desparejos entre los extremos, así que
+no hace falta recorrer los n² pares. Para la similitud de estilo se usa un
+KD-tree sobre las cuatro estadísticas.
+
+Un par (i, i + d) del orden tiene una diferencia mayor o igual que los d - 1
+pares (i, i + e) con e < d, así que los k pares más parejos tienen d <= k:
+alcanza con mirar n * k candidatos. Con el mismo argumento, los k pares más
+desparejos salen de los k más débiles contra los k más fuertes.
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+from eva_registry import roster_power
+
+
+class MatchupIndex:
+    def __init__(self, stats):
+        self.stats = np.asarray(stats, dtype=float)
+        self.power = roster_power(self.stats)
+        self.order = np.argsort(self.power, kind='stable')
+        self.sorted_power = self.power[self.order]
+        # Posición de cada jugador en el orden por poder
+        self.rank = np.empty_like(self.order)
+        self.rank[self.order] = np.arange(len(self.order))
+        self._style_tree = None
+
+    def __len__(self):
+        return len(self.order)
+
+    @property
+    def style_tree(self):
+        """KD-tree sobre las estadísticas crudas (se arma la primera vez que se usa)"""
+        if self._style_tree is None:
+            self._style_tree = cKDTree(self.stats)
+        return self._style_tree
+
+    def most_balanced(self, k=1):
+        """Los k pares con menor diferencia de poder: (i, j, diferencia) con índices del plantel"""
+        n = len(self)
+        k = min(k, n * (n - 1) // 2)
+        if k <= 0:
+            return []
+        offsets = range(1, min(k, n - 1) + 1)
+        lower = np.concatenate([np.arange(n - d) for d in offsets])
+        upper = np.concatenate([np.arange(d, n) for d in offsets])
+        gaps = self.sorted_power[upper] - self.sorted_power[lower]
+        best = top_k_indices(gaps, k)
+        return self._pairs(lower[best], upper[best], gaps[best])
+
+    def most_lopsided(self, k=1):
+        """Los k pares con mayor diferencia de poder"""
+        n = len(self)
+        k = min(k, n * (n - 1) // 2)
+        if k <= 0:
+            return []
+        m = min(k, n)
+        lower, upper = np.meshgrid(np.arange(m), np.arange(n - m, n), indexing='ij')
+        lower, upper = lower.ravel(), upper.ravel()
+        valid = lower < upper
+        lower, upper = lower[valid], upper[valid]
+        gaps = self.sorted_power[upper] - self.sorted_power[lower]
+        best = top_k_indices(-gaps, k)
+        return self._pairs(lower[best], upper[best], gaps[best])
+
+    def nearest_by_power(self, players, k=3):
+        """Los k rivales de poder más parecido de cada jugador: (índices, diferencias)"""
+        n = len(self)
+        players = np.asarray(players, dtype=np.int64)
+        k = min(k, n - 1)
+        if k <= 0:
+            return np.empty((len(players), 0), dtype=np.int64), np.empty((len(players), 0))
+        # Los k más cercanos están a lo sumo k lugares hacia cada lado del orden
+        offsets = np.concatenate([np.arange(-k, 0), np.arange(1, k + 1)])
+        positions = self.rank[players][:, None] + offsets
+        inside = (positions >= 0) & (positions < n)
+        positions = np.clip(positions, 0, n - 1)
+        gaps = np.where(inside, np.abs(self.sorted_power[positions] - self.power[players][:, None]), np.inf)
+        best = np.argsort(gaps, axis=1, kind='stable')[:, :k]
+        rows = np.arange(len(players))[:, None]
+        return self.order[positions[rows, best]], gaps[rows, best]
+
+    def nearest_by_style(self, players, k=3):
+        """Los k rivales con estadísticas más parecidas (distancia euclídea): (índices, distancias)"""
+        players = np.asarray(players, dtype=np.int64)
+        k = min(k, len(self) - 1)
+        if k <= 0:
+            return np.empty((len(players), 0), dtype=np.int64), np.empty((len(players), 0))
+        distances, neighbors = self.style_tree.query(self.stats[players], k=k + 1)
+        distances, neighbors = distances.reshape(len(players), -1), neighbors.reshape(len(players), -1)
+        # Sacar al propio jugador (con empates exactos puede no quedar primero)
+        not_self = neighbors != players[:, None]
+        keep = np.argsort(~not_self, axis=1, kind='stable')[:, :k]
+        rows = np.arange(len(players))[:, None]
+        return neighbors[rows, keep], distances[rows, keep]
+
+    def _pairs(self, lower, upper, gaps):
+        return [(int(self.order[i]), int(self.order[j]), float(gap)) for i, j, gap in zip(lower, upper, gaps)]
+
+
+def top_k_indices(values, k):
+    """Índices de los k menores valores, ordenados (desempate por posición)"""
+    if k < len(values):
+        # Todos los empatados con el k-ésimo, para que el desempate no dependa de argpartition
+        kth = values[np.argpartition(values, k - 1)[k - 1]]
+        candidates = np.flatnonzero(values <= kth)
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.lexsort((candidates, values[candidates]))][:k]
@@ -0,0 +1,106 @@
+"""Métricas en memoria del servidor E.V.A."""
+import threading
+
+
+class Histogram:
+    """Histograma acumulativo con límites fijos (estilo Prometheus)"""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, limit in enumerate(self.buckets):
+                if value <= limit:
+                    self.counts[i] += 1
+
+    def snapshot(self):
+        """Copia consistente de los contadores"""
+        with self._lock:
+            return {
+                'buckets': dict(zip(self.buckets, self.counts)),
+                'count': self.count,
+                'sum': self.sum,
+                'mean': self.sum / self.count if self.count else 0.0
+            }
+
+
+# Límites de los histogramas de latencia (segundos)
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+class RequestMetrics:
+    """Cantidad de pedidos por ruta y estado, y latencias por ruta"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = {}
+        self.latencies = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method, route, status, seconds):
+        with self._lock:
+            key = (method, route, status)
+            self.counts[key] = self.counts.get(key, 0) + 1
+            histogram = self.latencies.get((method, route))
+            if histogram is None:
+                histogram = self.latencies[(method, route)] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def prometheus_lines(self, prefix='eva_http'):
+        with self._lock:
+            counts = dict(self.counts)
+            latencies = dict(self.latencies)
+        lines = format_metric(f'{prefix}_requests_total', 'counter', 'Pedidos atendidos', [
+            ({'method': method, 'route': route, 'status': str(status)}, value)
+            for (method, route, status), value in sorted(counts.items())
+        ])
+        lines += metric_header(f'{prefix}_request_duration_seconds', 'histogram', 'Latencia de los pedidos')
+        for (method, route), histogram in sorted(latencies.items()):
+            lines += histogram_samples(f'{prefix}_request_duration_seconds', histogram.snapshot(),
+                                       {'method': method, 'route': route})
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + '}'
+
+
+def metric_header(name, kind, help_text):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+
+
+def format_metric(name, kind, help_text, samples):
+    """Líneas de texto Prometheus para un contador o gauge: samples es [(labels, valor)]"""
+    lines = metric_header(name, kind, help_text)
+    for labels, value in samples:
+        lines.append(f'{name}{format_labels(labels)} {float(value):g}')
+    return lines
+
+
+def histogram_samples(name, snapshot, labels=None):
+    """Series _bucket, _sum y _count a partir de Histogram.snapshot()"""
+    labels = labels or {}
+    lines = []
+    for limit, count in snapshot['buckets'].items():
+        lines.append(f'{name}_bucket{format_labels(dict(labels, le=f"{limit:g}"))} {count}')
+    lines.append(f'{name}_bucket{format_labels(dict(labels, le="+Inf"))} {snapshot["count"]}')
+    lines.append(f'{name}_sum{format_labels(labels)} {snapshot["sum"]:g}')
+    lines.append(f'{name}_count{format_labels(labels)} {snapshot["count"]}')
+    return lines
+
+
+def format_histogram(name, help_text, snapshot, labels=None):
+    return metric_header(name, 'histogram', help_text) + histogram_samples(name, snapshot, labels)
@@ -0,0 +1,324 @@
+"""Modelo de IA de E.V.A. y manejo de artefactos versionados
+
+Los artefactos se guardan sin compresión para poder cargarlos con
+memory-mapping, sin descomprimir ni copiar los arreglos a un buffer intermedio.
+sklearn copia los nodos de cada árbol a memoria propia al reconstruirlo, así
+que para que los workers compartan una sola copia física del bosque hay que
+cargarlo en el proceso maestro antes de hacer fork (gunicorn --preload).
+Los arreglos planos del bosque (eva_forest) sí se guardan como .npy dentro
+del artefacto y se cargan con memory-mapping real.
+
+sklearn y joblib se importan recién al crear, guardar o cargar un modelo de
+sklearn: leer metadatos o el bosque plano (load_latest_flat_forest) no los
+necesita, y tampoco los módulos que solo usan las constantes de este.
+
+Uso:
+    python eva_model.py train [--data partidos.json|partidos.csv|partidos.jsonl] [--output models]
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+
+from eva_forest import FLAT_DIR, FlatForest
+
+logger = logging.getLogger(__name__)
+
+# Esquema de características que espera el modelo (en orden)
+FEATURE_NAMES = [
+    'speed_diff',
+    'serve_diff',
+    'endurance_diff',
+    'technique_diff',
+    'speed_gap',
+    'player1_overall',
+    'player2_overall'
+]
+SCHEMA_VERSION = 1
+
+# Características opcionales a partir de los ratings Glicko previos al partido
+# (ver eva_ratings): se eligen con el conjunto 'ratings' al entrenar
+RATING_FEATURE_NAMES = ['rating_diff', 'rating_expected']
+FEATURE_SETS = {
+    'base': FEATURE_NAMES,
+    'ratings': FEATURE_NAMES + RATING_FEATURE_NAMES
+}
+
+# Estadísticas base de cada jugador (en el orden que usa el modelo)
+STAT_KEYS = ['speed', 'serve', 'endurance', 'technique']
+
+# Directorio por defecto de los artefactos del modelo
+MODEL_DIR = os.environ.get('EVA_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+
+MODEL_FILE = 'model.joblib'
+METADATA_FILE = 'metadata.json'
+
+# Datos históricos simulados para entrenamiento inicial
+historical_matches = [
+    {'player1_speed': 92, 'player1_serve': 88, 'player1_endurance': 95, 'player1_technique': 94,
+     'player2_speed': 90, 'player2_serve': 89, 'player2_endurance': 96, 'player2_technique': 96, 'winner': 0},
+    {'player1_speed': 88, 'player1_serve': 92, 'player1_endurance': 87, 'player1_technique': 98,
+     'player2_speed': 91, 'player2_serve': 86, 'player2_endurance': 89, 'player2_technique': 90, 'winner': 1},
+    # ... más datos históricos simulados
+]
+
+
+def build_feature_matrix(stats1, stats2, out=None, ratings1=None, ratings2=None):
+    """Construye las características del modelo para muchos pares a la vez
+
+    Con out, escribe directamente en ese arreglo (por ejemplo, una porción de
+    la matriz de entrenamiento) sin crear columnas intermedias. Con ratings1 y
+    ratings2 ((rating, rd) de cada jugador) agrega las de RATING_FEATURE_NAMES.
+    """
+    n_features = len(FEATURE_NAMES) + (len(RATING_FEATURE_NAMES) if ratings1 is not None else 0)
+    if out is None:
+        out = np.empty((len(stats1), n_features), dtype=np.result_type(stats1, stats2, float))
+    np.subtract(stats1, stats2, out=out[:, :4])
+    np.abs(out[:, 0], out=out[:, 4])
+    np.mean(stats1, axis=1, out=out[:, 5])
+    np.mean(stats2, axis=1, out=out[:, 6])
+    if ratings1 is not None:
+        from eva_ratings import expected_score
+
+        np.subtract(ratings1[:, 0], ratings2[:, 0], out=out[:, 7])
+        out[:, 8] = expected_score(ratings1[:, 0], ratings1[:, 1], ratings2[:, 0], ratings2[:, 1])
+    return out
+
+
+def records_to_arrays(matches):
+    """Estadísticas de ambos jugadores y ganador a partir de una lista de partidos"""
+    stats1 = np.array([[match[f'player1_{key}'] for key in STAT_KEYS] for match in matches], dtype=float)
+    stats2 = np.array([[match[f'player2_{key}'] for key in STAT_KEYS] for match in matches], dtype=float)
+    winners = np.array([match['winner'] for match in matches], dtype=np.int8)
+    return stats1.reshape(-1, len(STAT_KEYS)), stats2.reshape(-1, len(STAT_KEYS)), winners
+
+
+def records_to_ratings(matches):
+    """(rating, rd) previos al partido de ambos jugadores (registros anotados con annotate_ratings)"""
+    ratings1 = np.array([[match['player1_rating'], match['player1_rd']] for match in matches], dtype=float)
+    ratings2 = np.array([[match['player2_rating'], match['player2_rd']] for match in matches], dtype=float)
+    return ratings1.reshape(-1, 2), ratings2.reshape(-1, 2)
+
+
+class ModelSchemaError(Exception):
+    """El artefacto no coincide con el esquema de características actual"""
+
+
+class TennisPredictor:
+    def __init__(self, feature_set='base'):
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.preprocessing import StandardScaler
+
+        if feature_set not in FEATURE_SETS:
+            raise ValueError(f"Conjunto de características desconocido: {feature_set}. Opciones: {', '.join(FEATURE_SETS)}")
+        self.feature_set = feature_set
+        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
+        self.scaler = StandardScaler()
+        self.is_trained = False
+        self.version = 0
+        self._flat_forest = None
+
+    def train_model(self, historical_data):
+        """Entrena el modelo con datos históricos"""
+        try:
+            if len(historical_data) > 0:
+                # Características: diferencia en stats entre jugadores
+                stats1, stats2, y = records_to_arrays(historical_data)
+                ratings1, ratings2 = records_to_ratings(historical_data) if self.uses_ratings else (None, None)
+                self.fit_arrays(build_feature_matrix(stats1, stats2, ratings1=ratings1, ratings2=ratings2), y)
+
+        except Exception as e:
+            logger.error(f"Error entrenando modelo: {e}")
+
+    @property
+    def uses_ratings(self):
+        return self.feature_set == 'ratings'
+
+    def fit_arrays(self, X, y, n_jobs=None):
+        """Entrena con la matriz de características ya armada (y = 1 si gana player1)
+
+        El escalado se hace sobre X en el lugar para no duplicar la matriz;
+        n_jobs solo se usa durante el ajuste y no queda guardado en el artefacto.
+        """
+        self.scaler.set_params(copy=False)
+        try:
+            X_scaled = self.scaler.fit_transform(X)
+        finally:
+            self.scaler.set_params(copy=True)
+
+        self.model.set_params(n_jobs=n_jobs)
+        try:
+            self.model.fit(X_scaled, y)
+        finally:
+            self.model.set_params(n_jobs=None)
+        self._flat_forest = None
+        self.is_trained = True
+        self.version += 1
+        logger.info("Modelo E.V.A. entrenado exitosamente")
+
+    def save(self, artifact_dir=MODEL_DIR, n_training_rows=None):
+        """Guarda el modelo como un nuevo artefacto versionado y devuelve su ruta"""
+        if not self.is_trained:
+            raise ValueError('No se puede guardar un modelo sin entrenar')
+        import joblib
+        import sklearn
+
+        os.makedirs(artifact_dir, exist_ok=True)
+        # Nunca reutilizar un número de versión ya usado en memoria o en disco
+        version = max(max(list_artifact_versions(artifact_dir), default=0) + 1, self.version)
+        path = os.path.join(artifact_dir, f'v{version}')
+        os.makedirs(path)
+
+        # Sin compresión: es lo que permite el memory-mapping al cargar
+        joblib.dump({'model': self.model, 'scaler': self.scaler}, os.path.join(path, MODEL_FILE), compress=0)
+
+        metadata = {
+            'version': version,
+            'schema_version': SCHEMA_VERSION,
+            'features': FEATURE_SETS[self.feature_set],
+            'classes': [int(c) for c in self.model.classes_],
+            'sklearn_version': sklearn.__version__,
+            'n_training_rows': n_training_rows,
+            'created_at': datetime.now().isoformat()
+        }
+        self.flat_forest().save(path)
+        with open(os.path.join(path, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+
+        self.version = version
+        logger.info(f"Artefacto del modelo guardado en {path}")
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Carga un artefacto validando su esquema antes de leer el modelo"""
+        import joblib
+        import sklearn
+
+        metadata = read_metadata(path)
+        if metadata.get('sklearn_version') != sklearn.__version__:
+            logger.warning(f"Artefacto entrenado con sklearn {metadata.get('sklearn_version')}, "
+                           f"versión instalada {sklearn.__version__}")
+
+        artifact = joblib.load(os.path.join(path, MODEL_FILE), mmap_mode=mmap_mode)
+
+        predictor = cls(feature_set_of(metadata))
+        predictor.model = artifact['model']
+        predictor.scaler = artifact['scaler']
+        predictor.is_trained = True
+        predictor.version = metadata['version']
+        if os.path.isdir(os.path.join(path, FLAT_DIR)):
+            predictor._flat_forest = FlatForest.load(path, mmap_mode=mmap_mode)
+        return predictor
+
+    def flat_forest(self):
+        """Bosque exportado a arreglos planos (se arma la primera vez que se pide)"""
+        if self._flat_forest is None:
+            self._flat_forest = FlatForest.from_sklearn(self.model, self.scaler)
+        return self._flat_forest
+
+
+def read_metadata(path):
+    """Metadatos de un artefacto; falla si su esquema no es el que espera el modelo"""
+    with open(os.path.join(path, METADATA_FILE), encoding='utf-8') as f:
+        metadata = json.load(f)
+
+    if metadata.get('schema_version') != SCHEMA_VERSION or metadata.get('features') not in FEATURE_SETS.values():
+        raise ModelSchemaError(
+            f"El artefacto {path} usa el esquema {metadata.get('schema_version')} "
+            f"{metadata.get('features')} y se esperaba {SCHEMA_VERSION} con uno de {list(FEATURE_SETS.values())}"
+        )
+    return metadata
+
+
+def feature_set_of(metadata):
+    """Nombre del conjunto de características de un artefacto"""
+    return next(name for name, features in FEATURE_SETS.items() if features == metadata['features'])
+
+
+def list_artifact_versions(artifact_dir=MODEL_DIR):
+    """Lista las versiones de artefactos disponibles en el directorio"""
+    if not os.path.isdir(artifact_dir):
+        return []
+    versions = []
+    for name in os.listdir(artifact_dir):
+        if name.startswith('v') and name[1:].isdigit() and os.path.isfile(os.path.join(artifact_dir, name, METADATA_FILE)):
+            versions.append(int(name[1:]))
+    return sorted(versions)
+
+
+def load_latest_predictor(artifact_dir=MODEL_DIR):
+    """Carga el artefacto más reciente, o None si todavía no hay ninguno"""
+    versions = list_artifact_versions(artifact_dir)
+    if not versions:
+        return None
+    return TennisPredictor.load(os.path.join(artifact_dir, f'v{versions[-1]}'))
+
+
+def load_latest_flat_forest(artifact_dir=MODEL_DIR):
+    """(bosque plano, metadatos) del artefacto más reciente, sin importar sklearn
+
+    Devuelve None si no hay artefactos o si el más reciente no trae el bosque
+    plano (artefactos guardados antes de eva_forest).
+    """
+    versions = list_artifact_versions(artifact_dir)
+    if not versions:
+        return None
+    path = os.path.join(artifact_dir, f'v{versions[-1]}')
+    metadata = read_metadata(path)
+    if not os.path.isdir(os.path.join(path, FLAT_DIR)):
+        return None
+    return FlatForest.load(path), metadata
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Entrenamiento de modelos E.V.A.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train', help='Entrena y guarda un nuevo artefacto')
+    train_parser.add_argument('--data', help='Partidos históricos: lista JSON, CSV o JSON-lines')
+    train_parser.add_argument('--output', default=MODEL_DIR, help='Directorio de artefactos')
+    train_parser.add_argument('--chunk-size', type=int, default=None, help='Filas leídas por bloque (CSV/JSON-lines)')
+    train_parser.add_argument('--n-jobs', type=int, default=-1, help='Procesos para el ajuste (-1 = todos los núcleos)')
+    train_parser.add_argument('--max-samples', type=float, default=None,
+                              help='Fracción de filas que ve cada árbol (acota tiempo y tamaño con historias grandes)')
+    train_parser.add_argument('--features', choices=sorted(FEATURE_SETS), default='base',
+                              help='Conjunto de características (ratings agrega los ratings Glicko previos a cada partido)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.data and not args.data.endswith('.json'):
+        if args.features != 'base':
+            parser.error('--features ratings necesita una lista JSON (los ratings se reproducen en orden)')
+        # Historias grandes: lectura por bloques con memoria acotada
+        from eva_dataset import DEFAULT_CHUNK_SIZE, train_from_file
+
+        predictor = TennisPredictor()
+        report = train_from_file(predictor, args.data, chunk_size=args.chunk_size or DEFAULT_CHUNK_SIZE,
+                                 n_jobs=args.n_jobs, max_samples=args.max_samples)
+        path = predictor.save(args.output, n_training_rows=report['rows'])
+        print(json.dumps(report, indent=2))
+        print(f"Modelo v{predictor.version} guardado en {path}")
+        return
+
+    if args.data:
+        with open(args.data, encoding='utf-8') as f:
+            matches = json.load(f)
+    else:
+        matches = historical_matches
+
+    predictor = TennisPredictor(args.features)
+    if predictor.uses_ratings:
+        from eva_training import annotate_ratings
+
+        matches = annotate_ratings(matches)
+    predictor.train_model(matches)
+    path = predictor.save(args.output, n_training_rows=len(matches))
+    print(f"Modelo v{predictor.version} guardado en {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Optimizador de cuadros por recocido simulado (simulated annealing)
+
+Cada candidato se evalúa con las probabilidades exactas de eva_bracket, así
+que no hay ruido de muestreo. La búsqueda corre contra un presupuesto de
+tiempo real y los reinicios independientes se reparten en un pool de procesos.
+"""
+import math
+import os
+import time
+
+import numpy as np
+
+from eva_bracket import BYE, exact_slot_probabilities, expected_round_closeness, round_count, seeded_draw
+
+# Segundos entre avisos de progreso de la búsqueda
+PROGRESS_INTERVAL = 0.25
+
+# Jugadores protegidos en el objetivo 'protect_seeds' (los que deberían llegar a semifinales)
+PROTECTED_SEEDS = 4
+
+# Intentos para juntar los intercambios que fijan la temperatura inicial
+TEMPERATURE_SAMPLES = 20
+
+
+def player_strength(win_matrix):
+    """Probabilidad media de victoria de cada jugador contra el resto del plantel"""
+    n = win_matrix.shape[0]
+    return (win_matrix.sum(axis=1) - np.diag(win_matrix)) / max(n - 1, 1)
+
+
+def competitiveness_objective(win_matrix, draw, context):
+    """Paridad esperada de los partidos, pesando más las rondas finales"""
+    closeness = expected_round_closeness(win_matrix, draw)
+    weights = 2.0 ** np.arange(len(closeness))
+    return float(closeness @ weights / weights.sum())
+
+
+def protect_seeds_objective(win_matrix, draw, context):
+    """Probabilidad media de que los mejores jugadores lleguen a la ronda de 'protegidos'"""
+    protected = context['protected']
+    slot_probabilities = exact_slot_probabilities(win_matrix, draw)
+    # Rondas a ganar para quedar entre los últimos len(protected) jugadores
+    rounds_to_win = round_count(draw) - int(math.log2(len(protected)))
+    if rounds_to_win <= 0:
+        return 1.0
+    slots = np.flatnonzero(np.isin(draw, protected))
+    return float(slot_probabilities[rounds_to_win - 1, slots].mean())
+
+
+def swap_slots(draw, i, j):
+    """Intercambia dos lugares si el cuadro sigue válido; devuelve si lo hizo
+
+    Un cuadro válido no tiene partidos de primera ronda entre dos byes (como
+    los que arma seeded_draw): un bye solo se mueve a un partido que no tenga
+    otro bye o dentro de su mismo partido.
+    """
+    if draw[i] == draw[j]:
+        # Intercambiar dos byes no cambia nada
+        return False
+    draw[[i, j]] = draw[[j, i]]
+    pairs = np.array([i // 2, j // 2])
+    if np.any((draw[2 * pairs] == BYE) & (draw[2 * pairs + 1] == BYE)):
+        draw[[i, j]] = draw[[j, i]]
+        return False
+    return True
+
+
+OBJECTIVES = {
+    'competitiveness': competitiveness_objective,
+    'protect_seeds': protect_seeds_objective
+}
+
+
+def objective_context(win_matrix, n_players):
+    """Datos fijos que necesitan los objetivos (independientes del cuadro)"""
+    strength = player_strength(win_matrix)
+    ranked = np.argsort(strength)[::-1]
+    size = len(seeded_draw(ranked))
+    protected = min(PROTECTED_SEEDS, size // 2, n_players)
+    # Potencia de 2 para que coincida con una ronda del cuadro
+    protected = 2 ** int(math.log2(max(protected, 1)))
+    return {'ranked': ranked, 'protected': ranked[:protected]}
+
+
+def anneal_bracket(win_matrix, objective, time_budget, seed=None, initial_draw=None,
+                   on_progress=None, should_stop=None):
+    """Recocido simulado sobre el cuadro intercambiando pares de lugares
+
+    La temperatura baja de forma geométrica con el tiempo transcurrido, así la
+    búsqueda se adapta al presupuesto sin importar cuánto cuesta evaluar.
+    on_progress(best_draw, best_score, evaluations) se llama periódicamente y
+    should_stop() permite cortar la búsqueda antes de tiempo.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    n_players = win_matrix.shape[0]
+    score_fn = OBJECTIVES[objective]
+    context = objective_context(win_matrix, n_players)
+
+    if initial_draw is None:
+        draw = seeded_draw(rng.permutation(n_players))
+    else:
+        draw = np.array(initial_draw, dtype=np.int64)
+    size = len(draw)
+
+    current = score_fn(win_matrix, draw, context)
+    best_draw, best = draw.copy(), current
+    evaluations = 1
+    accepted = 0
+    improvements = 0
+
+    # Temperatura inicial según la variación típica de un intercambio válido
+    deltas = []
+    for _ in range(TEMPERATURE_SAMPLES * 5):
+        if len(deltas) >= min(TEMPERATURE_SAMPLES, size):
+            break
+        i, j = rng.choice(size, 2, replace=False)
+        candidate = draw.copy()
+        if not swap_slots(candidate, i, j):
+            continue
+        deltas.append(abs(score_fn(win_matrix, candidate, context) - current))
+        evaluations += 1
+    initial_temperature = max(float(np.mean(deltas)) if deltas else 0.0, 1e-9)
+    final_temperature = initial_temperature * 1e-3
+    last_progress = start
+
+    while True:
+        now = time.perf_counter()
+        elapsed = now - start
+        if elapsed >= time_budget or (should_stop is not None and should_stop()):
+            break
+        if on_progress is not None and now - last_progress >= PROGRESS_INTERVAL:
+            on_progress(best_draw, best, evaluations)
+            last_progress = now
+        temperature = initial_temperature * (final_temperature / initial_temperature) ** (elapsed / time_budget)
+
+        i, j = rng.choice(size, 2, replace=False)
+        if not swap_slots(draw, i, j):
+            continue
+        score = score_fn(win_matrix, draw, context)
+        evaluations += 1
+
+        if score >= current or rng.random() < math.exp((score - current) / temperature):
+            current = score
+            accepted += 1
+            if score > best:
+                best, best_draw = score, draw.copy()
+                improvements += 1
+        else:
+            draw[[i, j]] = draw[[j, i]]
+
+    elapsed = time.perf_counter() - start
+    return {
+        'draw': best_draw,
+        'score': best,
+        'stats': {
+            'seed': seed,
+            'evaluations': evaluations,
+            'accepted_moves': accepted,
+            'improvements': improvements,
+            'elapsed_seconds': elapsed,
+            'evaluations_per_second': evaluations / elapsed if elapsed > 0 else 0.0
+        }
+    }
+
+
+def optimize_bracket(win_matrix, objective='competitiveness', time_budget=1.0, restarts=4,
+                     executor=None, seed=None, on_progress=None, should_stop=None):
+    """Mejor cuadro entre varios reinicios independientes del recocido
+
+    El primer reinicio parte de la siembra clásica por fuerza; el resto, de
+    sorteos al azar. Con un executor, los reinicios corren en paralelo; los
+    callbacks de progreso y corte solo se usan al correr en serie.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Objetivo desconocido: {objective}. Opciones: {', '.join(OBJECTIVES)}")
+
+    start = time.perf_counter()
+    n_players = win_matrix.shape[0]
+    context = objective_context(win_matrix, n_players)
+    seeds = np.random.SeedSequence(seed).generate_state(restarts)
+    initial_draws = [seeded_draw(context['ranked'])] + [None] * (restarts - 1)
+    baseline = OBJECTIVES[objective](win_matrix, initial_draws[0], context)
+
+    # El presupuesto total se reparte entre las tandas de reinicios: en serie
+    # hay una por reinicio; en paralelo, una por cada max_workers reinicios
+    workers = 1
+    if executor is not None:
+        workers = getattr(executor, '_max_workers', None) or os.cpu_count() or 1
+    restart_budget = time_budget / math.ceil(restarts / workers)
+    jobs = [(win_matrix, objective, restart_budget, int(s), d) for s, d in zip(seeds, initial_draws)]
+    if executor is None:
+        results = []
+        best_so_far = {'score': baseline, 'draw': initial_draws[0]}
+
+        def report(draw, score, evaluations):
+            # Informar solo el mejor cuadro entre todos los reinicios
+            if score > best_so_far['score']:
+                best_so_far.update(score=score, draw=draw.copy())
+            on_progress(best_so_far['draw'], best_so_far['score'], evaluations)
+
+        for job in jobs:
+            if results and should_stop is not None and should_stop():
+                break
+            results.append(anneal_bracket(*job, on_progress=report if on_progress else None,
+                                          should_stop=should_stop))
+    else:
+        futures = [executor.submit(anneal_bracket, *job) for job in jobs]
+        results = [future.result() for future in futures]
+
+    best = max(results, key=lambda r: r['score'])
+    return {
+        'draw': best['draw'],
+        'score': best['score'],
+        'baseline_score': baseline,
+        'objective': objective,
+        'stats': {
+            'restarts': restarts,
+            'parallel': executor is not None,
+            'time_budget_seconds': time_budget,
+            'elapsed_seconds': time.perf_counter() - start,
+            'evaluations': sum(r['stats']['evaluations'] for r in results),
+            'restart_scores': [r['score'] for r in results],
+            'per_restart': [r['stats'] for r in results]
+        }
+    }
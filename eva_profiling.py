@@ -0,0 +1,83 @@
+"""Perfilado de pedidos individuales con cProfile
+
+Un pedido con el encabezado de perfilado corre bajo cProfile; el resumen de
+las funciones más costosas se guarda en memoria (los últimos MAX_PROFILES) y
+se puede consultar por id. Solo se perfila un pedido a la vez.
+"""
+import cProfile
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Perfiles guardados y funciones que se informan de cada uno
+MAX_PROFILES = 20
+TOP_FUNCTIONS = 25
+
+
+class RequestProfiler:
+    def __init__(self, max_profiles=MAX_PROFILES, top=TOP_FUNCTIONS):
+        self.max_profiles = max_profiles
+        self.top = top
+        self._profiles = OrderedDict()
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Empieza a perfilar el hilo actual; None si ya hay otro pedido en perfilado"""
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile, time.perf_counter()
+
+    def stop(self, session, description):
+        """Detiene el perfilado, guarda el resumen y devuelve su id"""
+        profile, started = session
+        try:
+            profile.disable()
+        finally:
+            self._busy.release()
+
+        summary = {
+            'profile_id': uuid.uuid4().hex,
+            'request': description,
+            'wall_seconds': time.perf_counter() - started,
+            'created_at': time.time(),
+            'top_functions': self.top_functions(profile)
+        }
+        with self._lock:
+            self._profiles[summary['profile_id']] = summary
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        return summary
+
+    def top_functions(self, profile):
+        """Funciones con más tiempo propio, con su tiempo acumulado y cantidad de llamadas"""
+        stats = pstats.Stats(profile).stats
+        rows = []
+        for (filename, line, function), (_, calls, own, cumulative, _) in stats.items():
+            rows.append({
+                'function': function,
+                'location': f'{os.path.basename(filename)}:{line}',
+                'calls': calls,
+                'own_seconds': own,
+                'cumulative_seconds': cumulative
+            })
+        rows.sort(key=lambda row: row['own_seconds'], reverse=True)
+        return rows[:self.top]
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        """Resumen de los perfiles guardados, del más nuevo al más viejo"""
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {key: profile[key] for key in ('profile_id', 'request', 'wall_seconds', 'created_at')}
+            for profile in reversed(profiles)
+        ]
@@ -0,0 +1,175 @@
+"""Ratings Glicko de los jugadores a partir de los resultados reales
+
+Cada jugador tiene un rating y una desviación (RD) en arreglos de NumPy
+indexados por una fila por id. Un partido nuevo se aplica en O(1); un log
+largo se reproduce por períodos de rating (como define Glicko): todos los
+partidos de un período usan los ratings de antes del período y las
+actualizaciones de cada jugador se suman con bincount, sin recorrer los
+partidos uno por uno.
+
+Un jugador sin partidos arranca con un rating derivado de su poder (ver
+rating_prior): con la escala POWER_TO_RATING la probabilidad esperada entre
+dos jugadores sin historia es la misma curva logística sobre la diferencia de
+poder que usaba el servidor como fallback, achicada hacia 50% por la RD.
+"""
+import math
+import threading
+
+import numpy as np
+
+BASE_RATING = 1500.0
+MAX_RD = 350.0
+# Piso de la RD: evita que los ratings se congelen después de muchos partidos
+MIN_RD = 50.0
+
+# Poder que corresponde a BASE_RATING y puntos de rating por punto de poder
+# (la curva 1 / (1 + exp(-Δpoder / 5)) es Elo con Δrating = Δpoder * 400 / (5 ln 10))
+POWER_CENTER = 75.0
+POWER_TO_RATING = 400 / (5 * math.log(10))
+
+# Partidos por período al reproducir un log
+REPLAY_PERIOD = 256
+
+Q = math.log(10) / 400
+
+
+def g(rd):
+    """Factor de Glicko que descuenta la incertidumbre del rival"""
+    return 1 / np.sqrt(1 + 3 * Q ** 2 * np.square(rd) / math.pi ** 2)
+
+
+def expected_score(rating1, rd1, rating2, rd2):
+    """Probabilidad de que gane el jugador 1, con la incertidumbre de ambos"""
+    combined = np.sqrt(np.square(rd1) + np.square(rd2))
+    return 1 / (1 + 10 ** (-g(combined) * (np.asarray(rating1) - rating2) / 400))
+
+
+def rating_prior(power):
+    """Rating inicial de jugadores sin partidos, a partir de su poder"""
+    return BASE_RATING + (np.asarray(power, dtype=float) - POWER_CENTER) * POWER_TO_RATING
+
+
+def glicko_period(rating, rd, rows1, rows2, score1):
+    """Aplica un período de partidos sobre rating y rd (en el lugar)
+
+    rows1 y rows2 son las filas de los jugadores de cada partido y score1 vale
+    1 si ganó el jugador 1. Todos los partidos usan los valores previos al
+    período; un jugador con varios partidos suma sus términos.
+    """
+    players = np.concatenate([rows1, rows2])
+    opponents = np.concatenate([rows2, rows1])
+    scores = np.concatenate([score1, 1 - np.asarray(score1, dtype=float)])
+
+    g_opponent = g(rd[opponents])
+    expected = 1 / (1 + 10 ** (-g_opponent * (rating[players] - rating[opponents]) / 400))
+    # Sumas por jugador sobre los que jugaron en el período, no sobre todo el arreglo
+    touched, slot = np.unique(players, return_inverse=True)
+    inv_d2 = np.bincount(slot, Q ** 2 * g_opponent ** 2 * expected * (1 - expected), minlength=len(touched))
+    delta = np.bincount(slot, g_opponent * (scores - expected), minlength=len(touched))
+
+    variance = 1 / (1 / np.square(rd[touched]) + inv_d2)
+    rating[touched] += Q * variance * delta
+    rd[touched] = np.maximum(np.sqrt(variance), MIN_RD)
+
+
+class RatingStore:
+    def __init__(self, capacity=1024):
+        self.rating = np.empty(capacity)
+        self.rd = np.empty(capacity)
+        self.games = np.zeros(capacity, dtype=np.int64)
+        self.index = {}
+        # Cantidad de partidos aplicados (sirve como versión de los ratings)
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def _grow(self, size):
+        capacity = len(self.rating)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+        for name in ('rating', 'rd', 'games'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def rows(self, player_ids, power):
+        """Filas de los jugadores; los nuevos se agregan con su rating inicial"""
+        rows = np.empty(len(player_ids), dtype=np.int64)
+        for k, player_id in enumerate(player_ids):
+            row = self.index.get(player_id)
+            if row is None:
+                row = len(self.index)
+                self._grow(row + 1)
+                self.index[player_id] = row
+                self.rating[row] = rating_prior(power[k])
+                self.rd[row] = MAX_RD
+            rows[k] = row
+        return rows
+
+    def lookup(self, player_ids, power):
+        """(rating, rd) de cada jugador, sin agregar a los que no tienen partidos"""
+        prior = rating_prior(power)
+        result = np.column_stack([prior, np.full(len(player_ids), MAX_RD)])
+        for k, player_id in enumerate(player_ids):
+            row = self.index.get(player_id)
+            if row is not None:
+                result[k] = self.rating[row], self.rd[row]
+        return result
+
+    def update(self, player1_id, player2_id, player1_won, power1, power2):
+        """Aplica un partido en O(1); devuelve los (rating, rd) de ambos antes del partido"""
+        with self._lock:
+            rows = self.rows([player1_id, player2_id], [power1, power2])
+            before = np.column_stack([self.rating[rows], self.rd[rows]])
+            glicko_period(self.rating, self.rd, rows[:1], rows[1:], [float(player1_won)])
+            self.games[rows] += 1
+            self.version += 1
+        return before
+
+    def replay(self, player1_ids, player2_ids, player1_won, power1, power2, period=REPLAY_PERIOD):
+        """Reproduce partidos en orden, un período de rating por vez
+
+        Devuelve los (rating, rd) de ambos jugadores antes del período de cada
+        partido: arreglos (n, 2) para usar como características sin mirar el
+        resultado.
+        """
+        with self._lock:
+            rows1 = self.rows(player1_ids, power1)
+            rows2 = self.rows(player2_ids, power2)
+            scores = np.asarray(player1_won, dtype=float)
+            before1 = np.empty((len(rows1), 2))
+            before2 = np.empty((len(rows2), 2))
+            for start in range(0, len(rows1), period):
+                chunk = slice(start, start + period)
+                before1[chunk, 0], before1[chunk, 1] = self.rating[rows1[chunk]], self.rd[rows1[chunk]]
+                before2[chunk, 0], before2[chunk, 1] = self.rating[rows2[chunk]], self.rd[rows2[chunk]]
+                glicko_period(self.rating, self.rd, rows1[chunk], rows2[chunk], scores[chunk])
+            np.add.at(self.games, rows1, 1)
+            np.add.at(self.games, rows2, 1)
+            self.version += len(rows1)
+        return before1, before2
+
+    def win_matrix(self, player_ids, power):
+        """Matriz (n, n) de probabilidades de que i le gane a j según los ratings"""
+        ratings = self.lookup(player_ids, power)
+        matrix = expected_score(ratings[:, None, 0], ratings[:, None, 1], ratings[None, :, 0], ratings[None, :, 1])
+        np.fill_diagonal(matrix, 0.5)
+        return matrix
+
+    def top(self, k=10):
+        """Los k jugadores con mejor rating: (id, rating, rd, partidos)"""
+        # Las filas se asignan en orden de llegada, igual que el orden del dict
+        ids = list(self.index)
+        best = np.argsort(-self.rating[:len(ids)], kind='stable')[:k]
+        return [(ids[row], float(self.rating[row]), float(self.rd[row]), int(self.games[row])) for row in best]
+
+    def stats(self):
+        return {
+            'players': len(self),
+            'matches': self.version,
+            'replay_period': REPLAY_PERIOD
+        }
@@ -0,0 +1,148 @@
+"""Registro columnar de jugadores con búsqueda por id
+
+Las estadísticas de todo el plantel viven en un arreglo estructurado de NumPy,
+de modo que poder, consistencia y características del modelo se calculan para
+todos los jugadores en una sola operación vectorizada.
+"""
+import json
+import logging
+
+import numpy as np
+
+from eva_model import STAT_KEYS, build_feature_matrix
+
+logger = logging.getLogger(__name__)
+
+# Pesos de cada estadística en el poder general (mismo orden que STAT_KEYS)
+POWER_WEIGHTS = np.array([0.25, 0.30, 0.20, 0.25])
+
+# Valor usado cuando la base de datos no trae una estadística
+DEFAULT_STAT = 50.0
+
+PLAYER_DTYPE = np.dtype([
+    ('id', np.int64),
+    ('stats', np.float64, (len(STAT_KEYS),))
+])
+
+
+class UnknownPlayerError(KeyError):
+    """Se pidió un id que no existe en el registro"""
+
+
+def roster_power(stats):
+    """Poder general de cada jugador a partir de la matriz de estadísticas"""
+    return stats @ POWER_WEIGHTS
+
+
+def roster_overall(stats):
+    """Promedio simple de las estadísticas de cada jugador"""
+    return stats.mean(axis=1)
+
+
+def roster_consistency(stats):
+    """Consistencia de cada jugador: menor desviación = mayor consistencia"""
+    return np.maximum(0, 100 - stats.std(axis=1) * 10)
+
+
+def roster_pair_features(stats, ratings=None):
+    """Filas del modelo para todos los pares (i, j) del plantel, en orden de fila
+
+    Con ratings ((n, 2) de rating y RD) se agregan las características de ratings.
+    """
+    n = len(stats)
+    rows, cols = np.divmod(np.arange(n * n), n)
+    if ratings is None:
+        return build_feature_matrix(stats[rows], stats[cols])
+    return build_feature_matrix(stats[rows], stats[cols], ratings1=ratings[rows], ratings2=ratings[cols])
+
+
+def roster_win_matrix(stats, proba=None):
+    """Matriz (n, n) de probabilidades de que i le gane a j
+
+    proba es la salida del modelo para roster_pair_features (ya como n x n)
+    o la matriz de los ratings; sin ella se usa una curva logística sobre la
+    diferencia de poder.
+    """
+    if proba is None:
+        power = roster_power(stats)
+        proba = 1 / (1 + np.exp(-(power[:, None] - power[None, :]) / 5))
+
+    # Forzar P(i gana a j) + P(j gana a i) = 1
+    win_matrix = (proba + 1 - proba.T) / 2
+    np.fill_diagonal(win_matrix, 0.5)
+    return win_matrix
+
+
+class PlayerRegistry:
+    def __init__(self, players):
+        self.table = np.zeros(len(players), dtype=PLAYER_DTYPE)
+        self.info = []
+        self.index = {}
+
+        missing = 0
+        for row, player in enumerate(players):
+            stats = []
+            for key in STAT_KEYS:
+                value = player.get(key)
+                if value is None:
+                    missing += 1
+                    value = DEFAULT_STAT
+                stats.append(value)
+            self.table[row] = (player['id'], stats)
+            self.index[player['id']] = row
+            # Datos descriptivos (nombre, país, estilo...) fuera del arreglo numérico
+            self.info.append({k: v for k, v in player.items() if k not in STAT_KEYS})
+
+        if missing:
+            logger.warning(f"{missing} estadísticas faltantes en el registro, usando {DEFAULT_STAT}")
+
+    @classmethod
+    def from_file(cls, path):
+        """Carga el registro desde un JSON con formato de players-database.json"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        players = data['players'] if isinstance(data, dict) else data
+        registry = cls(players)
+        logger.info(f"Registro de jugadores cargado: {len(registry)} jugadores desde {path}")
+        return registry
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def ids(self):
+        return self.table['id']
+
+    @property
+    def stats(self):
+        """Matriz (n, 4) de estadísticas, sin copiar el arreglo"""
+        return self.table['stats']
+
+    def rows(self, player_ids):
+        """Convierte una lista de ids en las filas correspondientes del registro"""
+        try:
+            return np.array([self.index[player_id] for player_id in player_ids], dtype=np.int64)
+        except KeyError as e:
+            raise UnknownPlayerError(f"Jugador desconocido: {e.args[0]}") from None
+
+    def get_players(self, player_ids):
+        """Devuelve los jugadores como diccionarios (formato de los endpoints)"""
+        players = []
+        for row in self.rows(player_ids):
+            player = dict(self.info[row])
+            player.update(zip(STAT_KEYS, self.stats[row].tolist()))
+            players.append(player)
+        return players
+
+    def power(self, rows=None):
+        return roster_power(self.stats if rows is None else self.stats[rows])
+
+    def overall(self, rows=None):
+        return roster_overall(self.stats if rows is None else self.stats[rows])
+
+    def consistency(self, rows=None):
+        return roster_consistency(self.stats if rows is None else self.stats[rows])
+
+    def pair_features(self, rows1, rows2):
+        """Características del modelo para los pares (rows1[k], rows2[k])"""
+        return build_feature_matrix(self.stats[rows1], self.stats[rows2])
@@ -0,0 +1,146 @@
+"""Reporte del torneo como generadores de texto, CSV o JSON-lines
+
+Cada generador produce el reporte por partes: las secciones de jugadores se
+arman en lotes de REPORT_BATCH_SIZE con las métricas ya calculadas de forma
+vectorizada, así el servidor puede empezar a enviar la respuesta antes de
+terminarla y nunca concatena el reporte completo.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+import numpy as np
+
+from eva_model import STAT_KEYS
+from eva_registry import roster_consistency, roster_power
+
+# Jugadores por bloque enviado
+REPORT_BATCH_SIZE = 500
+
+REPORT_MIMETYPES = {
+    'text': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson'
+}
+
+CSV_COLUMNS = ['rank', 'id', 'name', 'country', 'style'] + STAT_KEYS + ['power', 'consistency']
+
+TEXT_INSIGHTS = [
+    "• Los jugadores con alta consistencia suelen rendir mejor en torneos\n",
+    "• El factor mental es crucial en fases finales\n",
+    "• La adaptación a diferentes estilos es clave para el éxito\n",
+    "• E.V.A. recomienda monitorear la condición física en torneos largos\n\n"
+]
+
+
+def player_metrics(players):
+    """Poder y consistencia de todo el plantel en una sola pasada"""
+    stats = np.array([[player[key] for key in STAT_KEYS] for player in players], dtype=float)
+    stats = stats.reshape(len(players), len(STAT_KEYS))
+    return roster_power(stats), roster_consistency(stats)
+
+
+def batches(n, size=REPORT_BATCH_SIZE):
+    for start in range(0, n, size):
+        yield start, min(start + size, n)
+
+
+def iter_text_report(players, tournament, generated_at=None):
+    """Reporte de texto legible, por partes"""
+    generated_at = generated_at or datetime.now()
+    power, consistency = player_metrics(players)
+
+    yield ("REPORTE COMPLETO DEL TORNEO - E.V.A. IA ADVANCED\n" + "=" * 60 + "\n\n"
+           f"Fecha de generación: {generated_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
+           f"Jugadores analizados: {len(players)}\n\n"
+           "ANÁLISIS DE JUGADORES:\n" + "-" * 30 + "\n")
+
+    for start, end in batches(len(players)):
+        yield ''.join(
+            f"{i + 1}. {players[i]['name']} ({players[i]['country']})\n"
+            f"   Poder: {power[i]:.1f} | Consistencia: {consistency[i]:.1f}%\n"
+            f"   Estilo: {players[i].get('style', 'N/A')}\n\n"
+            for i in range(start, end)
+        )
+
+    # Estadísticas del torneo
+    if tournament.get('champion'):
+        section = ["RESULTADOS DEL TORNEO:\n", "-" * 25 + "\n",
+                   f"Campeón: {tournament['champion']['name']}\n",
+                   f"País ganador: {tournament['champion']['country']}\n\n"]
+        if tournament.get('stats'):
+            stats = tournament['stats']
+            section.append("ESTADÍSTICAS DESTACADAS:\n")
+            if stats.get('fastestPlayer'):
+                section.append(f"• Jugador más rápido: {stats['fastestPlayer']['name']}\n")
+            if stats.get('bestServer'):
+                section.append(f"• Mejor saque: {stats['bestServer']['name']}\n")
+            if stats.get('longestMatch'):
+                match = stats['longestMatch']
+                section.append(f"• Partido más largo: {match['player1']['name']} vs {match['player2']['name']}\n")
+        yield ''.join(section)
+
+    yield ("INSIGHTS DE E.V.A. IA:\n" + "-" * 25 + "\n" + ''.join(TEXT_INSIGHTS) +
+           "PREDICCIONES FUTURAS:\n" + "-" * 25 + "\n"
+           "Basado en el análisis actual, E.V.A. identifica potencial de mejora\n"
+           "en el 75% de los jugadores mediante entrenamiento específico.\n\n"
+           "FIN DEL REPORTE\n" + "=" * 60 + "\n")
+
+
+def iter_csv_report(players, tournament, generated_at=None):
+    """Una fila por jugador con sus estadísticas y métricas (sin los datos del torneo)"""
+    power, consistency = player_metrics(players)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(CSV_COLUMNS)
+
+    for start, end in batches(len(players)):
+        writer.writerows(
+            [i + 1, players[i].get('id'), players[i]['name'], players[i].get('country'), players[i].get('style')] +
+            [players[i][key] for key in STAT_KEYS] +
+            [round(float(power[i]), 2), round(float(consistency[i]), 2)]
+            for i in range(start, end)
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_jsonl_report(players, tournament, generated_at=None):
+    """Un objeto JSON por línea: encabezado, jugadores, torneo y cierre (campo 'type')"""
+    generated_at = generated_at or datetime.now()
+    power, consistency = player_metrics(players)
+    yield json.dumps({'type': 'header', 'generated_at': generated_at.isoformat(), 'players': len(players)}) + '\n'
+
+    for start, end in batches(len(players)):
+        yield ''.join(
+            json.dumps({
+                'type': 'player',
+                'rank': i + 1,
+                'id': players[i].get('id'),
+                'name': players[i]['name'],
+                'country': players[i].get('country'),
+                'style': players[i].get('style'),
+                'stats': {key: players[i][key] for key in STAT_KEYS},
+                'power': float(power[i]),
+                'consistency': float(consistency[i])
+            }, ensure_ascii=False) + '\n'
+            for i in range(start, end)
+        )
+
+    if tournament.get('champion'):
+        champion = tournament['champion']
+        yield json.dumps({
+            'type': 'tournament',
+            'champion': {'id': champion.get('id'), 'name': champion['name'], 'country': champion.get('country')},
+            'stats': tournament.get('stats', {})
+        }, ensure_ascii=False) + '\n'
+    yield json.dumps({'type': 'end', 'players': len(players)}) + '\n'
+
+
+REPORT_GENERATORS = {
+    'text': iter_text_report,
+    'csv': iter_csv_report,
+    'jsonl': iter_jsonl_report
+}
@@ -0,0 +1,178 @@
+"""Análisis de sensibilidad: cuánto cambia la chance de título con cada estadística
+
+Cada escenario sube o baja una estadística de un jugador en un delta. Eso
+cambia solo la fila y la columna de ese jugador en la matriz de
+probabilidades, así que por escenario alcanza con 2n filas del modelo (ida y
+vuelta contra cada rival, como en roster_win_matrix) y el resto de la matriz
+es la base. Las filas de todos los escenarios van en una sola inferencia.
+Sin modelo, la base y las filas salen de los ratings (el mismo fallback de
+la matriz del plantel), así que solo se mueven los jugadores sin partidos.
+
+Las probabilidades exactas de título se calculan por bloques de escenarios
+en un tensor (escenarios, n, n), con menos escenarios por bloque cuanto más
+grande es el plantel. Con un pool de procesos, la matriz base, las
+filas nuevas y la salida viven en un único bloque de memoria compartida: cada
+tarea recibe solo el nombre del bloque y su rango de escenarios.
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from eva_bracket import exact_bracket_probabilities_batch
+from eva_model import build_feature_matrix
+from eva_ratings import expected_score
+
+# Grilla de deltas por defecto (puntos de la estadística)
+DEFAULT_DELTAS = (-10, -8, -6, -4, -2, 2, 4, 6, 8, 10)
+
+# Rango válido de las estadísticas perturbadas
+STAT_RANGE = (0.0, 100.0)
+
+# Escenarios por tensor (y por tarea del pool), y celdas máximas de ese
+# tensor: con planteles grandes el bloque se achica hasta un escenario
+SENSITIVITY_CHUNK = 32
+SENSITIVITY_CHUNK_CELLS = 1 << 22
+
+
+def scenario_grid(targets, stat_indices, deltas):
+    """Jugador, estadística y delta de cada escenario (jugador > estadística > delta)"""
+    player, stat, delta = np.meshgrid(np.asarray(targets, dtype=np.int64), np.asarray(stat_indices, dtype=np.int64),
+                                      np.asarray(deltas, dtype=float), indexing='ij')
+    return player.ravel(), stat.ravel(), delta.ravel()
+
+
+def perturbed_stats(stats, player, stat, delta):
+    """Estadísticas del jugador de cada escenario con el delta aplicado, acotadas a STAT_RANGE"""
+    perturbed = stats[player].copy()
+    perturbed[np.arange(len(player)), stat] += delta
+    return np.clip(perturbed, *STAT_RANGE)
+
+
+def scenario_pair_features(stats, player, perturbed, ratings=None):
+    """Filas del modelo de cada escenario: (perturbado, j) y luego (j, perturbado) para todo j
+
+    ratings ((n, 2) de rating y RD) agrega las características de ratings,
+    que no cambian con la perturbación.
+    """
+    n_scenarios, n = len(perturbed), len(stats)
+    own = np.repeat(perturbed, n, axis=0)
+    rivals = np.tile(stats, (n_scenarios, 1))
+    own_ratings = np.repeat(ratings[player], n, axis=0) if ratings is not None else None
+    rival_ratings = np.tile(ratings, (n_scenarios, 1)) if ratings is not None else None
+    forward = build_feature_matrix(own, rivals, ratings1=own_ratings, ratings2=rival_ratings)
+    backward = build_feature_matrix(rivals, own, ratings1=rival_ratings, ratings2=own_ratings)
+    n_features = forward.shape[1]
+    return np.concatenate([forward.reshape(n_scenarios, n, n_features), backward.reshape(n_scenarios, n, n_features)],
+                          axis=1).reshape(-1, n_features)
+
+
+def scenario_rating_proba(ratings, own_ratings):
+    """Probabilidades por ratings de cada escenario, con la forma de la salida del modelo
+
+    ratings ((n, 2) de rating y RD) son los del plantel y own_ratings
+    ((escenarios, 2)) los del jugador perturbado en cada escenario.
+    """
+    forward = expected_score(own_ratings[:, None, 0], own_ratings[:, None, 1], ratings[None, :, 0], ratings[None, :, 1])
+    return np.concatenate([forward, 1 - forward], axis=1).ravel()
+
+
+def scenario_rows(proba, player):
+    """Fila nueva de la matriz (simetrizada como roster_win_matrix) de cada escenario"""
+    n_scenarios = len(player)
+    proba = np.asarray(proba, dtype=float).reshape(n_scenarios, 2, -1)
+    rows = (proba[:, 0] + 1 - proba[:, 1]) / 2
+    rows[np.arange(n_scenarios), player] = 0.5
+    return rows
+
+
+def champion_probabilities(base, draw, player, rows):
+    """Probabilidad de título de cada jugador en cada escenario: (escenarios, n)"""
+    n_scenarios, n = rows.shape
+    stacked = np.broadcast_to(base, (n_scenarios, n, n)).copy()
+    scenarios = np.arange(n_scenarios)
+    stacked[scenarios, player, :] = rows
+    stacked[scenarios, :, player] = 1 - rows
+    advancements = exact_bracket_probabilities_batch(list(stacked), [draw] * n_scenarios)
+    return np.array([advancement[-1] for advancement in advancements]).reshape(n_scenarios, n)
+
+
+def shared_views(buffer, n, n_scenarios):
+    """Matriz base, filas, jugador y salida dentro del bloque compartido"""
+    sizes = [n * n * 8, n_scenarios * n * 8, n_scenarios * 8]
+    offsets = np.cumsum([0] + sizes)
+    base = np.ndarray((n, n), dtype=np.float64, buffer=buffer, offset=offsets[0])
+    rows = np.ndarray((n_scenarios, n), dtype=np.float64, buffer=buffer, offset=offsets[1])
+    player = np.ndarray(n_scenarios, dtype=np.int64, buffer=buffer, offset=offsets[2])
+    out = np.ndarray((n_scenarios, n), dtype=np.float64, buffer=buffer, offset=offsets[3])
+    return base, rows, player, out
+
+
+def shared_size(n, n_scenarios):
+    return (n * n + 2 * n_scenarios * n + n_scenarios) * 8
+
+
+def champion_chunk(name, n, n_scenarios, start, stop, draw):
+    """Tarea del pool: resuelve los escenarios [start, stop) del bloque compartido"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        base, rows, player, out = shared_views(shm.buf, n, n_scenarios)
+        out[start:stop] = champion_probabilities(base, draw, player[start:stop], rows[start:stop])
+        # Soltar las vistas antes de cerrar el bloque
+        del base, rows, player, out
+    finally:
+        shm.close()
+    return stop - start
+
+
+def scenario_chunk(n, chunk_size=SENSITIVITY_CHUNK, max_cells=SENSITIVITY_CHUNK_CELLS):
+    """Escenarios por bloque para un plantel de n jugadores"""
+    return max(1, min(chunk_size, max_cells // (n * n)))
+
+
+def sweep_champion_probabilities(base, draw, player, rows, executor=None, chunk_size=None):
+    """Probabilidades de título de todos los escenarios, en serie o repartidas en el pool"""
+    n_scenarios, n = rows.shape
+    chunk_size = chunk_size or scenario_chunk(n)
+    bounds = [(start, min(start + chunk_size, n_scenarios)) for start in range(0, n_scenarios, chunk_size)]
+    if executor is None:
+        out = np.empty((n_scenarios, n))
+        for start, stop in bounds:
+            out[start:stop] = champion_probabilities(base, draw, player[start:stop], rows[start:stop])
+        return out
+
+    shm = shared_memory.SharedMemory(create=True, size=shared_size(n, n_scenarios))
+    try:
+        shared_base, shared_rows, shared_player, shared_out = shared_views(shm.buf, n, n_scenarios)
+        shared_base[:] = base
+        shared_rows[:] = rows
+        shared_player[:] = player
+        futures = [executor.submit(champion_chunk, shm.name, n, n_scenarios, start, stop, draw)
+                   for start, stop in bounds]
+        for future in futures:
+            future.result()
+        out = shared_out.copy()
+        del shared_base, shared_rows, shared_player, shared_out
+    finally:
+        shm.close()
+        shm.unlink()
+    return out
+
+
+def sensitivity_summary(stats, base_champion, player, stat, delta, champions, n_deltas):
+    """Curva, pendiente y elasticidad de la chance de título propia por (jugador, estadística)
+
+    La pendiente (puntos porcentuales por punto de la estadística) es la de
+    mínimos cuadrados por el origen sobre la grilla de deltas; la elasticidad
+    es el cambio relativo de la chance por cambio relativo de la estadística.
+    Devuelve arreglos (jugadores, estadísticas[, deltas]).
+    """
+    own = champions[np.arange(len(player)), player].reshape(-1, n_deltas) * 100
+    player, stat, delta = (x.reshape(-1, n_deltas) for x in (player, stat, delta))
+    base = base_champion[player[:, 0]] * 100
+    value = stats[player[:, 0], stat[:, 0]]
+    # Delta efectivo: el que queda después de acotar a STAT_RANGE
+    delta = np.clip(value[:, None] + delta, *STAT_RANGE) - value[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gradient = np.nan_to_num(((own - base[:, None]) * delta).sum(axis=1) / np.square(delta).sum(axis=1))
+        elasticity = np.where(base > 0, gradient * value / base, np.nan)
+    return own, gradient, elasticity
@@ -1,78 +1,496 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-import joblib
-import random
+import gc
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
 from datetime import datetime
 import logging
+import os
+from werkzeug.exceptions import RequestEntityTooLarge
+from eva_admission import AdmissionController, AdmissionRejected, parse_lane_limits
+from eva_bracket import (BYE, bracket_size, exact_bracket_probabilities_batch, round_count, seeded_draw,
+                         simulate_brackets_montecarlo_batch)
+from eva_cache import LRUCache, payload_key, roster_key
+from eva_inference import INFERENCE_BACKENDS, InferenceDispatcher
+from eva_jobs import JobManager, JobQueueFullError, stream_job_events
+from eva_league import LeagueTable, league_schedule, league_standings, schedule_odds
+from eva_matchups import MatchupIndex
+from eva_metrics import RequestMetrics, format_histogram, format_metric
+from eva_optimizer import OBJECTIVES, optimize_bracket
+from eva_profiling import RequestProfiler
+from eva_model import MODEL_DIR, STAT_KEYS, TennisPredictor, historical_matches, load_latest_predictor
+from eva_ratings import RatingStore
+from eva_sensitivity import (DEFAULT_DELTAS, perturbed_stats, scenario_grid, scenario_pair_features,
+                             scenario_rating_proba, scenario_rows, sensitivity_summary, sweep_champion_probabilities)
+from eva_sessions import PLAYOFF_SPOTS, SessionConflictError, SessionStore
+from eva_training import BackgroundTrainer, ResultsLog, match_to_record, replay_ratings
+from eva_tournament import (exact_draw, exact_simulation, format_exact_simulation, format_round_probabilities,
+                            get_bracket_draw, get_stats_matrix, montecarlo_simulation, rank_contenders)
+from eva_report import REPORT_GENERATORS, REPORT_MIMETYPES, iter_text_report
+from eva_registry import (PlayerRegistry, UnknownPlayerError, roster_consistency, roster_overall, roster_pair_features,
+                          roster_power, roster_win_matrix)
+from eva_wire import compact_players, compress, dumps as wire_dumps, loads as wire_loads
+
+class WireJSONProvider(DefaultJSONProvider):
+    """JSON de pedidos y respuestas con eva_wire (orjson si está instalado)"""
+    def dumps(self, obj, **kwargs):
+        return wire_dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return wire_loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Los bytes van directo a la respuesta, sin pasar por str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(wire_dumps(obj, default=self.default), mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = WireJSONProvider(app)
 CORS(app)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Modelo de IA para predicciones
-class TennisPredictor:
-    def __init__(self):
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.scaler = StandardScaler()
-        self.is_trained = False
-        
-    def train_model(self, historical_data):
-        """Entrena el modelo con datos históricos"""
-        try:
-            # Simular datos de entrenamiento
-            X = []
-            y = []
-            
-            for match in historical_data:
-                # Características: diferencia en stats entre jugadores
-                feature_vector = [
-                    match['player1_speed'] - match['player2_speed'],
-                    match['player1_serve'] - match['player2_serve'],
-                    match['player1_endurance'] - match['player2_endurance'],
-                    match['player1_technique'] - match['player2_technique'],
-                    abs(match['player1_speed'] - match['player2_speed']),
-                    (match['player1_speed'] + match['player1_serve'] + match['player1_endurance'] + match['player1_technique']) / 4,
-                    (match['player2_speed'] + match['player2_serve'] + match['player2_endurance'] + match['player2_technique']) / 4
-                ]
-                X.append(feature_vector)
-                y.append(match['winner'])  # 1 si gana player1, 0 si gana player2
-            
-            if len(X) > 0:
-                X = np.array(X)
-                y = np.array(y)
-                
-                # Escalar características
-                X_scaled = self.scaler.fit_transform(X)
-                
-                # Entrenar modelo
-                self.model.fit(X_scaled, y)
-                self.is_trained = True
-                logger.info("Modelo E.V.A. entrenado exitosamente")
-                
-        except Exception as e:
-            logger.error(f"Error entrenando modelo: {e}")
+# Instancia global del predictor: se carga el artefacto más reciente con
+# memory-mapping. Si el esquema no coincide, load_latest_predictor falla.
+predictor = load_latest_predictor()
+if predictor is None:
+    logger.warning("No hay artefactos del modelo (python eva_model.py train), entrenando modelo inicial en memoria")
+    predictor = TennisPredictor()
+    predictor.train_model(historical_matches)
+
+# Backend de inferencia: 'sklearn' (por defecto), 'flat' o 'auto' (ver eva_inference)
+INFERENCE_BACKEND = os.environ.get('EVA_INFERENCE_BACKEND', 'sklearn')
+if INFERENCE_BACKEND not in INFERENCE_BACKENDS:
+    raise ValueError(f"EVA_INFERENCE_BACKEND desconocido: {INFERENCE_BACKEND}. Opciones: {', '.join(INFERENCE_BACKENDS)}")
+if INFERENCE_BACKEND != 'sklearn' and predictor.is_trained:
+    # Armar el bosque plano antes del fork para que los workers lo compartan
+    predictor.flat_forest()
+
+# Congelar los objetos ya creados para que el recolector de basura no toque sus
+# páginas y los workers creados con fork sigan compartiendo el modelo cargado
+gc.freeze()
+
+# Límite de simulaciones por pedido en el modo Monte Carlo
+MAX_SIMULATION_ITERATIONS = 1_000_000
+
+# Lugares de la liga que clasifican a semifinales (como en script.js)
+LEAGUE_PLAYOFF_SPOTS = 4
+# Escenarios de la liga por pedido si no se indican
+DEFAULT_LEAGUE_ITERATIONS = 20_000
+
+# Presupuesto de tiempo (segundos) del optimizador de brackets
+DEFAULT_OPTIMIZE_BUDGET = 1.0
+MAX_OPTIMIZE_BUDGET = 30.0
+# Reinicios por pedido: más allá de unas tandas por núcleo solo alargan la espera
+MAX_OPTIMIZE_RESTARTS = 4 * max(os.cpu_count() or 1, 2)
+
+# Límites del índice de enfrentamientos de /analyze
+MAX_MATCHUP_TOP_K = 50
+MAX_RIVALS_PLAYERS = 1000
+
+# Torneos por pedido de /batch y operaciones que acepta cada uno
+MAX_BATCH_TOURNAMENTS = int(os.environ.get('EVA_MAX_BATCH_TOURNAMENTS', 256))
+# Suma de n² de los planteles de un pedido de /batch: por defecto lo mismo que
+# un solo plantel del tamaño máximo, así un lote no cuesta más que un /simulate
+MAX_BATCH_MATRIX_CELLS = int(os.environ.get('EVA_MAX_BATCH_MATRIX_CELLS', 4096 ** 2))
+BATCH_OPERATIONS = ('predict', 'simulate')
+
+# Límites del análisis de sensibilidad de /sensitivity
+MAX_SENSITIVITY_STEPS = 20
+MAX_SENSITIVITY_DELTA = 50
+MAX_SENSITIVITY_SCENARIOS = int(os.environ.get('EVA_MAX_SENSITIVITY_SCENARIOS', 10_000))
+# Escenarios x jugadores: cada escenario son 2n filas del modelo y una fila
+# nueva de la matriz, así que con planteles grandes entran menos escenarios.
+# Por defecto, las filas del modelo de un /simulate del plantel máximo
+MAX_SENSITIVITY_CELLS = int(os.environ.get('EVA_MAX_SENSITIVITY_CELLS', 4096 ** 2 // 2))
+
+# Pool de procesos para los reinicios del optimizador y los escenarios de
+# /sensitivity. Se crea recién con el primer pedido que lo usa, en el proceso
+# que atiende, así importar el módulo (eva_bench, eva_cli, gunicorn --preload)
+# no lanza procesos. Los workers se lanzan con fork y solo corren funciones de
+# numpy de eva_optimizer y eva_sensitivity, sin tocar locks del servidor. No
+# se usa forkserver: los workers volverían a importar este módulo como
+# __main__ (modelo, entrenador y sesiones incluidos) al correr
+# python eva_server.py.
+process_pool = None
+process_pool_pid = None
+process_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """Devuelve el pool de procesos de este proceso, o None si hay un solo núcleo"""
+    global process_pool, process_pool_pid
+    if (os.cpu_count() or 1) < 2:
+        return None
+    with process_pool_lock:
+        # Un proceso hijo (p. ej. un worker de gunicorn) no puede usar el pool
+        # heredado: sus workers responden al padre. Arma el suyo
+        if process_pool is None or process_pool_pid != os.getpid():
+            # Los workers tienen que compartir el rastreador de memoria compartida
+            # del proceso principal (los bloques de /sensitivity); si no, cada uno
+            # arranca el suyo y lo da por perdido al terminar
+            resource_tracker.ensure_running()
+            process_pool = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                               mp_context=multiprocessing.get_context('fork'))
+            # Con fork, el primer envío lanza todos los workers
+            process_pool_pid = os.getpid()
+            process_pool.submit(os.getpid).result()
+        return process_pool
+
+def reset_process_pool_lock():
+    # Si el fork ocurrió con el lock tomado por otro hilo, el hijo lo
+    # heredaría tomado para siempre
+    global process_pool_lock
+    process_pool_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=reset_process_pool_lock)
+
+# Trabajos en segundo plano (simulaciones y optimizaciones largas)
+JOB_WORKERS = int(os.environ.get('EVA_JOB_WORKERS', 2))
+JOB_TTL = int(os.environ.get('EVA_JOB_TTL', 600))
+JOB_PROGRESS_STEPS = 20
+job_manager = JobManager(max_workers=JOB_WORKERS, ttl=JOB_TTL)
+
+# Despachador que junta las inferencias de pedidos concurrentes en un solo lote
+BATCH_WAIT_MS = float(os.environ.get('EVA_BATCH_WAIT_MS', 2))
+BATCH_MAX_ROWS = int(os.environ.get('EVA_BATCH_MAX_ROWS', 4096))
+inference = InferenceDispatcher(predict_fn=INFERENCE_BACKENDS[INFERENCE_BACKEND], max_wait=BATCH_WAIT_MS / 1000,
+                                max_batch_rows=BATCH_MAX_ROWS)
+
+# Caché de matrices de probabilidades compartida por todos los endpoints
+win_matrix_cache = LRUCache(maxsize=64)
+
+# Caché de respuestas de pedidos deterministas (sin azar o con semilla),
+# direccionada por el contenido del pedido y la versión del modelo
+RESPONSE_CACHE_ENTRIES = int(os.environ.get('EVA_RESPONSE_CACHE_ENTRIES', 256))
+RESPONSE_CACHE_MB = float(os.environ.get('EVA_RESPONSE_CACHE_MB', 64))
+response_cache = LRUCache(maxsize=RESPONSE_CACHE_ENTRIES, max_bytes=int(RESPONSE_CACHE_MB * 2 ** 20))
+
+def swap_predictor(new_predictor):
+    """Reemplaza el modelo global de forma atómica
+
+    Los pedidos en curso conservan la referencia al modelo anterior; las
+    cachés quedan invalidadas porque sus claves incluyen la versión.
+    """
+    global predictor
+    if INFERENCE_BACKEND != 'sklearn':
+        new_predictor.flat_forest()
+    old_version = predictor.version
+    predictor = new_predictor
+    win_matrix_cache.clear()
+    response_cache.clear()
+    logger.info(f"Modelo actualizado: v{old_version} -> v{new_predictor.version}")
+
+# Resultados reales para el reentrenamiento en segundo plano
+RESULTS_LOG = os.environ.get('EVA_RESULTS_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'match_results.jsonl'))
+RETRAIN_EVERY = int(os.environ.get('EVA_RETRAIN_EVERY', 50))
+RETRAIN_INTERVAL = float(os.environ['EVA_RETRAIN_INTERVAL']) if os.environ.get('EVA_RETRAIN_INTERVAL') else None
+# Conjunto de características de los modelos que entrena el servidor (ver FEATURE_SETS)
+MODEL_FEATURES = os.environ.get('EVA_MODEL_FEATURES', 'base')
+results_log = ResultsLog(RESULTS_LOG)
+trainer = BackgroundTrainer(results_log, swap_predictor, predictor.version, retrain_every=RETRAIN_EVERY,
+                            interval=RETRAIN_INTERVAL, artifact_dir=MODEL_DIR, feature_set=MODEL_FEATURES)
+trainer.start()
+
+# Ratings Glicko de los jugadores: se reproducen los resultados del log al
+# arrancar y cada partido nuevo de /results se aplica en O(1). Sirven como
+# características del modelo, como fallback si falla la inferencia y como
+# predictor alternativo ('predictor': 'ratings')
+ratings = RatingStore()
+replay_ratings(ratings, results_log.read_all())
+PREDICTORS = ('model', 'ratings')
+MAX_RATINGS_TOP = 100
+
+# Sesiones de torneo persistentes (SQLite en modo WAL) con actualizaciones por deltas
+SESSIONS_DB = os.environ.get('EVA_SESSIONS_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'sessions.sqlite3'))
+MAX_LIVE_SESSIONS = int(os.environ.get('EVA_MAX_LIVE_SESSIONS', 256))
+MAX_SESSION_PLAYERS = 64
+sessions = SessionStore(SESSIONS_DB, max_live=MAX_LIVE_SESSIONS)
+
+# Métricas por ruta y perfilado opcional de pedidos individuales. El
+# perfilado está apagado salvo que se defina EVA_PROFILE_TOKEN, y el
+# encabezado tiene que traer ese valor.
+PROFILE_HEADER = 'X-EVA-Profile'
+PROFILE_TOKEN = os.environ.get('EVA_PROFILE_TOKEN')
+request_metrics = RequestMetrics()
+profiler = RequestProfiler()
+
+# Control de admisión: cada endpoint costoso tiene su carril con pedidos en
+# paralelo y cola de espera acotados, (paralelo, cola). Con la cola llena se
+# responde 503 con Retry-After. /health y /metrics usan un carril reservado.
+# EVA_ADMISSION_LIMITS cambia carriles: 'simulate=4:16,optimize=1:0'
+ADMISSION_LANES = {
+    'reserved': (4, 0),
+    'analyze': (8, 32),
+    'predict': (8, 32),
+    'report': (4, 16),
+    'simulate': (2, 8),
+    'optimize': (1, 2),
+    'sensitivity': (1, 4),
+    'league': (2, 8),
+    'batch': (2, 4),
+    'sessions': (4, 16)
+}
+ADMISSION_LANES.update(parse_lane_limits(os.environ.get('EVA_ADMISSION_LIMITS', '')))
+ADMISSION_ROUTES = {
+    '/health': 'reserved',
+    '/metrics': 'reserved',
+    '/analyze': 'analyze',
+    '/predict': 'predict',
+    '/report': 'report',
+    '/simulate': 'simulate',
+    '/optimize': 'optimize',
+    '/sensitivity': 'sensitivity',
+    '/league': 'league',
+    '/batch': 'batch',
+    '/sessions': 'sessions',
+    '/sessions/<session_id>/results': 'sessions'
+}
+ADMISSION_TIMEOUT = float(os.environ.get('EVA_ADMISSION_TIMEOUT', 10))
+admission = AdmissionController(ADMISSION_LANES, ADMISSION_ROUTES, timeout=ADMISSION_TIMEOUT)
+
+# Límites que se revisan antes de encolar o calcular nada: tamaño del cuerpo
+# (también lo aplica Werkzeug al leer cuerpos sin Content-Length) y
+# jugadores por plantel
+MAX_REQUEST_MB = float(os.environ.get('EVA_MAX_REQUEST_MB', 16))
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_REQUEST_MB * 2 ** 20)
+MAX_ROSTER_PLAYERS = int(os.environ.get('EVA_MAX_ROSTER_PLAYERS', 4096))
+
+@app.before_request
+def start_request_metrics():
+    """Marca el inicio del pedido y arranca el perfilado si se pidió"""
+    g.request_started = time.perf_counter()
+    g.profile_session = None
+    requested = request.headers.get(PROFILE_HEADER)
+    if requested and PROFILE_TOKEN is not None and requested == PROFILE_TOKEN:
+        g.profile_session = profiler.start()
+        if g.profile_session is None:
+            g.profile_busy = True
+
+@app.before_request
+def admit_request():
+    """Rechaza pedidos demasiado grandes y espera lugar en el carril de la ruta
+
+    Se registra después de start_request_metrics: la latencia medida incluye
+    la espera en la cola y los rechazos quedan en las métricas por ruta.
+    """
+    g.admission = None
+    if request.content_length is not None and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        admission.reject('request_too_large')
+        return request_too_large_response()
+    if request.method == 'POST' and request.is_json:
+        # El cuerpo parseado queda en caché para la ruta
+        largest = max(roster_sizes(request.get_json(silent=True)), default=0)
+        if largest > MAX_ROSTER_PLAYERS:
+            admission.reject('roster_too_large')
+            return invalid_request_response(
+                InvalidRequestError(f'Se aceptan hasta {MAX_ROSTER_PLAYERS} jugadores por torneo'))
+    
+    route = request.url_rule.rule if request.url_rule is not None else None
+    lane = admission.lane_for(route)
+    if lane is None:
+        return None
+    try:
+        g.admission = (lane, lane.acquire())
+    except AdmissionRejected as e:
+        response = jsonify({'status': 'error', 'message': str(e), 'lane': e.lane, 'reason': e.reason})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+@app.teardown_request
+def release_admission(error=None):
+    """Libera el lugar del carril al terminar el pedido, con o sin error"""
+    admitted = g.pop('admission', None)
+    if admitted is not None:
+        lane, admitted_at = admitted
+        lane.release(admitted_at)
 
-# Instancia global del predictor
-predictor = TennisPredictor()
+def roster_sizes(data):
+    """Tamaño de cada plantel del pedido ('players' o 'player_ids', también dentro de 'tournaments')"""
+    if not isinstance(data, dict):
+        return
+    for key in ('players', 'player_ids'):
+        if isinstance(data.get(key), list):
+            yield len(data[key])
+    tournaments = data.get('tournaments')
+    if isinstance(tournaments, list):
+        for item in tournaments:
+            yield from roster_sizes(item)
 
-# Datos históricos simulados para entrenamiento inicial
-historical_matches = [
-    {'player1_speed': 92, 'player1_serve': 88, 'player1_endurance': 95, 'player1_technique': 94,
-     'player2_speed': 90, 'player2_serve': 89, 'player2_endurance': 96, 'player2_technique': 96, 'winner': 0},
-    {'player1_speed': 88, 'player1_serve': 92, 'player1_endurance': 87, 'player1_technique': 98,
-     'player2_speed': 91, 'player2_serve': 86, 'player2_endurance': 89, 'player2_technique': 90, 'winner': 1},
-    # ... más datos históricos simulados
-]
+def request_too_large_response():
+    return jsonify({'status': 'error', 'message': f'El cuerpo del pedido supera {MAX_REQUEST_MB:g} MB'}), 413
 
-# Entrenar modelo inicial
-predictor.train_model(historical_matches)
+@app.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(e):
+    """Cuerpos sin Content-Length que superan el límite al leerlos"""
+    admission.reject('request_too_large')
+    return request_too_large_response()
+
+@app.after_request
+def record_request_metrics(response):
+    """Registra la latencia del pedido y guarda su perfil, si lo hubo"""
+    session = g.pop('profile_session', None)
+    if session is not None:
+        summary = profiler.stop(session, f'{request.method} {request.full_path.rstrip("?")}')
+        response.headers['X-EVA-Profile-Id'] = summary['profile_id']
+    elif g.get('profile_busy'):
+        response.headers['X-EVA-Profile-Id'] = 'busy'
+    
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    started = g.get('request_started')
+    if started is not None:
+        request_metrics.observe(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+@app.teardown_request
+def release_profiler(error=None):
+    """Libera el perfilador si el pedido terminó sin pasar por after_request"""
+    session = g.pop('profile_session', None)
+    if session is not None:
+        profiler.stop(session, f'{request.method} {request.path} (error)')
+
+@app.after_request
+def compress_response(response):
+    """Comprime las respuestas grandes según Accept-Encoding (brotli si está instalado, si no gzip)
+
+    Se registra después de record_request_metrics, así que corre antes y la
+    latencia medida incluye la compresión. Las respuestas por partes no se tocan.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body, encoding = compress(response.get_data(), request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # El cuerpo comprimido es otra representación del mismo contenido: ETag débil
+    etag, _ = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+# Registro de jugadores del servidor: los pedidos pueden referenciar jugadores por id
+PLAYERS_DB = os.environ.get('EVA_PLAYERS_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'players-database.json'))
+if os.path.exists(PLAYERS_DB):
+    registry = PlayerRegistry.from_file(PLAYERS_DB)
+else:
+    logger.warning(f"No se encontró {PLAYERS_DB}, registro de jugadores vacío")
+    registry = PlayerRegistry([])
+
+def resolve_players(data):
+    """Obtiene los jugadores del pedido: 'player_ids' o 'players' (dicts o ids del registro)"""
+    if 'player_ids' in data:
+        return registry.get_players(data['player_ids'])
+    players = data.get('players', [])
+    if players and all(isinstance(p, int) for p in players):
+        return registry.get_players(players)
+    return players
+
+def unknown_player_response(e):
+    """Respuesta estándar para ids que no están en el registro"""
+    return jsonify({'status': 'error', 'message': e.args[0]}), 404
+
+class InvalidRequestError(ValueError):
+    """Parámetros del pedido fuera de rango o inválidos"""
+
+def invalid_request_response(e):
+    """Respuesta estándar para parámetros inválidos"""
+    return jsonify({'status': 'error', 'message': str(e)}), 400
+
+def parse_seed(data):
+    """Semilla opcional del pedido (entero no negativo)"""
+    seed = data.get('seed')
+    if seed is None:
+        return None
+    if isinstance(seed, bool) or not isinstance(seed, int) or seed < 0:
+        raise InvalidRequestError('seed debe ser un entero no negativo')
+    return seed
+
+def request_rng(seed):
+    """Generador propio del pedido; sin semilla se elige una y se informa en la respuesta"""
+    if seed is None:
+        seed = int(np.random.SeedSequence().generate_state(1, np.uint64)[0] >> 1)
+    return np.random.default_rng(seed), seed
+
+def cache_lookup(data):
+    """Busca la respuesta de un pedido determinista; devuelve (clave, respuesta o None)
+
+    La clave es también el ETag: si el cliente ya la tiene (If-None-Match),
+    se responde 304 sin calcular nada, esté o no en la caché. Se acepta
+    también la versión débil que lleva la respuesta comprimida.
+    """
+    key = payload_key(request.path, data, response_version(data))
+    if request.if_none_match.contains_weak(key):
+        response = Response(status=304)
+        response.set_etag(key, weak=not request.if_none_match.contains(key))
+        return key, response
+    body = response_cache.get(key)
+    if body is None:
+        return key, None
+    response = Response(body, mimetype='application/json')
+    response.set_etag(key)
+    return key, response
+
+def response_version(data):
+    """Versión de lo que determina la respuesta: el modelo y, si se usan, los ratings"""
+    if predictor.uses_ratings or data.get('predictor') == 'ratings':
+        return f'{predictor.version}+r{ratings.version}'
+    return predictor.version
+
+def parse_predictor(data):
+    """Predictor de las probabilidades: el modelo (por defecto) o los ratings"""
+    name = data.get('predictor', 'model')
+    if name not in PREDICTORS:
+        raise InvalidRequestError(f"predictor debe ser uno de: {', '.join(PREDICTORS)}")
+    return name
+
+def cache_store(key, payload):
+    """Responde con payload y lo guarda en la caché de respuestas (con ETag)"""
+    response = jsonify(payload)
+    response_cache.put(key, response.get_data())
+    response.set_etag(key)
+    return response
+
+def wants_compact(data):
+    """Modo compacto pedido en el cuerpo ('compact': true) o en la URL (?compact=1)"""
+    compact = data.get('compact', request.args.get('compact', False))
+    return compact in (True, 1, '1', 'true')
+
+def parse_iterations(data):
+    """Cantidad de simulaciones pedida para el modo Monte Carlo"""
+    try:
+        iterations = int(data.get('iterations'))
+    except (TypeError, ValueError):
+        raise InvalidRequestError(f'iterations debe ser un entero entre 1 y {MAX_SIMULATION_ITERATIONS}') from None
+    if not 1 <= iterations <= MAX_SIMULATION_ITERATIONS:
+        raise InvalidRequestError(f'iterations debe estar entre 1 y {MAX_SIMULATION_ITERATIONS}')
+    return iterations
+
+def parse_optimize_params(data):
+    """Objetivo, presupuesto de tiempo y reinicios del optimizador"""
+    objective = data.get('objective', 'competitiveness')
+    try:
+        time_budget = float(data.get('time_budget', DEFAULT_OPTIMIZE_BUDGET))
+        restarts = int(data.get('restarts', max(os.cpu_count() or 1, 2)))
+    except (TypeError, ValueError):
+        raise InvalidRequestError('time_budget debe ser un número y restarts un entero') from None
+    
+    if objective not in OBJECTIVES:
+        raise InvalidRequestError(f"objective debe ser uno de: {', '.join(OBJECTIVES)}")
+    if not 0 < time_budget <= MAX_OPTIMIZE_BUDGET or not 1 <= restarts <= MAX_OPTIMIZE_RESTARTS:
+        raise InvalidRequestError(
+            f'time_budget debe estar entre 0 y {MAX_OPTIMIZE_BUDGET} segundos y restarts entre 1 y {MAX_OPTIMIZE_RESTARTS}'
+        )
+    return objective, time_budget, restarts
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -82,27 +500,114 @@ def health_check():
         'service': 'E.V.A. Tennis AI',
         'version': '2.0.0',
         'model_trained': predictor.is_trained,
+        'model_version': predictor.version,
+        'win_matrix_cache': win_matrix_cache.stats(),
+        'response_cache': response_cache.stats(),
+        'registered_players': len(registry),
+        'jobs': job_manager.stats(),
+        'inference': dict(inference.stats(), backend=INFERENCE_BACKEND),
+        'trainer': trainer.stats(),
+        'ratings': ratings.stats(),
+        'sessions': sessions.stats(),
+        'admission': admission.stats(),
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas del servidor en formato de texto de Prometheus"""
+    lines = request_metrics.prometheus_lines()
+    lines += admission.prometheus_lines()
+    
+    inference_stats = inference.stats()
+    lines += format_histogram('eva_inference_duration_seconds', 'Duración de cada lote de inferencia',
+                              inference_stats['inference_seconds'])
+    lines += format_histogram('eva_inference_batch_rows', 'Filas por lote de inferencia',
+                              inference_stats['batch_rows'])
+    lines += format_histogram('eva_inference_batch_requests', 'Pedidos combinados por lote de inferencia',
+                              inference_stats['batch_requests'])
+    lines += format_histogram('eva_inference_queue_wait_seconds', 'Espera en cola antes de la inferencia',
+                              inference_stats['queue_wait_seconds'])
+    lines += format_metric('eva_inference_queue_depth', 'gauge', 'Pedidos esperando inferencia',
+                           [({}, inference_stats['queue_depth'])])
+    
+    cache_stats = win_matrix_cache.stats()
+    cache_labels = {'cache': 'win_matrix'}
+    lines += format_metric('eva_cache_hits_total', 'counter', 'Aciertos de la caché', [(cache_labels, cache_stats['hits'])])
+    lines += format_metric('eva_cache_misses_total', 'counter', 'Fallos de la caché', [(cache_labels, cache_stats['misses'])])
+    lines += format_metric('eva_cache_hit_ratio', 'gauge', 'Proporción de aciertos de la caché', [(cache_labels, cache_stats['hit_ratio'])])
+    lines += format_metric('eva_cache_entries', 'gauge', 'Entradas en la caché', [(cache_labels, cache_stats['size'])])
+    
+    job_stats = job_manager.stats()
+    lines += format_metric('eva_jobs_active', 'gauge', 'Trabajos en cola o en ejecución', [({}, job_stats['active'])])
+    lines += format_metric('eva_jobs', 'gauge', 'Trabajos guardados por estado', [
+        ({'state': state}, count) for state, count in sorted(job_stats['by_status'].items())
+    ])
+    
+    trainer_stats = trainer.stats()
+    lines += format_metric('eva_model_version', 'gauge', 'Versión del modelo en uso', [({}, predictor.version)])
+    lines += format_metric('eva_trainer_pending_matches', 'gauge', 'Partidos nuevos sin reentrenar',
+                           [({}, trainer_stats['pending_matches'])])
+    lines += format_metric('eva_trainer_retrains_total', 'counter', 'Reentrenamientos completados',
+                           [({}, trainer_stats['retrains'])])
+    
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    """Perfiles de pedidos guardados (encabezado X-EVA-Profile)"""
+    return jsonify({'status': 'success', 'profiles': profiler.list()})
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Funciones más costosas de un pedido perfilado"""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return jsonify({'status': 'error', 'message': f'Perfil {profile_id} no encontrado'}), 404
+    return jsonify(dict(profile, status='success'))
+
+@app.route('/players', methods=['GET'])
+def list_players():
+    """Jugadores del registro del servidor, referenciables por id"""
+    ids = registry.ids.tolist()
+    players = registry.get_players(ids)
+    power = registry.power()
+    consistency = registry.consistency()
+    for i, player in enumerate(players):
+        player['power'] = float(power[i])
+        player['consistency'] = float(consistency[i])
+    return jsonify({'status': 'success', 'players': players})
+
 @app.route('/analyze', methods=['POST'])
 def analyze_tournament():
     """Análisis del torneo"""
     try:
         data = request.json
-        players = data.get('players', [])
+        # El análisis no tiene azar: siempre se puede cachear
+        cache_key, cached = cache_lookup(data)
+        if cached is not None:
+            return cached
+        players = resolve_players(data)
         tournament = data.get('tournament', {})
+        matchup_params = parse_matchup_params(data, len(players))
         
         # Análisis de fortalezas y debilidades
-        analysis = perform_advanced_analysis(players, tournament)
+        analysis = perform_advanced_analysis(players, tournament, matchup_params)
         
-        return jsonify({
+        response = {
             'status': 'success',
             'summary': analysis['summary'],
             'insights': analysis['insights'],
             'recommendations': analysis['recommendations']
-        })
+        }
+        if 'matchups' in analysis:
+            response['matchups'] = analysis['matchups']
+        return cache_store(cache_key, response)
         
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
     except Exception as e:
         logger.error(f"Error en análisis: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -112,18 +617,32 @@ def predict_winner():
     """Predicción de ganadores usando IA"""
     try:
         data = request.json
-        players = data.get('players', [])
+        seed = parse_seed(data)
+        predictor_name = parse_predictor(data)
+        # Solo con semilla la respuesta es reproducible y se puede cachear
+        cache_key, cached = cache_lookup(data) if seed is not None else (None, None)
+        if cached is not None:
+            return cached
+        players = resolve_players(data)
         current_bracket = data.get('current_bracket', {})
+        rng, seed = request_rng(seed)
         
-        predictions = calculate_win_probabilities(players, current_bracket)
+        predictions = calculate_win_probabilities(players, current_bracket, rng, predictor_name=predictor_name)
         
-        return jsonify({
+        response = {
             'status': 'success',
             'top_contenders': predictions['top_contenders'],
             'insight': predictions['insight'],
-            'confidence': predictions['confidence']
-        })
+            'confidence': predictions['confidence'],
+            'predictor': predictor_name,
+            'seed': seed
+        }
+        return cache_store(cache_key, response) if cache_key else jsonify(response)
         
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
     except Exception as e:
         logger.error(f"Error en predicción: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -133,18 +652,63 @@ def simulate_tournament():
     """Simulación completa del torneo con IA"""
     try:
         data = request.json
-        players = data.get('players', [])
+        seed = parse_seed(data)
+        compact = wants_compact(data)
+        # El modo exacto no tiene azar; los demás se cachean solo con semilla
+        cacheable = data.get('mode') == 'exact' or seed is not None
+        cache_key, cached = cache_lookup(dict(data, compact=compact)) if cacheable else (None, None)
+        if cached is not None:
+            return cached
+        players = resolve_players(data)
         bracket = data.get('bracket', {})
+        iterations = data.get('iterations')
         
-        simulation = run_advanced_simulation(players, bracket)
+        # Modo exacto: probabilidades por ronda con programación dinámica
+        if data.get('mode') == 'exact':
+            simulation = run_exact_simulation(players, bracket)
+            response = {
+                'status': 'success',
+                'mode': 'exact',
+                'champion': simulation['champion'],
+                'probabilities': simulation['probabilities'],
+                'draw': simulation['draw'],
+                'stats': simulation['stats']
+            }
+            
+            return cache_store(cache_key, compact_players(response, players) if compact else response)
         
-        return jsonify({
-            'status': 'success',
-            'champion': simulation['champion'],
-            'results': simulation['results'],
-            'stats': simulation['stats']
-        })
+        rng, seed = request_rng(seed)
         
+        # Modo Monte Carlo: muchas simulaciones en un solo pase vectorizado
+        if iterations is not None:
+            iterations = parse_iterations(data)
+            simulation = run_montecarlo_simulation(players, bracket, iterations, seed)
+            response = {
+                'status': 'success',
+                'mode': 'montecarlo',
+                'champion': simulation['champion'],
+                'probabilities': simulation['probabilities'],
+                'stats': simulation['stats'],
+                'seed': seed
+            }
+        else:
+            simulation = run_advanced_simulation(players, bracket, rng)
+            response = {
+                'status': 'success',
+                'champion': simulation['champion'],
+                'results': simulation['results'],
+                'stats': simulation['stats'],
+                'seed': seed
+            }
+        if compact:
+            # Tabla de jugadores una sola vez; en los partidos, solo el id
+            response = compact_players(response, players)
+        return cache_store(cache_key, response) if cache_key else jsonify(response)
+        
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
     except Exception as e:
         logger.error(f"Error en simulación: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -154,17 +718,35 @@ def generate_report():
     """Genera reporte completo del torneo"""
     try:
         data = request.json
-        players = data.get('players', [])
+        report_format = data.get('format', request.args.get('format', 'json'))
+        if report_format != 'json' and report_format not in REPORT_GENERATORS:
+            raise InvalidRequestError(f"format debe ser json, {', '.join(REPORT_GENERATORS)}")
+        # El reporte no tiene azar: una copia cacheada conserva su fecha de generación
+        cache_key, cached = cache_lookup(dict(data, format=report_format))
+        if cached is not None:
+            return cached
+        players = resolve_players(data)
         tournament = data.get('tournament', {})
         
+        if report_format != 'json':
+            # Respuesta por partes: el primer bloque sale antes de armar el resto
+            generator = REPORT_GENERATORS[report_format](players, tournament)
+            response = Response(stream_with_context(generator), content_type=REPORT_MIMETYPES[report_format])
+            response.set_etag(cache_key)
+            return response
+        
         report = create_comprehensive_report(players, tournament)
         
-        return jsonify({
+        return cache_store(cache_key, {
             'status': 'success',
             'content': report,
             'generated_at': datetime.now().isoformat()
         })
         
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
     except Exception as e:
         logger.error(f"Error generando reporte: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -174,27 +756,384 @@ def optimize_brackets():
     """Optimiza los brackets para mayor competitividad"""
     try:
         data = request.json
-        players = data.get('players', [])
-        
-        optimized_bracket = calculate_optimal_bracket(players)
+        players = resolve_players(data)
+        objective, time_budget, restarts = parse_optimize_params(data)
         
-        return jsonify({
+        optimized_bracket = calculate_optimal_bracket(players, objective, time_budget, restarts, parse_seed(data))
+        response = {
             'status': 'success',
             'optimized_bracket': optimized_bracket,
             'explanation': 'Bracket optimizado para maximizar la competitividad y el drama deportivo'
-        })
+        }
         
+        return jsonify(compact_players(response, players) if wants_compact(data) else response)
+        
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
     except Exception as e:
         logger.error(f"Error optimizando brackets: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-def perform_advanced_analysis(players, tournament):
+@app.route('/sensitivity', methods=['POST'])
+def sensitivity_analysis():
+    """Cuánto cambia la chance de título de cada jugador al mover cada estadística"""
+    try:
+        data = request.json
+        # Sin azar: el resultado depende solo del pedido y del modelo
+        cache_key, cached = cache_lookup(data)
+        if cached is not None:
+            return cached
+        players = resolve_players(data)
+        targets, stat_indices, deltas = parse_sensitivity_params(data, players)
+        bracket = data.get('bracket', {})
+        
+        analysis = calculate_sensitivity(players, bracket, targets, stat_indices, deltas)
+        
+        return cache_store(cache_key, dict(analysis, status='success'))
+        
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
+    except Exception as e:
+        logger.error(f"Error en análisis de sensibilidad: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/league', methods=['POST'])
+def league_odds():
+    """Probabilidades de clasificación a semifinales en la fase de liga"""
+    try:
+        data = request.json
+        players = resolve_players(data)
+        matches = parse_league_matches(data)
+        playoff_spots, iterations = parse_league_params(data, len(players))
+        
+        odds = calculate_league_odds(players, matches, playoff_spots, iterations, parse_seed(data))
+        
+        return jsonify({
+            'status': 'success',
+            'standings': odds['standings'],
+            'exact': odds['exact'],
+            'scenarios': odds['scenarios'],
+            'pending_matches': odds['pending_matches']
+        })
+        
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
+    except Exception as e:
+        logger.error(f"Error calculando probabilidades de liga: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/batch', methods=['POST'])
+def batch_tournaments():
+    """Evalúa muchos torneos independientes (predicción y simulación) en un solo pedido"""
+    try:
+        data = request.json
+        seed = parse_seed(data)
+        # La predicción tiene azar: solo con semilla se puede cachear
+        cache_key, cached = cache_lookup(data) if seed is not None else (None, None)
+        if cached is not None:
+            return cached
+        tournaments = parse_batch(data)
+        rng, seed = request_rng(seed)
+        
+        results, stats = run_batch(tournaments, rng)
+        
+        response = {
+            'status': 'success',
+            'results': results,
+            'stats': stats,
+            'seed': seed
+        }
+        return cache_store(cache_key, response) if cache_key else jsonify(response)
+        
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
+    except Exception as e:
+        logger.error(f"Error en lote de torneos: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/ratings', methods=['GET'])
+def list_ratings():
+    """Jugadores con mejor rating según los resultados registrados"""
+    try:
+        top = int(request.args.get('top', 10))
+        if not 1 <= top <= MAX_RATINGS_TOP:
+            raise InvalidRequestError(f'top debe estar entre 1 y {MAX_RATINGS_TOP}')
+        
+        return jsonify({
+            'status': 'success',
+            'ratings': [
+                {'id': player_id, 'rating': rating, 'rd': rd, 'matches': games}
+                for player_id, rating, rd, games in ratings.top(top)
+            ],
+            'stats': ratings.stats()
+        })
+        
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
+    except Exception as e:
+        logger.error(f"Error listando ratings: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    """Crea una sesión de torneo: el plantel y el calendario se mandan una sola vez"""
+    try:
+        data = request.json
+        players = resolve_players(data)
+        predictor_name = parse_predictor(data)
+        playoff_spots, iterations = parse_session_params(data, len(players))
+        schedule, match_ids = parse_session_schedule(data, players)
+        
+        stats = get_stats_matrix(players)
+        win_matrix = get_ratings_win_matrix(players) if predictor_name == 'ratings' else get_win_matrix(players)
+        session = sessions.create(players, schedule, match_ids, win_matrix, roster_power(stats), playoff_spots,
+                                  parse_seed(data), iterations, model_version=response_version(data))
+        
+        return jsonify(dict(session.snapshot, status='success', predictor=predictor_name)), 201
+        
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
+    except Exception as e:
+        logger.error(f"Error creando sesión: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    """Estado completo de una sesión"""
+    try:
+        session = sessions.get(session_id)
+        if session is None:
+            return jsonify({'status': 'error', 'message': 'Sesión inexistente'}), 404
+        return jsonify(dict(session.snapshot, status='success'))
+    except Exception as e:
+        logger.error(f"Error leyendo sesión: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/sessions/<session_id>/results', methods=['POST'])
+def record_session_result(session_id):
+    """Registra el resultado de un partido y devuelve solo lo que cambió"""
+    try:
+        data = request.json
+        if 'match_id' not in data:
+            raise InvalidRequestError('Falta match_id')
+        
+        try:
+            session, changes = sessions.record(session_id, str(data['match_id']), data.get('score1'),
+                                               data.get('score2'), data.get('version'))
+        except ValueError as e:
+            raise InvalidRequestError(str(e))
+        if session is None:
+            return jsonify({'status': 'error', 'message': 'Sesión inexistente'}), 404
+        
+        return jsonify({
+            'status': 'success',
+            'session_id': session_id,
+            'version': session.version,
+            'changes': changes,
+            'elapsed_ms': session.last_refresh_ms
+        })
+        
+    except SessionConflictError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
+    except Exception as e:
+        logger.error(f"Error registrando resultado de sesión: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """Borra una sesión y sus resultados"""
+    try:
+        if not sessions.delete(session_id):
+            return jsonify({'status': 'error', 'message': 'Sesión inexistente'}), 404
+        return jsonify({'status': 'success', 'session_id': session_id})
+    except Exception as e:
+        logger.error(f"Error borrando sesión: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Lanza una simulación u optimización en segundo plano"""
+    try:
+        data = request.json
+        job_type = data.get('type')
+        players = resolve_players(data)
+        
+        if job_type == 'simulate':
+            iterations = parse_iterations(data)
+            job = job_manager.submit('simulate', run_simulation_job, players, data.get('bracket', {}), iterations, parse_seed(data))
+        elif job_type == 'optimize':
+            objective, time_budget, restarts = parse_optimize_params(data)
+            job = job_manager.submit('optimize', run_optimization_job, players, objective, time_budget, restarts, parse_seed(data))
+        else:
+            raise InvalidRequestError("type debe ser 'simulate' u 'optimize'")
+        
+        response = job.to_dict()
+        response['status'] = 'success'
+        response['status_url'] = f'/jobs/{job.id}'
+        response['events_url'] = f'/jobs/{job.id}/events'
+        return jsonify(response), 202
+        
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
+    except JobQueueFullError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error creando trabajo: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Estado de un trabajo y su resultado si ya terminó"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Trabajo inexistente o expirado'}), 404
+    response = job.to_dict(include_result=True)
+    response['status'] = 'success'
+    return jsonify(response)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancela un trabajo en cola o en ejecución"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Trabajo inexistente o expirado'}), 404
+    response = job.to_dict()
+    response['status'] = 'success'
+    return jsonify(response)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Progreso del trabajo como Server-Sent Events"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Trabajo inexistente o expirado'}), 404
+    last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    return Response(
+        stream_job_events(job, last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def run_simulation_job(job, players, bracket, iterations, seed):
+    """Monte Carlo en bloques, publicando las probabilidades parciales"""
+    def report(done, probabilities):
+        job.publish('progress', {
+            'iterations_done': done,
+            'iterations': iterations,
+            'top_contenders': probabilities[:10]
+        })
+    
+    return run_montecarlo_simulation(players, bracket, iterations, seed,
+                                     on_progress=report, should_stop=lambda: job.cancelled)
+
+def run_optimization_job(job, players, objective, time_budget, restarts, seed):
+    """Optimización de brackets, publicando el mejor cuadro encontrado hasta ahora"""
+    def report(draw, score, evaluations):
+        job.publish('progress', {
+            'best_score': score,
+            'best_draw': [players[i]['id'] if i != BYE else None for i in draw],
+            'evaluations': evaluations
+        })
+    
+    return calculate_optimal_bracket(players, objective, time_budget, restarts, seed,
+                                     on_progress=report, should_stop=lambda: job.cancelled)
+
+@app.route('/results', methods=['POST'])
+def record_results():
+    """Registra resultados reales de partidos para reentrenar el modelo"""
+    try:
+        data = request.json
+        matches = data.get('matches', [])
+        
+        records = [result_to_training_record(match) for match in matches]
+        if records:
+            results_log.append(records)
+            replay_ratings(ratings, records)
+        trainer.notify(len(records), force=bool(data.get('retrain')))
+        
+        return jsonify({
+            'status': 'success',
+            'recorded': len(records),
+            'model_version': predictor.version,
+            'ratings_version': ratings.version,
+            'trainer': trainer.stats()
+        })
+        
+    except UnknownPlayerError as e:
+        return unknown_player_response(e)
+    except InvalidRequestError as e:
+        return invalid_request_response(e)
+    except Exception as e:
+        logger.error(f"Error registrando resultados: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def result_to_training_record(match):
+    """Convierte un partido jugado (formato del frontend) en un registro de entrenamiento"""
+    player1, player2 = resolve_match_player(match['player1']), resolve_match_player(match['player2'])
+    
+    winner = match.get('winner')
+    if winner is not None:
+        player1_won = get_match_player_id(winner) == player1['id']
+    elif match.get('score1') is not None and match.get('score2') is not None and match['score1'] != match['score2']:
+        player1_won = match['score1'] > match['score2']
+    else:
+        raise InvalidRequestError(f"El partido {match.get('id', '')} no tiene ganador")
+    
+    return match_to_record(player1, player2, player1_won)
+
+def resolve_match_player(player):
+    """Jugador de un partido con sus estadísticas (del pedido o del registro)"""
+    if isinstance(player, dict) and all(key in player for key in STAT_KEYS):
+        return player
+    return registry.get_players([get_match_player_id(player)])[0]
+
+def parse_matchup_params(data, n_players):
+    """Parámetros opcionales del índice de enfrentamientos para /analyze
+
+    top_k: cantidad de pares más parejos y más desparejos a devolver.
+    nearest_rivals: rivales más parecidos (por poder y por estilo) de cada
+    jugador de rivals_for (ids), o de todo el plantel si es chico.
+    """
+    try:
+        top_k = int(data.get('top_k', 0))
+        rival_k = int(data.get('nearest_rivals', 0))
+    except (TypeError, ValueError):
+        raise InvalidRequestError('top_k y nearest_rivals deben ser enteros') from None
+    rivals_for = data.get('rivals_for')
+    if rivals_for is not None and (not isinstance(rivals_for, list) or any(
+            isinstance(pid, bool) or not isinstance(pid, (int, str)) for pid in rivals_for)):
+        raise InvalidRequestError('rivals_for debe ser una lista de ids de jugadores')
+    
+    if not 0 <= top_k <= MAX_MATCHUP_TOP_K or not 0 <= rival_k <= MAX_MATCHUP_TOP_K:
+        raise InvalidRequestError(f'top_k y nearest_rivals deben estar entre 0 y {MAX_MATCHUP_TOP_K}')
+    if rival_k and rivals_for is None and n_players > MAX_RIVALS_PLAYERS:
+        raise InvalidRequestError(
+            f'Con más de {MAX_RIVALS_PLAYERS} jugadores hay que indicar rivals_for (ids de los jugadores)'
+        )
+    if rivals_for is not None and len(rivals_for) > MAX_RIVALS_PLAYERS:
+        raise InvalidRequestError(f'rivals_for admite hasta {MAX_RIVALS_PLAYERS} jugadores')
+    return {'top_k': top_k, 'nearest_rivals': rival_k, 'rivals_for': rivals_for}
+
+def perform_advanced_analysis(players, tournament, matchup_params=None):
     """Realiza análisis de jugadores y torneo"""
     # Análisis de estadísticas
     stats_analysis = analyze_player_stats(players)
     
     # Análisis de matchups
-    matchup_analysis = analyze_potential_matchups(players)
+    index = MatchupIndex(get_stats_matrix(players)) if len(players) >= 2 else None
+    matchup_analysis = analyze_potential_matchups(players, index)
     
     # Análisis de tendencias
     trend_analysis = analyze_tournament_trends(tournament)
@@ -222,23 +1161,24 @@ def perform_advanced_analysis(players, tournament):
         }
     ]
     
-    return {
+    analysis = {
         'summary': summary,
         'insights': insights,
         'recommendations': stats_analysis['recommendations']
     }
+    if matchup_params and (matchup_params['top_k'] or matchup_params['nearest_rivals']) and index is not None:
+        analysis['matchups'] = describe_matchups(players, index, matchup_params)
+    return analysis
 
 def analyze_player_stats(players):
     """Analiza estadísticas de jugadores"""
-    players_data = []
-    for player in players:
-        overall = (player['speed'] + player['serve'] + player['endurance'] + player['technique']) / 4
-        consistency = calculate_consistency(player)
-        players_data.append({
-            'player': player,
-            'overall': overall,
-            'consistency': consistency
-        })
+    stats = get_stats_matrix(players)
+    overall = roster_overall(stats)
+    consistency = roster_consistency(stats)
+    players_data = [
+        {'player': player, 'overall': overall[i], 'consistency': consistency[i]}
+        for i, player in enumerate(players)
+    ]
     
     # Ordenar por rendimiento general
     players_data.sort(key=lambda x: x['overall'], reverse=True)
@@ -259,33 +1199,19 @@ def analyze_player_stats(players):
         'recommendations': recommendations
     }
 
-def calculate_consistency(player):
-    """Calcula la consistencia de un jugador basado en sus estadísticas"""
-    stats = [player['speed'], player['serve'], player['endurance'], player['technique']]
-    mean = np.mean(stats)
-    std = np.std(stats)
-    # Menor desviación = mayor consistencia
-    consistency = max(0, 100 - (std * 10))
-    return consistency
-
-def analyze_potential_matchups(players):
+def analyze_potential_matchups(players, index=None):
     """Analiza los posibles enfrentamientos interesantes"""
     if len(players) < 2:
         return {'key_matchup': 'N/A', 'key_insight': 'No hay suficientes jugadores para análisis'}
     
-    # Encontrar el matchup más equilibrado
+    # Encontrar el matchup más equilibrado con el índice ordenado por poder
+    if index is None:
+        index = MatchupIndex(get_stats_matrix(players))
     most_balanced = None
-    min_difference = float('inf')
-    
-    for i in range(len(players)):
-        for j in range(i + 1, len(players)):
-            p1 = players[i]
-            p2 = players[j]
-            diff = abs(calculate_player_power(p1) - calculate_player_power(p2))
-            
-            if diff < min_difference:
-                min_difference = diff
-                most_balanced = (p1, p2)
+    pairs = index.most_balanced(1)
+    if pairs:
+        i, j, min_difference = pairs[0]
+        most_balanced = (players[min(i, j)], players[max(i, j)])
     
     if most_balanced:
         key_matchup = f"{most_balanced[0]['name']} vs {most_balanced[1]['name']}"
@@ -299,6 +1225,48 @@ def analyze_potential_matchups(players):
         'key_insight': key_insight
     }
 
+def describe_matchups(players, index, params):
+    """Pares más parejos y desparejos y rivales más cercanos, para la respuesta de /analyze"""
+    def player_ref(i):
+        player = players[i]
+        return {'id': player.get('id'), 'name': player['name']}
+    
+    def pair_list(pairs):
+        return [
+            {'player1': player_ref(min(i, j)), 'player2': player_ref(max(i, j)), 'power_difference': gap}
+            for i, j, gap in pairs
+        ]
+    
+    result = {}
+    if params['top_k']:
+        result['balanced'] = pair_list(index.most_balanced(params['top_k']))
+        result['lopsided'] = pair_list(index.most_lopsided(params['top_k']))
+    
+    if params['nearest_rivals']:
+        if params['rivals_for'] is None:
+            targets = np.arange(len(players))
+        else:
+            positions = {player.get('id'): i for i, player in enumerate(players)}
+            missing = [pid for pid in params['rivals_for'] if pid not in positions]
+            if missing:
+                raise InvalidRequestError(f'rivals_for incluye jugadores que no están en el plantel: {missing}')
+            targets = np.array([positions[pid] for pid in params['rivals_for']], dtype=np.int64)
+        
+        k = params['nearest_rivals']
+        power_rivals, power_gaps = index.nearest_by_power(targets, k)
+        style_rivals, style_distances = index.nearest_by_style(targets, k)
+        result['rivals'] = [
+            {
+                'player': player_ref(target),
+                'by_power': [{'player': player_ref(r), 'power_difference': float(d)}
+                             for r, d in zip(power_rivals[row], power_gaps[row])],
+                'by_style': [{'player': player_ref(r), 'stat_distance': float(d)}
+                             for r, d in zip(style_rivals[row], style_distances[row])]
+            }
+            for row, target in enumerate(targets)
+        ]
+    return result
+
 def calculate_player_power(player):
     """Calcula el poder general de un jugador"""
     return (player['speed'] * 0.25 + 
@@ -339,94 +1307,178 @@ def get_dominant_attribute(player):
     }
     return max(attributes, key=attributes.get)
 
-def calculate_win_probabilities(players, current_bracket):
-    """Calcula probabilidades de victoria usando el modelo de IA"""
-    contenders = []
+def calculate_win_probabilities(players, current_bracket, rng=None, win_matrix=None, predictor_name='model'):
+    """Calcula probabilidades de victoria usando el modelo de IA o los ratings"""
+    rng = rng if rng is not None else np.random.default_rng()
+    if win_matrix is None:
+        win_matrix = get_ratings_win_matrix(players) if predictor_name == 'ratings' else get_win_matrix(players)
+    return rank_contenders(players, current_bracket, win_matrix, rng)
+
+def get_win_matrix(players):
+    """Devuelve la matriz de probabilidades del plantel, usando la caché si es posible"""
+    return get_win_matrices([players])[0]
+
+def get_ratings_win_matrix(players):
+    """Matriz del plantel según los ratings, sin inferencia (sub-milisegundo)"""
+    stats = get_stats_matrix(players)
+    return ratings.win_matrix([player.get('id') for player in players], roster_power(stats))
+
+def roster_ratings(players, stats):
+    """(rating, rd) actuales de cada jugador del plantel"""
+    return ratings.lookup([player.get('id') for player in players], roster_power(stats))
+
+def get_win_matrices(rosters):
+    """Matrices de varios planteles: los que no están en caché se calculan en una sola inferencia"""
+    # Tomar una sola referencia al modelo: si se reemplaza a mitad del pedido,
+    # este pedido termina con el modelo con el que empezó
+    model = predictor
+    inputs = []
+    for players in rosters:
+        stats = get_stats_matrix(players)
+        # Con características de ratings, la clave incluye los ratings actuales
+        inputs.append(np.hstack([stats, roster_ratings(players, stats)]) if model.uses_ratings else stats)
+    keys = [roster_key(stats, model.version) for stats in inputs]
+    matrices = {}
+    missing = {}
+    for key, players, stats in zip(keys, rosters, inputs):
+        if key not in matrices:
+            matrices[key] = win_matrix_cache.get(key)
+            if matrices[key] is None:
+                missing[key] = (players, stats)
+    computed, from_model = calculate_win_matrices([stats for _, stats in missing.values()], model,
+                                                  [players for players, _ in missing.values()])
+    for key, win_matrix in zip(missing, computed):
+        # Evitar que un endpoint modifique la copia compartida
+        win_matrix.setflags(write=False)
+        # El fallback depende de los ratings del momento: no se guarda
+        if from_model:
+            win_matrix_cache.put(key, win_matrix)
+        matrices[key] = win_matrix
+    return [matrices[key] for key in keys]
+
+def calculate_win_matrix(stats, model):
+    """Calcula la matriz NxN de probabilidades de que i le gane a j"""
+    return calculate_win_matrices([stats], model)[0][0]
+
+def calculate_win_matrices(inputs, model, rosters=None):
+    """Matrices de varios planteles con las filas de todos los pares apiladas en una inferencia
+
+    Cada entrada es la matriz de estadísticas, con (rating, rd) como columnas
+    extra si el modelo usa ratings. Devuelve (matrices, si salieron del
+    modelo); si la inferencia falla, el fallback son los ratings de los
+    jugadores (el poder para los que no tienen partidos).
+    """
+    sizes = [len(stats) for stats in inputs]
+
+    if model.is_trained and inputs:
+        try:
+            # Una sola inferencia por lotes para todos los pares (compartida
+            # con otros pedidos concurrentes a través del despachador)
+            features = np.concatenate([
+                roster_pair_features(stats[:, :len(STAT_KEYS)], stats[:, len(STAT_KEYS):] if model.uses_ratings else None)
+                for stats in inputs
+            ])
+            proba = inference.predict(model, features)
+            offsets = np.cumsum([0] + [n * n for n in sizes])
+            raw = [proba[offsets[k]:offsets[k + 1]].reshape(n, n) for k, n in enumerate(sizes)]
+            return [roster_win_matrix(stats[:, :len(STAT_KEYS)], win_matrix) for stats, win_matrix in zip(inputs, raw)], True
+        except Exception as e:
+            logger.warning(f"Error usando modelo IA para la matriz, usando fallback de ratings: {e}")
+
+    matrices = []
+    for k, stats in enumerate(inputs):
+        stats = stats[:, :len(STAT_KEYS)]
+        ids = [player.get('id') for player in rosters[k]] if rosters is not None else [None] * len(stats)
+        matrices.append(ratings.win_matrix(ids, roster_power(stats)))
+    return matrices, False
+
+def get_match_player_id(player):
+    """Los partidos pueden traer al jugador completo o solo su id"""
+    return player['id'] if isinstance(player, dict) else player
+
+def calculate_league_odds(players, matches, playoff_spots, iterations, seed=None):
+    """Tabla de la liga con probabilidades de clasificación y clasificados/eliminados"""
+    index = {player['id']: i for i, player in enumerate(players)}
+    try:
+        schedule = [
+            (index[get_match_player_id(match['player1'])], index[get_match_player_id(match['player2'])])
+            for match in matches
+        ]
+    except (KeyError, TypeError) as e:
+        raise InvalidRequestError(f'Partido con un jugador fuera del plantel: {e}')
+    # Sin número de sorteo, se desempata por el orden de la lista
+    numbers = [player.get('number') or i + 1 for i, player in enumerate(players)]
+    table = LeagueTable(numbers, schedule, playoff_spots)
     
-    for player in players:
-        # Calcular probabilidad basada en estadísticas y modelo
-        base_probability = calculate_player_probability(player, players)
-        
-        # Ajustar basado en el bracket actual si está disponible
-        bracket_adjustment = calculate_bracket_adjustment(player, current_bracket)
-        
-        final_probability = min(95, max(5, base_probability + bracket_adjustment))
-        
-        contenders.append({
-            'name': player['name'],
-            'probability': final_probability,
-            'country': player['country'],
-            'style': player.get('style', 'Estándar')
-        })
+    # Se registran los resultados uno por uno, en el orden del calendario
+    for k, match in enumerate(matches):
+        if match.get('completed'):
+            table.record_result(k, match['score1'], match['score2'], match.get('id', k))
     
-    # Ordenar por probabilidad
-    contenders.sort(key=lambda x: x['probability'], reverse=True)
+    win_probabilities, close = schedule_odds(schedule, get_win_matrix(players), roster_power(get_stats_matrix(players)))
     
-    # Generar insight
-    top_player = contenders[0]
-    insight = f"{top_player['name']} ({top_player['country']}) muestra el perfil más completo para la victoria con estilo {top_player['style']}"
+    odds = table.qualification_odds(win_probabilities, close, np.random.default_rng(seed), iterations)
     
     return {
-        'top_contenders': contenders[:5],
-        'insight': insight,
-        'confidence': 87.5  # Confianza del modelo
+        'standings': league_standings(players, numbers, table, odds),
+        'exact': odds['exact'],
+        'scenarios': odds['scenarios'],
+        'pending_matches': odds['pending_matches']
     }
 
-def calculate_player_probability(player, all_players):
-    """Calcula la probabilidad base de un jugador"""
-    # Usar el modelo entrenado si está disponible
-    if predictor.is_trained:
-        try:
-            # Crear características para predicción
-            features = []
-            for opponent in all_players:
-                if opponent['id'] != player['id']:
-                    feature_vector = [
-                        player['speed'] - opponent['speed'],
-                        player['serve'] - opponent['serve'],
-                        player['endurance'] - opponent['endurance'],
-                        player['technique'] - opponent['technique'],
-                        abs(player['speed'] - opponent['speed']),
-                        (player['speed'] + player['serve'] + player['endurance'] + player['technique']) / 4,
-                        (opponent['speed'] + opponent['serve'] + opponent['endurance'] + opponent['technique']) / 4
-                    ]
-                    features.append(feature_vector)
-            
-            if features:
-                features = np.array(features)
-                features_scaled = predictor.scaler.transform(features)
-                predictions = predictor.model.predict_proba(features_scaled)
-                avg_win_probability = np.mean(predictions[:, 1]) * 100
-                return avg_win_probability
-        except Exception as e:
-            logger.warning(f"Error usando modelo IA, usando fallback: {e}")
-    
-    # Fallback: cálculo basado en estadísticas
-    base_power = calculate_player_power(player)
-    max_power = max(calculate_player_power(p) for p in all_players)
-    return (base_power / max_power) * 70 + 15  # Normalizar y ajustar
+def parse_league_matches(data):
+    """Partidos de /league; los jugados necesitan puntajes enteros distintos"""
+    matches = data.get('matches', [])
+    if not isinstance(matches, list) or any(not isinstance(match, dict) for match in matches):
+        raise InvalidRequestError('matches debe ser una lista de partidos')
+    for k, match in enumerate(matches):
+        if not match.get('completed'):
+            continue
+        score1, score2 = match.get('score1'), match.get('score2')
+        if isinstance(score1, bool) or isinstance(score2, bool) or not isinstance(score1, int) \
+                or not isinstance(score2, int) or score1 < 0 or score2 < 0:
+            raise InvalidRequestError(f"Partido {match.get('id', k)}: score1 y score2 deben ser enteros no negativos")
+        if score1 == score2:
+            raise InvalidRequestError(f"Partido {match.get('id', k)}: los puntajes no pueden ser iguales")
+    return matches
 
-def calculate_bracket_adjustment(player, bracket):
-    """Calcula ajuste basado en la posición en el bracket"""
-    # Implementar lógica de ajuste según el bracket
-    # Por ahora, retornar un valor pequeño aleatorio
-    return random.uniform(-5, 5)
+def parse_league_params(data, n_players):
+    """Lugares que clasifican y escenarios simulados de /league"""
+    try:
+        playoff_spots = int(data.get('playoff_spots', LEAGUE_PLAYOFF_SPOTS))
+    except (TypeError, ValueError):
+        raise InvalidRequestError('playoff_spots debe ser un entero') from None
+    if not 1 <= playoff_spots <= n_players:
+        raise InvalidRequestError(f'playoff_spots debe estar entre 1 y {n_players} (cantidad de jugadores)')
+    iterations = parse_iterations(data) if data.get('iterations') is not None else DEFAULT_LEAGUE_ITERATIONS
+    return playoff_spots, iterations
 
-def run_advanced_simulation(players, bracket):
+def run_advanced_simulation(players, bracket, rng=None):
     """Ejecuta simulación avanzada del torneo"""
+    rng = rng if rng is not None else np.random.default_rng()
     # Crear brackets si no existen
     if not bracket.get('round1'):
-        bracket = initialize_bracket(players)
+        bracket = initialize_bracket(players, rng)
     
-    # Simular cada ronda
-    results = {
-        'round1': simulate_round(bracket['round1'], players, 1),
-        'round2': simulate_round(bracket['round2'], players, 2),
-        'round3': simulate_round(bracket['round3'], players, 3)
-    }
+    win_matrix = get_win_matrix(players)
+    
+    # Completar la primera ronda con partidos vacíos hasta una potencia de 2
+    matches = list(bracket['round1'])
+    n_rounds = int(np.log2(bracket_size(2 * len(matches))))
+    matches += [create_empty_match(f'r1m{k + 1}') for k in range(len(matches), 2 ** (n_rounds - 1))]
+    
+    # Simular cada ronda, haciendo avanzar a los ganadores
+    results = {}
+    for round_number in range(1, n_rounds + 1):
+        results[f'round{round_number}'] = simulate_round(matches, players, round_number, win_matrix, rng)
+        winners = [match['winner'] for match in results[f'round{round_number}']]
+        matches = [
+            dict(create_empty_match(f'r{round_number + 1}m{k + 1}'), player1=winners[2 * k], player2=winners[2 * k + 1])
+            for k in range(len(winners) // 2)
+        ]
     
     # Determinar campeón
-    final_match = results['round3'][0]
+    final_match = results[f'round{n_rounds}'][0]
     champion = final_match['winner']
     
     # Calcular estadísticas de simulación
@@ -438,14 +1490,286 @@ def run_advanced_simulation(players, bracket):
         'stats': stats
     }
 
-def simulate_round(matches, players, round_number):
+def run_montecarlo_simulation(players, bracket, iterations, seed=None, on_progress=None, should_stop=None):
+    """Simula el torneo muchas veces y estima probabilidades por ronda
+
+    Con on_progress se simula en bloques y se informa el estimado parcial;
+    should_stop permite cortar entre bloques (devuelve None si no se llegó a simular).
+    """
+    if len(players) < 2:
+        raise ValueError('Se necesitan al menos 2 jugadores para simular')
+
+    win_matrix = get_win_matrix(players)
+    steps = JOB_PROGRESS_STEPS if on_progress else 1
+    return montecarlo_simulation(players, bracket, win_matrix, iterations, seed, steps, on_progress, should_stop)
+
+def run_exact_simulation(players, bracket):
+    """Probabilidades exactas de avanzar en cada ronda, sin muestreo"""
+    if len(players) < 2:
+        raise ValueError('Se necesitan al menos 2 jugadores para simular')
+
+    start = time.perf_counter()
+    simulation = exact_simulation(players, bracket, get_win_matrix(players))
+    simulation['stats']['elapsed_ms'] = (time.perf_counter() - start) * 1000
+    return simulation
+
+def parse_session_params(data, n_players):
+    """Lugares de playoffs y escenarios por actualización de una sesión nueva"""
+    if not 2 <= n_players <= MAX_SESSION_PLAYERS:
+        raise InvalidRequestError(f'Una sesión necesita entre 2 y {MAX_SESSION_PLAYERS} jugadores')
+    try:
+        playoff_spots = int(data.get('playoff_spots', LEAGUE_PLAYOFF_SPOTS))
+    except (TypeError, ValueError):
+        raise InvalidRequestError('playoff_spots debe ser un entero') from None
+    if playoff_spots not in PLAYOFF_SPOTS or playoff_spots > n_players:
+        raise InvalidRequestError(f"playoff_spots debe ser uno de {', '.join(map(str, PLAYOFF_SPOTS))} "
+                                  f"y no mayor que la cantidad de jugadores")
+    iterations = parse_iterations(data) if data.get('iterations') is not None else DEFAULT_LEAGUE_ITERATIONS
+    return playoff_spots, iterations
+
+def parse_session_schedule(data, players):
+    """Calendario de la liga: el de 'matches' (ids y jugadores) o todos contra todos por número de sorteo"""
+    matches = data.get('matches')
+    if not matches:
+        numbers = [player.get('number') or i + 1 for i, player in enumerate(players)]
+        schedule = league_schedule(numbers)
+        return schedule, [f'match_{k + 1}' for k in range(len(schedule))]
+    
+    index = {player['id']: i for i, player in enumerate(players)}
+    try:
+        schedule = [
+            (index[get_match_player_id(match['player1'])], index[get_match_player_id(match['player2'])])
+            for match in matches
+        ]
+    except (KeyError, TypeError) as e:
+        raise InvalidRequestError(f'Partido con un jugador fuera del plantel: {e}')
+    match_ids = [str(match.get('id', f'match_{k + 1}')) for k, match in enumerate(matches)]
+    if len(set(match_ids)) != len(match_ids):
+        raise InvalidRequestError('Los ids de los partidos deben ser únicos')
+    return schedule, match_ids
+
+def parse_sensitivity_params(data, players):
+    """Jugadores a perturbar (índices), estadísticas (índices) y grilla de deltas"""
+    if len(players) < 2:
+        raise InvalidRequestError('Se necesitan al menos 2 jugadores')
+    index = {player['id']: i for i, player in enumerate(players)}
+    target_ids = data.get('targets')
+    if target_ids is None:
+        targets = list(range(len(players)))
+    else:
+        unknown = [player_id for player_id in target_ids if player_id not in index]
+        if unknown:
+            raise InvalidRequestError(f'targets fuera del plantel: {unknown}')
+        targets = [index[player_id] for player_id in target_ids]
+    
+    stat_names = data.get('stats', STAT_KEYS)
+    if not stat_names or any(name not in STAT_KEYS for name in stat_names):
+        raise InvalidRequestError(f"stats debe ser una lista con {', '.join(STAT_KEYS)}")
+    
+    deltas = data.get('deltas', list(DEFAULT_DELTAS))
+    if not isinstance(deltas, list) or not 1 <= len(deltas) <= MAX_SENSITIVITY_STEPS \
+            or any(isinstance(d, bool) or not isinstance(d, (int, float)) or d == 0 or abs(d) > MAX_SENSITIVITY_DELTA
+                   for d in deltas):
+        raise InvalidRequestError(f'deltas debe tener entre 1 y {MAX_SENSITIVITY_STEPS} valores distintos de 0 '
+                                  f'y de hasta {MAX_SENSITIVITY_DELTA} puntos')
+    
+    if len(targets) * len(stat_names) * len(deltas) > MAX_SENSITIVITY_SCENARIOS:
+        raise InvalidRequestError(f'Se aceptan hasta {MAX_SENSITIVITY_SCENARIOS} escenarios '
+                                  f'(jugadores x estadísticas x deltas)')
+    max_scenarios = MAX_SENSITIVITY_CELLS // len(players)
+    if len(targets) * len(stat_names) * len(deltas) > max_scenarios:
+        raise InvalidRequestError(f'Con {len(players)} jugadores se aceptan hasta {max_scenarios} escenarios '
+                                  f'(jugadores x estadísticas x deltas)')
+    return targets, [STAT_KEYS.index(name) for name in stat_names], deltas
+
+def calculate_sensitivity(players, bracket, targets, stat_indices, deltas):
+    """Probabilidad de título con cada estadística de cada jugador movida en cada delta
+
+    El cuadro queda fijo (el del bracket o la siembra de la matriz base): se
+    mide el efecto de la estadística en los partidos, no en la siembra.
+    """
+    start = time.perf_counter()
+    model = predictor
+    stats = get_stats_matrix(players)
+    player, stat, delta = scenario_grid(targets, stat_indices, deltas)
+    perturbed = perturbed_stats(stats, player, stat, delta)
+    
+    proba = None
+    if model.is_trained:
+        try:
+            features = scenario_pair_features(stats, player, perturbed,
+                                              roster_ratings(players, stats) if model.uses_ratings else None)
+            proba = inference.predict(model, features)
+        except Exception as e:
+            logger.warning(f"Error usando modelo IA para la sensibilidad, usando fallback de ratings: {e}")
+    if proba is not None:
+        base = get_win_matrix(players)
+    else:
+        # La base y los escenarios tienen que salir del mismo predictor: el
+        # fallback de ratings de calculate_win_matrices
+        ids = [player_data.get('id') for player_data in players]
+        base = ratings.win_matrix(ids, roster_power(stats))
+        proba = scenario_rating_proba(roster_ratings(players, stats),
+                                      ratings.lookup([ids[i] for i in player], roster_power(perturbed)))
+    rows = scenario_rows(proba, player)
+    inference_done = time.perf_counter()
+    
+    draw = exact_draw(players, bracket, base)
+    base_champion = exact_bracket_probabilities_batch([base], [draw])[0][-1]
+    
+    executor = get_process_pool()
+    champions = sweep_champion_probabilities(base, draw, player, rows, executor)
+    own, gradient, elasticity = sensitivity_summary(stats, base_champion, player, stat, delta, champions, len(deltas))
+    
+    table = []
+    for k in range(len(gradient)):
+        i = int(player[k * len(deltas)])
+        table.append({
+            'id': players[i]['id'],
+            'name': players[i]['name'],
+            'stat': STAT_KEYS[stat[k * len(deltas)]],
+            'value': float(stats[i, stat[k * len(deltas)]]),
+            'base_probability': float(base_champion[i] * 100),
+            'champion_probabilities': own[k].tolist(),
+            'gradient': float(gradient[k]),
+            'elasticity': float(elasticity[k]) if np.isfinite(elasticity[k]) else None
+        })
+    
+    return {
+        'deltas': deltas,
+        'base': [
+            {'id': player_data['id'], 'name': player_data['name'], 'champion_probability': float(base_champion[i] * 100)}
+            for i, player_data in enumerate(players)
+        ],
+        'sensitivity': table,
+        'most_sensitive': sorted(table, key=lambda row: abs(row['gradient']), reverse=True)[:5],
+        'draw': [players[i]['id'] if i != BYE else None for i in draw],
+        'stats': {
+            'scenarios': len(player),
+            'inference_rows': len(player) * 2 * len(players),
+            'parallel': executor is not None,
+            'inference_ms': (inference_done - start) * 1000,
+            'elapsed_ms': (time.perf_counter() - start) * 1000
+        }
+    }
+
+def parse_batch(data):
+    """Torneos del pedido de /batch; los que no se pueden resolver quedan con su error"""
+    tournaments = data.get('tournaments')
+    if not isinstance(tournaments, list) or not tournaments:
+        raise InvalidRequestError('tournaments debe ser una lista no vacía')
+    if len(tournaments) > MAX_BATCH_TOURNAMENTS:
+        raise InvalidRequestError(f'Se aceptan hasta {MAX_BATCH_TOURNAMENTS} torneos por pedido')
+    
+    parsed = []
+    for k, item in enumerate(tournaments):
+        if not isinstance(item, dict):
+            raise InvalidRequestError(f'tournaments[{k}] debe ser un objeto')
+        operations = item.get('operations', list(BATCH_OPERATIONS))
+        if not isinstance(operations, list) or not operations or any(op not in BATCH_OPERATIONS for op in operations):
+            raise InvalidRequestError(f"operations debe ser una lista con {', '.join(BATCH_OPERATIONS)}")
+        tournament = {
+            'id': item.get('id', k),
+            'operations': operations,
+            'bracket': item.get('bracket', {}),
+            'iterations': parse_iterations(item) if item.get('iterations') is not None else None
+        }
+        try:
+            tournament['players'] = resolve_players(item)
+            if len(tournament['players']) < 2:
+                raise ValueError('Se necesitan al menos 2 jugadores por torneo')
+            tournament['stats'] = get_stats_matrix(tournament['players'])
+        except (UnknownPlayerError, ValueError, KeyError, TypeError) as e:
+            tournament['error'] = e.args[0] if isinstance(e, UnknownPlayerError) else str(e)
+        parsed.append(tournament)
+    
+    cells = sum(len(t['players']) ** 2 for t in parsed if 'error' not in t)
+    if cells > MAX_BATCH_MATRIX_CELLS:
+        raise InvalidRequestError(f'Los planteles del pedido suman {cells} enfrentamientos (n² por torneo); '
+                                  f'el máximo es {MAX_BATCH_MATRIX_CELLS}')
+    return parsed
+
+def run_batch(tournaments, rng):
+    """Evalúa todos los torneos juntos
+
+    Las filas de todos los planteles sin matriz en caché van en una sola
+    inferencia; los cuadros se resuelven en tensores (torneos, lugares,
+    lugares), uno por tamaño de cuadro (y por cantidad de simulaciones en
+    Monte Carlo), así un plantel grande no hace rellenar a todos los chicos.
+    """
+    start = time.perf_counter()
+    valid = [t for t in tournaments if 'error' not in t]
+    for tournament, win_matrix in zip(valid, get_win_matrices([t['players'] for t in valid])):
+        tournament['win_matrix'] = win_matrix
+    inference_done = time.perf_counter()
+    
+    exact, montecarlo = {}, {}
+    for tournament in valid:
+        if 'simulate' not in tournament['operations']:
+            continue
+        try:
+            if tournament['iterations'] is None:
+                tournament['draw'] = exact_draw(tournament['players'], tournament['bracket'], tournament['win_matrix'])
+                exact.setdefault(bracket_size(len(tournament['draw'])), []).append(tournament)
+            else:
+                fixed = bool(tournament['bracket'].get('round1'))
+                tournament['fixed_draw'] = fixed
+                tournament['draw'] = get_bracket_draw(tournament['bracket'], tournament['players']) if fixed else np.arange(len(tournament['players']))
+                key = (tournament['iterations'], bracket_size(len(tournament['draw'])))
+                montecarlo.setdefault(key, []).append(tournament)
+        except (KeyError, TypeError, ValueError) as e:
+            tournament['error'] = f'bracket inválido: {e}'
+    
+    for group in exact.values():
+        advancements = exact_bracket_probabilities_batch([t['win_matrix'] for t in group], [t['draw'] for t in group])
+        for tournament, advancement in zip(group, advancements):
+            tournament['simulation'] = dict(format_exact_simulation(tournament['players'], tournament['draw'], advancement, 0),
+                                            mode='exact')
+    for (iterations, _), group in montecarlo.items():
+        advancements = simulate_brackets_montecarlo_batch([t['win_matrix'] for t in group], [t['draw'] for t in group],
+                                                          iterations, rng, [not t['fixed_draw'] for t in group])
+        for tournament, advancement in zip(group, advancements):
+            probabilities = format_round_probabilities(tournament['players'], advancement)
+            tournament['simulation'] = {
+                'mode': 'montecarlo',
+                'champion': probabilities[0],
+                'probabilities': probabilities,
+                'stats': {'iterations': iterations, 'rounds': advancement.shape[0], 'fixed_draw': tournament['fixed_draw']}
+            }
+    
+    results = []
+    for tournament in tournaments:
+        if 'error' in tournament:
+            results.append({'id': tournament['id'], 'status': 'error', 'message': tournament['error']})
+            continue
+        result = {'id': tournament['id'], 'status': 'success'}
+        if 'predict' in tournament['operations']:
+            result['predict'] = calculate_win_probabilities(tournament['players'], tournament['bracket'], rng,
+                                                            tournament['win_matrix'])
+        if 'simulate' in tournament['operations']:
+            result['simulate'] = tournament['simulation']
+        results.append(result)
+    
+    return results, {
+        'tournaments': len(tournaments),
+        'failed': sum(1 for result in results if result['status'] == 'error'),
+        'inference_rows': sum(len(t['players']) ** 2 for t in valid),
+        'exact_tensors': [[len(group), size] for size, group in sorted(exact.items())],
+        'montecarlo_groups': len(montecarlo),
+        'inference_ms': (inference_done - start) * 1000,
+        'elapsed_ms': (time.perf_counter() - start) * 1000
+    }
+
+def simulate_round(matches, players, round_number, win_matrix, rng):
     """Simula una ronda completa"""
     simulated_matches = []
+    index = {player['id']: i for i, player in enumerate(players)}
     
     for match in matches:
         if match['player1'] and match['player2']:
-            winner = simulate_match(match['player1'], match['player2'], round_number)
-            scores = generate_realistic_scores(match['player1'], match['player2'], winner)
+            win_probability = win_matrix[index[match['player1']['id']], index[match['player2']['id']]]
+            winner = simulate_match(match['player1'], match['player2'], win_probability, rng)
+            scores = generate_realistic_scores(match['player1'], match['player2'], winner, rng)
             
             simulated_match = {
                 'id': match['id'],
@@ -458,95 +1782,79 @@ def simulate_round(matches, players, round_number):
             }
             
             simulated_matches.append(simulated_match)
+        else:
+            # Bye: el jugador presente avanza sin jugar
+            simulated_matches.append({
+                'id': match['id'],
+                'player1': match['player1'],
+                'player2': match['player2'],
+                'score1': None,
+                'score2': None,
+                'winner': match['player1'] or match['player2'],
+                'completed': True,
+                'bye': True
+            })
     
     return simulated_matches
 
-def simulate_match(player1, player2, round_number):
-    """Simula un partido individual"""
-    # Usar modelo IA si está disponible
-    if predictor.is_trained:
-        try:
-            feature_vector = [
-                player1['speed'] - player2['speed'],
-                player1['serve'] - player2['serve'],
-                player1['endurance'] - player2['endurance'],
-                player1['technique'] - player2['technique'],
-                abs(player1['speed'] - player2['speed']),
-                (player1['speed'] + player1['serve'] + player1['endurance'] + player1['technique']) / 4,
-                (player2['speed'] + player2['serve'] + player2['endurance'] + player2['technique']) / 4
-            ]
-            
-            features = np.array([feature_vector])
-            features_scaled = predictor.scaler.transform(features)
-            prediction = predictor.model.predict(features_scaled)[0]
-            
-            return player1 if prediction == 1 else player2
-        except Exception as e:
-            logger.warning(f"Error en simulación IA, usando fallback: {e}")
-    
-    # Fallback: lógica basada en estadísticas
-    p1_power = calculate_player_power(player1)
-    p2_power = calculate_player_power(player2)
-    
-    # Agregar factor aleatorio (mayor en primeras rondas)
-    randomness = random.uniform(-0.15, 0.15) * (4 - round_number)
-    
-    return player1 if p1_power + randomness > p2_power else player2
+def simulate_match(player1, player2, win_probability, rng):
+    """Simula un partido individual a partir de la probabilidad de victoria de player1"""
+    return player1 if rng.random() < win_probability else player2
 
-def generate_realistic_scores(player1, player2, winner):
+def choose(rng, options):
+    """Elemento al azar de una lista (como random.choice, con el generador del pedido)"""
+    return options[rng.integers(len(options))]
+
+def generate_realistic_scores(player1, player2, winner, rng):
     """Genera puntajes realistas para un partido"""
     is_close_match = abs(calculate_player_power(player1) - calculate_player_power(player2)) < 10
     
     if is_close_match:
         # Partido reñido
         if winner == player1:
-            score1 = random.choice([7, 6, 7])
-            score2 = random.choice([5, 4, 6])
+            score1 = choose(rng, [7, 6, 7])
+            score2 = choose(rng, [5, 4, 6])
         else:
-            score1 = random.choice([5, 4, 6])
-            score2 = random.choice([7, 6, 7])
+            score1 = choose(rng, [5, 4, 6])
+            score2 = choose(rng, [7, 6, 7])
     else:
         # Partido con claro dominante
         if winner == player1:
-            score1 = random.choice([6, 6, 7])
-            score2 = random.choice([2, 3, 4])
+            score1 = choose(rng, [6, 6, 7])
+            score2 = choose(rng, [2, 3, 4])
         else:
-            score1 = random.choice([2, 3, 4])
-            score2 = random.choice([6, 6, 7])
+            score1 = choose(rng, [2, 3, 4])
+            score2 = choose(rng, [6, 6, 7])
     
     return {'score1': score1, 'score2': score2}
 
-def initialize_bracket(players):
-    """Inicializa la estructura del bracket"""
-    # Mezclar jugadores
-    shuffled_players = random.sample(players, len(players))
-    
-    round1 = []
-    for i in range(0, len(shuffled_players), 2):
-        round1.append({
-            'id': f'r1m{len(round1) + 1}',
-            'player1': shuffled_players[i],
-            'player2': shuffled_players[i + 1],
-            'score1': None,
-            'score2': None,
-            'winner': None,
-            'completed': False
-        })
+def create_empty_match(match_id):
+    """Partido sin jugadores ni resultado"""
+    return {'id': match_id, 'player1': None, 'player2': None, 'score1': None, 'score2': None, 'winner': None, 'completed': False}
+
+def initialize_bracket(players, rng):
+    """Inicializa la estructura del bracket para cualquier cantidad de jugadores"""
+    # Mezclar jugadores y ubicarlos en un cuadro de 2^k lugares (byes si hace falta)
+    draw = seeded_draw(rng.permutation(len(players)))
+    n_rounds = round_count(draw)
     
-    round2 = [
-        {'id': 'r2m1', 'player1': None, 'player2': None, 'score1': None, 'score2': None, 'winner': None, 'completed': False},
-        {'id': 'r2m2', 'player1': None, 'player2': None, 'score1': None, 'score2': None, 'winner': None, 'completed': False}
-    ]
+    bracket = {}
+    for round_number in range(1, n_rounds + 1):
+        bracket[f'round{round_number}'] = [
+            create_empty_match(f'r{round_number}m{k + 1}') for k in range(len(draw) >> round_number)
+        ]
     
-    round3 = [
-        {'id': 'r3m1', 'player1': None, 'player2': None, 'score1': None, 'score2': None, 'winner': None, 'completed': False}
-    ]
+    for k, match in enumerate(bracket['round1']):
+        slot1, slot2 = draw[2 * k], draw[2 * k + 1]
+        match['player1'] = players[slot1] if slot1 != BYE else None
+        match['player2'] = players[slot2] if slot2 != BYE else None
     
-    return {'round1': round1, 'round2': round2, 'round3': round3}
+    return bracket
 
 def calculate_simulation_stats(results):
     """Calcula estadísticas de la simulación"""
-    all_matches = results['round1'] + results['round2'] + results['round3']
+    # Los byes no se juegan, así que no cuentan como partidos
+    all_matches = [match for matches in results.values() for match in matches if not match.get('bye')]
     
     total_points = sum(match['score1'] + match['score2'] for match in all_matches)
     close_matches = sum(1 for match in all_matches if abs(match['score1'] - match['score2']) <= 2)
@@ -555,81 +1863,45 @@ def calculate_simulation_stats(results):
         'total_matches': len(all_matches),
         'total_points': total_points,
         'close_matches': close_matches,
-        'close_match_percentage': (close_matches / len(all_matches)) * 100
+        'close_match_percentage': (close_matches / len(all_matches)) * 100 if all_matches else 0
     }
 
-def calculate_optimal_bracket(players):
-    """Calcula el bracket óptimo para máxima competitividad"""
-    # Ordenar jugadores por poder
-    ranked_players = sorted(players, key=calculate_player_power, reverse=True)
+def calculate_optimal_bracket(players, objective='competitiveness', time_budget=DEFAULT_OPTIMIZE_BUDGET,
+                              restarts=2, seed=None, on_progress=None, should_stop=None):
+    """Busca el bracket que maximiza el objetivo con recocido simulado
+
+    Con callbacks de progreso los reinicios corren en serie en este proceso.
+    """
+    if len(players) < 2:
+        raise ValueError('Se necesitan al menos 2 jugadores para armar un bracket')
     
-    # Estrategia: emparejar fuerte vs débil en primera ronda para maximizar
-    # la probabilidad de que los mejores lleguen a fases finales
-    optimal_pairs = []
-    n = len(ranked_players)
+    win_matrix = get_win_matrix(players)
+    executor = get_process_pool() if on_progress is None else None
+    result = optimize_bracket(win_matrix, objective, time_budget, restarts, executor, seed,
+                              on_progress=on_progress, should_stop=should_stop)
     
-    for i in range(n // 2):
-        optimal_pairs.append((ranked_players[i], ranked_players[n - 1 - i]))
+    # Primera ronda del cuadro óptimo (None = bye)
+    draw = [players[i] if i != BYE else None for i in result['draw']]
+    optimal_pairs = [(draw[k], draw[k + 1]) for k in range(0, len(draw), 2)]
+    
+    explanations = {
+        'competitiveness': 'Bracket diseñado para maximizar la paridad esperada de los partidos, sobre todo en fases avanzadas',
+        'protect_seeds': 'Bracket diseñado para maximizar la probabilidad de que los mejores lleguen a las fases finales'
+    }
     
     return {
         'pairs': optimal_pairs,
-        'explanation': 'Bracket diseñado para maximizar enfrentamientos competitivos en fases avanzadas'
+        'draw': [player['id'] if player else None for player in draw],
+        'objective': objective,
+        'score': result['score'],
+        'baseline_score': result['baseline_score'],
+        'search': result['stats'],
+        'explanation': explanations[objective]
     }
 
 def create_comprehensive_report(players, tournament):
     """Crea un reporte completo del torneo"""
-    report = "REPORTE COMPLETO DEL TORNEO - E.V.A. IA ADVANCED\n"
-    report += "=" * 60 + "\n\n"
-    
-    report += f"Fecha de generación: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-    report += f"Jugadores analizados: {len(players)}\n\n"
-    
-    # Análisis de jugadores
-    report += "ANÁLISIS DE JUGADORES:\n"
-    report += "-" * 30 + "\n"
-    
-    for i, player in enumerate(players, 1):
-        power = calculate_player_power(player)
-        consistency = calculate_consistency(player)
-        report += f"{i}. {player['name']} ({player['country']})\n"
-        report += f"   Poder: {power:.1f} | Consistencia: {consistency:.1f}%\n"
-        report += f"   Estilo: {player.get('style', 'N/A')}\n\n"
-    
-    # Estadísticas del torneo
-    if tournament.get('champion'):
-        report += "RESULTADOS DEL TORNEO:\n"
-        report += "-" * 25 + "\n"
-        report += f"Campeón: {tournament['champion']['name']}\n"
-        report += f"País ganador: {tournament['champion']['country']}\n\n"
-        
-        if tournament.get('stats'):
-            stats = tournament['stats']
-            report += "ESTADÍSTICAS DESTACADAS:\n"
-            if stats.get('fastestPlayer'):
-                report += f"• Jugador más rápido: {stats['fastestPlayer']['name']}\n"
-            if stats.get('bestServer'):
-                report += f"• Mejor saque: {stats['bestServer']['name']}\n"
-            if stats.get('longestMatch'):
-                match = stats['longestMatch']
-                report += f"• Partido más largo: {match['player1']['name']} vs {match['player2']['name']}\n"
-    
-    # Insights de E.V.A.
-    report += "INSIGHTS DE E.V.A. IA:\n"
-    report += "-" * 25 + "\n"
-    report += "• Los jugadores con alta consistencia suelen rendir mejor en torneos\n"
-    report += "• El factor mental es crucial en fases finales\n"
-    report += "• La adaptación a diferentes estilos es clave para el éxito\n"
-    report += "• E.V.A. recomienda monitorear la condición física en torneos largos\n\n"
-    
-    report += "PREDICCIONES FUTURAS:\n"
-    report += "-" * 25 + "\n"
-    report += "Basado en el análisis actual, E.V.A. identifica potencial de mejora\n"
-    report += "en el 75% de los jugadores mediante entrenamiento específico.\n\n"
-    
-    report += "FIN DEL REPORTE\n"
-    report += "=" * 60 + "\n"
-    
-    return report
+    return ''.join(iter_text_report(players, tournament))
 
 if __name__ == '__main__':
     print("🚀 Iniciando servidor E.V.A. Tennis AI...")
@@ -641,5 +1913,17 @@ if __name__ == '__main__':
     print("   POST /simulate   - Simulación completa")
     print("   POST /report     - Reporte detallado")
     print("   POST /optimize   - Optimización de brackets")
+    print("   GET  /players    - Jugadores del registro")
+    print("   POST /league     - Probabilidades de clasificación de la liga")
+    print("   POST /batch      - Muchos torneos en un solo pedido")
+    print("   POST /jobs       - Simulaciones y optimizaciones en segundo plano")
+    print("   POST /results    - Resultados reales para reentrenar el modelo")
+    print("   GET  /ratings    - Ratings Glicko de los jugadores")
+    print("   POST /sessions   - Sesiones de torneo con resultados por deltas")
+    print("   POST /sensitivity - Sensibilidad de la chance de título a cada estadística")
+    print("   GET  /metrics    - Métricas en formato Prometheus")
+    print("   GET  /profiles   - Perfiles de pedidos (encabezado X-EVA-Profile)")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # El modo debug (recarga y depurador interactivo) duplica los hilos y el
+    # estado del servidor y expone el depurador: solo con EVA_DEBUG=1
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('EVA_DEBUG') == '1', threaded=True)
\ No newline at end of file
@@ -0,0 +1,423 @@
+"""Sesiones de torneo persistentes con actualizaciones por deltas
+
+El cliente crea la sesión una vez (plantel, calendario de la liga y lugares
+de playoffs) y después manda solo el resultado de cada partido. La sesión
+guarda la matriz de probabilidades calculada al crearla, así que un resultado
+nuevo no vuelve a pasar por el modelo: LeagueTable actualiza solo a los dos
+jugadores del partido, las chances de clasificación se recalculan sobre los
+partidos pendientes (cada vez menos) y las de playoffs se condicionan a los
+partidos ya jugados. La respuesta trae solo los campos que cambiaron.
+
+Las sesiones viven en SQLite en modo WAL (lecturas concurrentes con una
+escritura): una fila por sesión y una por resultado, numerada con la versión
+de la sesión. Cada proceso mantiene en memoria las sesiones activas y, antes
+de usarlas, aplica los resultados que otro proceso haya guardado.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from eva_bracket import round_count, seeded_draw
+from eva_cache import LRUCache
+from eva_league import LeagueTable, league_standings, schedule_odds
+
+# Escenarios muestreados por actualización cuando quedan muchos partidos
+DEFAULT_SESSION_ITERATIONS = 20_000
+
+# Diferencia (en puntos porcentuales) por debajo de la cual un valor no cambió
+DIFF_TOLERANCE = 0.01
+
+# Nombre de cada ronda de playoffs contando desde la final
+PLAYOFF_ROUND_NAMES = ['final', 'semifinal', 'quarterfinal']
+PLAYOFF_SPOTS = tuple(2 ** (r + 1) for r in range(len(PLAYOFF_ROUND_NAMES)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    version INTEGER NOT NULL,
+    model_version TEXT,
+    config TEXT NOT NULL,
+    win_matrix BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS session_results (
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    match_id TEXT NOT NULL,
+    score1 INTEGER NOT NULL,
+    score2 INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (session_id, version)
+);
+"""
+
+
+class SessionConflictError(Exception):
+    """La versión que manda el cliente no es la actual de la sesión"""
+
+
+def same_value(a, b, tolerance=DIFF_TOLERANCE):
+    """Igualdad para el diff: los números se comparan con tolerancia"""
+    if isinstance(a, float) or isinstance(b, float):
+        return isinstance(a, (int, float)) and isinstance(b, (int, float)) and abs(a - b) < tolerance
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(same_value(x, y, tolerance) for x, y in zip(a, b))
+    return a == b
+
+
+def diff_state(old, new):
+    """Campos de new que cambiaron respecto de old
+
+    Las listas de objetos con 'id' se comparan elemento por elemento y solo se
+    devuelven los elementos con cambios, con su id y los campos modificados.
+    """
+    changes = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, list) and value and isinstance(value[0], dict) and 'id' in value[0]:
+            before = {item['id']: item for item in previous or []}
+            changed = []
+            for item in value:
+                old_item = before.get(item['id'], {})
+                fields = {field: v for field, v in item.items()
+                          if field not in old_item or not same_value(old_item[field], v)}
+                if fields:
+                    changed.append(dict(fields, id=item['id']))
+            if changed:
+                changes[key] = changed
+        elif key not in old or not same_value(previous, value):
+            changes[key] = value
+    return changes
+
+
+class TournamentSession:
+    def __init__(self, session_id, players, schedule, match_ids, win_matrix, power, playoff_spots=4, seed=0,
+                 iterations=DEFAULT_SESSION_ITERATIONS):
+        self.id = session_id
+        self.players = players
+        self.schedule = np.asarray(schedule, dtype=np.int64).reshape(-1, 2)
+        self.match_ids = list(match_ids)
+        self.match_index = {match_id: k for k, match_id in enumerate(self.match_ids)}
+        self.win_matrix = win_matrix
+        self.power = power
+        self.playoff_spots = playoff_spots
+        self.seed = seed
+        self.iterations = iterations
+        # Sin número de sorteo, se desempata por el orden de la lista
+        self.numbers = [player.get('number') or i + 1 for i, player in enumerate(players)]
+        self.table = LeagueTable(self.numbers, self.schedule, playoff_spots)
+        # Probabilidades por partido: se calculan una vez y no cambian con los resultados
+        self.win_probabilities, self.close = schedule_odds(self.schedule, win_matrix, power)
+        self.league_results = {}
+        self.playoff_results = {}
+        self.version = 0
+        self.snapshot = None
+        self.last_refresh_ms = None
+        self.lock = threading.Lock()
+
+    def config(self):
+        """Lo necesario para reconstruir la sesión (sin la matriz ni los resultados)"""
+        return {
+            'players': self.players,
+            'schedule': self.schedule.tolist(),
+            'match_ids': self.match_ids,
+            'power': self.power.tolist(),
+            'playoff_spots': self.playoff_spots,
+            'seed': self.seed,
+            'iterations': self.iterations
+        }
+
+    @classmethod
+    def from_config(cls, session_id, config, win_matrix):
+        return cls(session_id, config['players'], config['schedule'], config['match_ids'], win_matrix,
+                   np.array(config['power']), config['playoff_spots'], config['seed'], config['iterations'])
+
+    @property
+    def league_finished(self):
+        return not self.table.pending.any()
+
+    def playoff_matches(self):
+        """Partidos de playoffs definidos hasta ahora (índices de jugador, None si falta definirlo)"""
+        if not self.league_finished:
+            return []
+        order = np.argsort(self.table.rank())[:self.playoff_spots]
+        slots = order[seeded_draw(np.arange(self.playoff_spots))].tolist()
+        rounds = round_count(slots)
+        matches = []
+        for r in range(rounds):
+            name = PLAYOFF_ROUND_NAMES[rounds - 1 - r]
+            winners = []
+            for k in range(len(slots) // 2):
+                match_id = name if name == 'final' else f'{name}_{k + 1}'
+                player1, player2 = slots[2 * k], slots[2 * k + 1]
+                result = self.playoff_results.get(match_id)
+                winner = None
+                if result is not None:
+                    winner = player1 if result[0] > result[1] else player2
+                matches.append({'id': match_id, 'round': name, 'player1': player1, 'player2': player2,
+                                'result': result, 'winner': winner})
+                winners.append(winner)
+            slots = winners
+        return matches
+
+    def check(self, match_id, score1, score2):
+        """Valida un resultado antes de guardarlo (ValueError si no corresponde)"""
+        if isinstance(score1, bool) or isinstance(score2, bool) or not isinstance(score1, int) \
+                or not isinstance(score2, int) or score1 < 0 or score2 < 0:
+            raise ValueError('score1 y score2 deben ser enteros no negativos')
+        if score1 == score2:
+            raise ValueError('Los puntajes no pueden ser iguales')
+        if match_id in self.match_index:
+            if not self.table.pending[self.match_index[match_id]]:
+                raise ValueError(f'El partido {match_id} ya tiene resultado')
+            return
+        match = next((m for m in self.playoff_matches() if m['id'] == match_id), None)
+        if match is None:
+            raise ValueError(f'Partido inexistente: {match_id}')
+        if match['player1'] is None or match['player2'] is None:
+            raise ValueError(f'El partido {match_id} todavía no tiene a sus dos jugadores')
+        if match['result'] is not None:
+            raise ValueError(f'El partido {match_id} ya tiene resultado')
+
+    def apply(self, match_id, score1, score2):
+        """Registra un resultado ya validado"""
+        if match_id in self.match_index:
+            self.table.record_result(self.match_index[match_id], score1, score2, match_id)
+            self.league_results[match_id] = (score1, score2)
+        else:
+            self.playoff_results[match_id] = (score1, score2)
+        self.version += 1
+
+    def conditioned_win_matrix(self, playoff_matches):
+        """Matriz de probabilidades con los partidos de playoffs ya jugados como seguros"""
+        win_matrix = np.array(self.win_matrix)
+        for match in playoff_matches:
+            if match['winner'] is not None:
+                loser = match['player2'] if match['winner'] == match['player1'] else match['player1']
+                win_matrix[match['winner'], loser] = 1.0
+                win_matrix[loser, match['winner']] = 0.0
+        return win_matrix
+
+    def refresh(self):
+        """Recalcula las probabilidades con los resultados actuales y guarda el estado"""
+        start = time.perf_counter()
+        playoff_matches = self.playoff_matches()
+        # Misma semilla en cada actualización (números aleatorios comunes): las
+        # probabilidades solo se mueven por el resultado nuevo, no por el muestreo
+        rng = np.random.default_rng(self.seed)
+        odds = self.table.qualification_odds(self.win_probabilities, self.close, rng, self.iterations,
+                                             win_matrix=self.conditioned_win_matrix(playoff_matches))
+        advancement = odds['playoff_advancement']
+
+        final = next((m for m in playoff_matches if m['id'] == 'final'), None)
+        champion = final['winner'] if final is not None else None
+        if not self.league_finished:
+            phase = 'league'
+        elif champion is None:
+            phase = 'playoffs'
+        else:
+            phase = 'finished'
+
+        matches = []
+        for k, match_id in enumerate(self.match_ids):
+            a, b = self.schedule[k]
+            result = self.league_results.get(match_id)
+            matches.append({
+                'id': match_id,
+                'round': 'league',
+                'player1': self.players[a]['id'],
+                'player2': self.players[b]['id'],
+                'completed': result is not None,
+                'score1': result[0] if result is not None else None,
+                'score2': result[1] if result is not None else None,
+                'win_probability': float(self.win_probabilities[k] * 100)
+            })
+        for match in playoff_matches:
+            defined = match['player1'] is not None and match['player2'] is not None
+            matches.append({
+                'id': match['id'],
+                'round': match['round'],
+                'player1': self.players[match['player1']]['id'] if match['player1'] is not None else None,
+                'player2': self.players[match['player2']]['id'] if match['player2'] is not None else None,
+                'completed': match['result'] is not None,
+                'score1': match['result'][0] if match['result'] is not None else None,
+                'score2': match['result'][1] if match['result'] is not None else None,
+                'win_probability': float(self.win_matrix[match['player1'], match['player2']] * 100) if defined else None
+            })
+
+        self.snapshot = {
+            'session_id': self.id,
+            'version': self.version,
+            'phase': phase,
+            'pending_matches': odds['pending_matches'],
+            'exact': odds['exact'],
+            'standings': league_standings(self.players, self.numbers, self.table, odds),
+            'matches': matches,
+            'playoff_odds': [
+                {
+                    'id': player['id'],
+                    'round_probabilities': [float(p * 100) for p in advancement[:, i]],
+                    'champion_probability': float(advancement[-1, i] * 100)
+                }
+                for i, player in enumerate(self.players)
+            ],
+            'champion': self.players[champion]['id'] if champion is not None else None
+        }
+        self.last_refresh_ms = (time.perf_counter() - start) * 1000
+        return self.snapshot
+
+
+class SessionStore:
+    def __init__(self, path, max_live=256):
+        """path: base SQLite; max_live: sesiones que se mantienen en memoria"""
+        self.path = path
+        self.live = LRUCache(maxsize=max_live)
+        self.updates = 0
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        """Conexión propia de cada hilo, en modo WAL y con commits manuales"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Con WAL, NORMAL no pierde consistencia ante un corte y evita un fsync por commit
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            self._local.connection = connection
+        return connection
+
+    def create(self, players, schedule, match_ids, win_matrix, power, playoff_spots=4, seed=None,
+               iterations=DEFAULT_SESSION_ITERATIONS, model_version=None):
+        """Crea y guarda una sesión; devuelve la sesión con su estado inicial"""
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1, np.uint64)[0] >> 1)
+        win_matrix = np.ascontiguousarray(win_matrix, dtype=np.float64)
+        session = TournamentSession(uuid.uuid4().hex, players, schedule, match_ids, win_matrix, power,
+                                    playoff_spots, seed, iterations)
+        session.refresh()
+        now = time.time()
+        self._connection().execute(
+            'INSERT INTO sessions (id, created_at, updated_at, version, model_version, config, win_matrix) '
+            'VALUES (?, ?, ?, 0, ?, ?, ?)',
+            (session.id, now, now, str(model_version), json.dumps(session.config()), win_matrix.tobytes())
+        )
+        self.live.put(session.id, session)
+        return session
+
+    def _load(self, session_id):
+        """Reconstruye una sesión desde la base reproduciendo sus resultados"""
+        row = self._connection().execute(
+            'SELECT config, win_matrix FROM sessions WHERE id = ?', (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        config = json.loads(row[0])
+        n = len(config['players'])
+        session = TournamentSession.from_config(session_id, config, np.frombuffer(row[1]).reshape(n, n))
+        if self._catch_up(session) is None:
+            return None
+        session.refresh()
+        return session
+
+    def _catch_up(self, session):
+        """Aplica los resultados guardados después de la versión de la sesión en memoria
+
+        Devuelve cuántos aplicó, o None si la sesión ya no está en la base
+        (la borró otro proceso y la copia en memoria quedó vieja).
+        """
+        stored = self._connection().execute('SELECT version FROM sessions WHERE id = ?', (session.id,)).fetchone()
+        if stored is None:
+            return None
+        if stored[0] <= session.version:
+            return 0
+        rows = self._connection().execute(
+            'SELECT version, match_id, score1, score2 FROM session_results '
+            'WHERE session_id = ? AND version > ? ORDER BY version',
+            (session.id, session.version)
+        ).fetchall()
+        for version, match_id, score1, score2 in rows:
+            session.apply(match_id, score1, score2)
+        return len(rows)
+
+    def get(self, session_id):
+        """Sesión actualizada con la base, o None si no existe"""
+        session = self.live.get(session_id)
+        if session is None:
+            session = self._load(session_id)
+            if session is not None:
+                self.live.put(session_id, session)
+            return session
+        with session.lock:
+            applied = self._catch_up(session)
+            if applied is None:
+                self.live.pop(session_id)
+                return None
+            if applied:
+                session.refresh()
+        return session
+
+    def record(self, session_id, match_id, score1, score2, expected_version=None):
+        """Registra un resultado y devuelve (sesión, campos que cambiaron)
+
+        La escritura toma el lock de escritura de SQLite (BEGIN IMMEDIATE), así
+        que dos procesos no pueden guardar la misma versión.
+        """
+        session = self.get(session_id)
+        if session is None:
+            return None, None
+        with session.lock:
+            previous = session.snapshot
+            connection = self._connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if self._catch_up(session) is None:
+                    # Borrada por otro proceso entre get y la escritura
+                    connection.execute('ROLLBACK')
+                    self.live.pop(session_id)
+                    return None, None
+                if expected_version is not None and expected_version != session.version:
+                    raise SessionConflictError(
+                        f'La sesión está en la versión {session.version} y el pedido es para la {expected_version}'
+                    )
+                session.check(match_id, score1, score2)
+                now = time.time()
+                connection.execute(
+                    'INSERT INTO session_results (session_id, version, match_id, score1, score2, recorded_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (session_id, session.version + 1, match_id, score1, score2, now)
+                )
+                connection.execute('UPDATE sessions SET version = ?, updated_at = ? WHERE id = ?',
+                                   (session.version + 1, now, session_id))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            session.apply(match_id, score1, score2)
+            self.updates += 1
+            return session, diff_state(previous, session.refresh())
+
+    def delete(self, session_id):
+        """Borra una sesión y sus resultados; devuelve False si no existía"""
+        self.live.pop(session_id)
+        cursor = self._connection().execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+        return cursor.rowcount > 0
+
+    def stats(self):
+        count = self._connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        return {
+            'sessions': count,
+            'live': self.live.stats()['size'],
+            'updates': self.updates,
+            'path': self.path
+        }
@@ -0,0 +1,213 @@
+"""Aprendizaje continuo: registro de resultados y reentrenamiento en segundo plano
+
+Los resultados reales se agregan a un log JSON-lines durable. Un hilo
+entrenador reajusta el modelo fuera del ciclo de los pedidos (cada N partidos
+nuevos o cada cierto intervalo), guarda un artefacto nuevo y se lo entrega al
+servidor para que lo reemplace de forma atómica.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from eva_model import STAT_KEYS, TennisPredictor, historical_matches, list_artifact_versions, load_latest_predictor, \
+    records_to_arrays
+from eva_ratings import MAX_RD, RatingStore, rating_prior
+
+logger = logging.getLogger(__name__)
+
+
+class ResultsLog:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, records):
+        """Agrega registros al final del log y fuerza su escritura a disco"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lines = ''.join(json.dumps(record) + '\n' for record in records)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def read_all(self):
+        """Todos los registros del log (ignorando líneas incompletas al final)"""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Línea inválida en {self.path}, se ignora")
+        return records
+
+
+def match_to_record(player1, player2, player1_won):
+    """Registro de entrenamiento (formato historical_matches) para un partido
+
+    Lleva los ids de ambos jugadores para poder reproducir sus ratings.
+    """
+    record = {'player1_id': player1.get('id'), 'player2_id': player2.get('id')}
+    for key in STAT_KEYS:
+        record[f'player1_{key}'] = player1[key]
+        record[f'player2_{key}'] = player2[key]
+    record['winner'] = 1 if player1_won else 0
+    return record
+
+
+def record_power(records):
+    """Poder de ambos jugadores de cada registro, a partir de sus estadísticas"""
+    from eva_registry import roster_power
+
+    stats1, stats2, _ = records_to_arrays(records)
+    return roster_power(stats1), roster_power(stats2)
+
+
+def replay_ratings(store, records):
+    """Aplica al RatingStore los registros que traen ids de jugadores, en orden
+
+    Devuelve (posiciones de esos registros, ratings previos del jugador 1,
+    ratings previos del jugador 2).
+    """
+    tracked = np.array([i for i, record in enumerate(records)
+                        if record.get('player1_id') is not None and record.get('player2_id') is not None],
+                       dtype=np.int64)
+    if len(tracked) == 0:
+        return tracked, np.empty((0, 2)), np.empty((0, 2))
+    power1, power2 = record_power([records[i] for i in tracked])
+    if len(tracked) == 1:
+        record = records[tracked[0]]
+        before = store.update(record['player1_id'], record['player2_id'], record['winner'], power1[0], power2[0])
+        return tracked, before[:1], before[1:]
+    before1, before2 = store.replay([records[i]['player1_id'] for i in tracked],
+                                    [records[i]['player2_id'] for i in tracked],
+                                    [records[i]['winner'] for i in tracked], power1, power2)
+    return tracked, before1, before2
+
+
+def annotate_ratings(records):
+    """Copias de los registros con los ratings (rating, rd) previos a cada partido
+
+    Los partidos con ids se reproducen en orden en un RatingStore nuevo; los
+    que no los tienen (como historical_matches) llevan el rating inicial que
+    corresponde al poder de cada jugador.
+    """
+    power1, power2 = record_power(records)
+    ratings1 = np.column_stack([rating_prior(power1), np.full(len(records), MAX_RD)])
+    ratings2 = np.column_stack([rating_prior(power2), np.full(len(records), MAX_RD)])
+    tracked, before1, before2 = replay_ratings(RatingStore(), records)
+    ratings1[tracked] = before1
+    ratings2[tracked] = before2
+
+    annotated = []
+    for record, (rating1, rd1), (rating2, rd2) in zip(records, ratings1.tolist(), ratings2.tolist()):
+        annotated.append(dict(record, player1_rating=rating1, player1_rd=rd1, player2_rating=rating2,
+                              player2_rd=rd2))
+    return annotated
+
+
+class BackgroundTrainer:
+    def __init__(self, results_log, on_new_model, current_version, retrain_every=50, interval=None,
+                 artifact_dir=None, feature_set='base'):
+        """on_new_model(predictor) recibe cada modelo nuevo; interval en segundos (None = sin agenda)"""
+        self.results_log = results_log
+        self.feature_set = feature_set
+        self.on_new_model = on_new_model
+        self.current_version = current_version
+        self.retrain_every = retrain_every
+        self.interval = interval
+        self.artifact_dir = artifact_dir
+        self.pending = 0
+        self.retrains = 0
+        self.last_trained_at = None
+        self.last_duration = None
+        self.last_error = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='eva-trainer', daemon=True)
+            self._thread.start()
+
+    def notify(self, new_matches, force=False):
+        """Avisa que llegaron partidos nuevos; despierta al entrenador si corresponde"""
+        with self._lock:
+            self.pending += new_matches
+            if force or self.pending >= self.retrain_every:
+                self._wake.set()
+
+    def _run(self):
+        while True:
+            woke = self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self._pick_up_artifact()
+                if woke or self.pending > 0:
+                    self.retrain()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error en el reentrenamiento: {e}")
+
+    def _pick_up_artifact(self):
+        """Carga un artefacto más nuevo guardado por otro proceso"""
+        if self.artifact_dir is None:
+            return
+        versions = list_artifact_versions(self.artifact_dir)
+        if versions and versions[-1] > self.current_version:
+            predictor = load_latest_predictor(self.artifact_dir)
+            self._publish(predictor)
+
+    def retrain(self):
+        """Reentrena con los datos iniciales más el log y publica el modelo nuevo"""
+        with self._lock:
+            consumed = self.pending
+        start = time.perf_counter()
+        records = historical_matches + self.results_log.read_all()
+
+        predictor = TennisPredictor(self.feature_set)
+        predictor.version = self.current_version
+        predictor.train_model(annotate_ratings(records) if predictor.uses_ratings else records)
+        if not predictor.is_trained:
+            raise RuntimeError('El entrenamiento no produjo un modelo')
+        if self.artifact_dir is not None:
+            try:
+                predictor.save(self.artifact_dir, n_training_rows=len(records))
+            except OSError as e:
+                logger.warning(f"No se pudo guardar el artefacto, se usa solo en memoria: {e}")
+
+        with self._lock:
+            self.pending -= consumed
+        self.retrains += 1
+        self.last_trained_at = time.time()
+        self.last_duration = time.perf_counter() - start
+        self.last_error = None
+        self._publish(predictor)
+        logger.info(f"Modelo v{predictor.version} reentrenado con {len(records)} partidos "
+                    f"en {self.last_duration:.2f}s")
+        return predictor
+
+    def _publish(self, predictor):
+        self.current_version = predictor.version
+        self.on_new_model(predictor)
+
+    def stats(self):
+        return {
+            'pending_matches': self.pending,
+            'retrain_every': self.retrain_every,
+            'interval_seconds': self.interval,
+            'retrains': self.retrains,
+            'last_trained_at': self.last_trained_at,
+            'last_duration_seconds': self.last_duration,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,89 @@
+"""Formato de las respuestas: JSON rápido, modo compacto y compresión
+
+orjson (si está instalado) serializa varias veces más rápido que el módulo
+json y entiende los tipos de NumPy. El modo compacto manda la tabla de
+jugadores una sola vez y en los partidos y pares deja solo el id. Las
+respuestas grandes se comprimen con brotli (si está instalado) o gzip según
+el Accept-Encoding del cliente.
+"""
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Cuerpos más chicos no se comprimen (el encabezado gzip no compensa)
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+
+
+def dumps(obj, default=None):
+    """Serializa a bytes UTF-8; default convierte los tipos que el codificador no conoce"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=default, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode()
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def compact_players(payload, players):
+    """Reemplaza cada jugador del plantel dentro de payload por su id
+
+    Un dict cuenta como jugador si es el mismo objeto del plantel o si es
+    igual a la entrada del plantel con su id, así la tabla siempre tiene los
+    datos que se sacaron. Las tuplas se devuelven como listas, igual que en
+    JSON.
+    """
+    by_id = {player['id']: player for player in players}
+    same = {id(player) for player in players}
+
+    def walk(value):
+        if isinstance(value, dict):
+            if id(value) in same or by_id.get(value.get('id'), by_id) == value:
+                return value['id']
+            return {key: walk(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [walk(item) for item in value]
+        return value
+
+    compact = walk(payload)
+    compact['players'] = players
+    compact['compact'] = True
+    return compact
+
+
+def accepted_encodings(accept_encoding):
+    """Codificaciones aceptadas por el cliente (ignorando las de q=0)"""
+    encodings = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if name and params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            encodings.add(name.lower())
+    return encodings
+
+
+def compress(body, accept_encoding):
+    """(cuerpo comprimido, codificación) o (body, None) si no corresponde comprimir"""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in encodings:
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    if 'gzip' in encodings:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), 'gzip'
+    return body, None
@@ -0,0 +1,73 @@
+"""Paridad del bosque plano (eva_forest) con RandomForestClassifier de sklearn"""
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+import eva_forest
+from eva_forest import PARITY_TOLERANCE, FlatForest, breadth_first_order
+
+
+@pytest.fixture(scope='module')
+def forest():
+    """Bosque no trivial sobre datos al azar: varios cientos de filas y árboles profundos"""
+    rng = np.random.default_rng(7)
+    X = rng.normal(size=(600, 6)) * [1, 10, 100, 0.1, 5, 50] + [0, 50, -20, 1, 0, 0]
+    y = (X[:, 0] + X[:, 1] / 10 - X[:, 3] * 5 + rng.normal(size=len(X)) > 0).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(scaler.transform(X), y)
+    return model, scaler, FlatForest.from_sklearn(model, scaler)
+
+
+def expected_leaves(model, flat, X):
+    """Hojas de sklearn traducidas a los índices del bosque plano: (n_árboles, n_filas)"""
+    applied = model.apply(X)
+    leaves = np.empty(applied.T.shape, dtype=np.int64)
+    for t, estimator in enumerate(model.estimators_):
+        tree = estimator.tree_
+        order = breadth_first_order(tree.children_left, tree.children_right)
+        new_id = np.empty_like(order)
+        new_id[order] = np.arange(len(order))
+        leaves[t] = new_id[applied[:, t]] + flat.roots[t]
+    return leaves
+
+
+def sample_rows(n, seed):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, 6)) * [1, 10, 100, 0.1, 5, 50] + [0, 50, -20, 1, 0, 0]
+
+
+def test_forest_is_not_trivial(forest):
+    model, _, flat = forest
+    assert flat.max_depth > 1
+    assert len(flat.roots) == len(model.estimators_)
+
+
+@pytest.mark.parametrize('n_rows', [1, 500])
+def test_predict_proba_matches_sklearn(forest, n_rows):
+    model, scaler, flat = forest
+    X = sample_rows(n_rows, n_rows)
+    expected = model.predict_proba(scaler.transform(X))
+    assert flat.predict_proba(X).shape == expected.shape
+    assert np.abs(flat.predict_proba(X) - expected).max() <= PARITY_TOLERANCE
+    assert np.abs(flat.positive_proba(X) - expected[:, 1]).max() <= PARITY_TOLERANCE
+
+
+@pytest.mark.parametrize('n_rows', [1, 500])
+def test_leaves_match_sklearn(forest, n_rows):
+    model, scaler, flat = forest
+    X = sample_rows(n_rows, n_rows + 1)
+    leaves = flat.leaves(X)
+    assert leaves.shape == (len(model.estimators_), n_rows)
+    np.testing.assert_array_equal(leaves, expected_leaves(model, flat, scaler.transform(X).astype(np.float32)))
+
+
+def test_chunked_rows_match_single_chunk(forest, monkeypatch):
+    model, scaler, flat = forest
+    X = sample_rows(500, 3)
+    whole = flat.leaves(X)
+    # 25 árboles y 100 pares por bloque: bloques de 4 filas, el último incompleto
+    monkeypatch.setattr(eva_forest, 'LEAF_CHUNK_PAIRS', 100)
+    assert flat.chunk_rows() == 4
+    np.testing.assert_array_equal(flat.leaves(X), whole)
+    assert np.abs(flat.predict_proba(X) - model.predict_proba(scaler.transform(X))).max() <= PARITY_TOLERANCE